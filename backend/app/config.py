@@ -21,6 +21,23 @@ class Settings:
     # CORS
     frontend_url: str = "http://localhost:3000"
 
+    # Admisión de cargas
+    max_upload_mb: int = 50
+    max_upload_total_mb: int = 200
+    max_body_json_mb: int = 100
+    memoria_presupuesto_mb: int = 1024
+    admision_espera_segundos: float = 30.0
+
+    # Procesamiento en paralelo (0 = cantidad de CPUs)
+    max_procesos: int = 0
+
+    # Precarga de módulos y conexiones al iniciar (ver app/precarga.py)
+    precarga: bool = False
+
+    # Modo sombra de /agrupar (ver app/services/sombra.py; 0 = desactivado)
+    sombra_fraccion: float = 0.0
+    sombra_motor: str = "aproximado"
+
 
 def get_settings() -> Settings:
     """Lee las variables de entorno directamente"""
@@ -32,4 +49,13 @@ def get_settings() -> Settings:
         environment=os.environ.get("ENVIRONMENT", "development"),
         debug=os.environ.get("DEBUG", "true").lower() == "true",
         frontend_url=os.environ.get("FRONTEND_URL", "http://localhost:3000"),
+        max_upload_mb=int(os.environ.get("MAX_UPLOAD_MB", "50")),
+        max_upload_total_mb=int(os.environ.get("MAX_UPLOAD_TOTAL_MB", "200")),
+        max_body_json_mb=int(os.environ.get("MAX_BODY_JSON_MB", "100")),
+        memoria_presupuesto_mb=int(os.environ.get("MEMORIA_PRESUPUESTO_MB", "1024")),
+        admision_espera_segundos=float(os.environ.get("ADMISION_ESPERA_SEGUNDOS", "30")),
+        max_procesos=int(os.environ.get("MAX_PROCESOS", "0")),
+        precarga=os.environ.get("PRECARGA", "false").lower() == "true",
+        sombra_fraccion=float(os.environ.get("SOMBRA_FRACCION", "0")),
+        sombra_motor=os.environ.get("SOMBRA_MOTOR", "aproximado"),
     )
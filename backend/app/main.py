@@ -1,10 +1,14 @@
+import asyncio
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from contextlib import asynccontextmanager
 
 from app.config import get_settings
+from app.precarga import precargar
 from app.routers import auditoria, health
+from app.services.paralelo import cerrar_pool
 
 
 settings = get_settings()
@@ -14,8 +18,14 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     # Startup
     print(f"🚀 Iniciando Auditoria Pro API en modo {settings.environment}")
+    # Precarga en segundo plano: el worker atiende /health mientras tanto
+    app.state.precarga = (
+        asyncio.create_task(asyncio.to_thread(precargar, settings))
+        if settings.precarga else None
+    )
     yield
     # Shutdown
+    cerrar_pool()
     print("👋 Cerrando Auditoria Pro API")
 
 
@@ -47,6 +57,41 @@ async def add_cors_header(request: Request, call_next):
     return response
 
 
+# Rechazar uploads y bodies JSON demasiado grandes antes de leer el body
+@app.middleware("http")
+async def limitar_tamano_body(request: Request, call_next):
+    content_length = request.headers.get("content-length")
+    if not (content_length and content_length.isdigit()):
+        return await call_next(request)
+
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        # Las cargas de varios archivos se limitan por el total; cada archivo se
+        # controla después con leer_archivo_limitado
+        if request.url.path.endswith("/procesar-excel-multiple"):
+            max_mb = settings.max_upload_total_mb
+            mensaje = f"Los archivos superan el tamaño total máximo permitido ({max_mb} MB)"
+        else:
+            max_mb = settings.max_upload_mb
+            mensaje = f"El archivo supera el tamaño máximo permitido ({max_mb} MB)"
+        # Margen para el overhead del multipart
+        max_bytes = max_mb * 1024 * 1024 + 64 * 1024
+    elif content_type.startswith("application/json"):
+        # /agrupar, /duplicados, /antiguedad, etc. reciben los registros en el body
+        max_bytes = settings.max_body_json_mb * 1024 * 1024
+        mensaje = f"El cuerpo de la solicitud supera el tamaño máximo permitido ({settings.max_body_json_mb} MB)"
+    else:
+        return await call_next(request)
+
+    if int(content_length) > max_bytes:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": mensaje},
+            headers={"Access-Control-Allow-Origin": "*"}
+        )
+    return await call_next(request)
+
+
 # Handler para OPTIONS (preflight)
 @app.options("/{full_path:path}")
 async def options_handler(request: Request):
@@ -70,6 +115,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         status_code=exc.status_code,
         content={"detail": exc.detail},
         headers={
+            **(exc.headers or {}),
             "Access-Control-Allow-Origin": "*",
             "Access-Control-Allow-Methods": "GET, POST, PUT, DELETE, OPTIONS",
             "Access-Control-Allow-Headers": "*",
@@ -0,0 +1,55 @@
+"""
+Precarga opcional al iniciar el worker (PRECARGA=true).
+
+Con escalado a cero cada arranque en frío paga la importación de pandas/NumPy,
+la compilación de patrones y la creación del cliente Supabase en el primer
+request que los necesita. La precarga hace ese trabajo en segundo plano apenas
+arranca el worker, sin demorar /health.
+"""
+import time
+
+from app.config import Settings
+
+
+def precargar_modulos():
+    """Importa los servicios pesados y ejercita sus patrones y caches una vez"""
+    from app.services import alias, barrido, cuadro, emparejamiento, procesamiento  # noqa: F401
+    from app.services.agrupacion import extraer_razon_social, generar_clave_agrupacion
+    from app.services.similitud_lote import PerfilesLote
+
+    razon = extraer_razon_social("Cobro - Juan Pérez S.R.L. Factura A0001-00001234")
+    clave = generar_clave_agrupacion(razon)
+    PerfilesLote([clave, "PEREZ JUAN"]).puntuar_pares([0], [1])
+
+
+def abrir_conexiones(settings: Settings):
+    """Crea el cliente Supabase compartido y abre su pool de conexiones HTTP"""
+    from app.routers.auditoria import get_supabase_client
+
+    supabase = get_supabase_client(settings)
+    if supabase is not None:
+        supabase.table("conciliaciones_mayor").select("id").limit(1).execute()
+
+
+def precargar(settings: Settings) -> dict[str, float]:
+    """
+    Ejecuta los pasos de precarga. Un paso que falla no impide los demás:
+    la app funciona igual sin precarga.
+
+    Returns:
+        Dict paso -> segundos
+    """
+    tiempos: dict[str, float] = {}
+    for nombre, paso in (
+        ("modulos", precargar_modulos),
+        ("conexiones", lambda: abrir_conexiones(settings)),
+    ):
+        inicio = time.perf_counter()
+        try:
+            paso()
+        except Exception as e:
+            print(f"Precarga: falló el paso {nombre}: {e}")
+        tiempos[nombre] = round(time.perf_counter() - inicio, 3)
+
+    print(f"Precarga completa: {tiempos}")
+    return tiempos
@@ -1,20 +1,36 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Body, Request
-from fastapi.responses import JSONResponse
-from typing import Optional, Any
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Query, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, JSONResponse, Response
+from starlette.background import BackgroundTask
+from typing import Optional, Any, Iterable
+from datetime import date, datetime, timezone
+import base64
+import json
 import math
+import os
+import tempfile
+import time
 
 from app.config import get_settings, Settings
 from app.schemas.auditoria import (
+    AliasRequest,
     ConciliacionCreate,
     ConciliacionResponse,
     ConciliacionListResponse,
+    CuadroComparativoRequest,
+    EmparejarSaldosRequest,
     FusionRequest
 )
-from app.services.procesamiento import (
-    procesar_excel,
-    agrupar_por_razon_social,
-    fusionar_agrupaciones
+from app.services.admision import (
+    admitir,
+    contar_filas_estimadas,
+    leer_archivo_limitado
 )
+from app.services.cache import CacheLRU
+
+# Los servicios de procesamiento (pandas/NumPy) se importan dentro de cada
+# endpoint: /health y el listado de conciliaciones no los necesitan y así el
+# arranque en frío no paga su importación (ver app/precarga.py)
 
 router = APIRouter()
 
@@ -68,121 +84,412 @@ def require_supabase(settings: Settings = Depends(get_settings)):
         )
 
 
+COLUMNAS_LISTADO = "id, nombre, cliente_id, fecha_creacion, fecha_modificacion, registros_count, agrupaciones_count"
+COLUMNAS_RESUMEN = "total_debe, total_haber, saldo"
+
+# Total de conciliaciones por filtro: (momento del conteo, total)
+_CACHE_TOTALES = CacheLRU(max_entradas=256)
+TTL_TOTALES_SEGUNDOS = 60
+MODOS_CONTEO = {"exacto": "exact", "estimado": "estimated"}
+
+
+def _codificar_cursor(fila: dict) -> str:
+    """
+    Cursor opaco con la posición (fecha_modificacion, id) de la última fila.
+    La fecha es null en filas anteriores a la columna.
+    """
+    posicion = json.dumps([fila.get("fecha_modificacion"), fila["id"]])
+    return base64.urlsafe_b64encode(posicion.encode()).decode()
+
+
+def _decodificar_cursor(cursor: str) -> tuple[Optional[str], int]:
+    try:
+        fecha, id_ = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (None if fecha is None else str(fecha)), int(id_)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _total_conciliaciones(supabase, cliente_id: Optional[str], conteo: str) -> int:
+    """Cantidad de conciliaciones del filtro, cacheada unos segundos por worker"""
+    clave = (cliente_id, conteo)
+    en_cache = _CACHE_TOTALES.obtener(clave)
+    if en_cache is not None and time.monotonic() - en_cache[0] < TTL_TOTALES_SEGUNDOS:
+        return en_cache[1]
+
+    query = supabase.table("conciliaciones_mayor").select("id", count=MODOS_CONTEO[conteo])
+    if cliente_id:
+        query = query.eq("cliente_id", cliente_id)
+    total = query.limit(1).execute().count or 0
+
+    _CACHE_TOTALES.guardar(clave, (time.monotonic(), total))
+    return total
+
+
 @router.get("/conciliaciones", response_model=ConciliacionListResponse)
 async def listar_conciliaciones(
     cliente_id: Optional[str] = Query(None, description="Filtrar por cliente"),
-    limit: int = Query(50, le=100),
-    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=100),
+    offset: int = Query(0, ge=0, description="Obsoleto: usar cursor"),
+    cursor: Optional[str] = Query(None, description="siguiente_cursor de la pagina anterior"),
+    conteo: str = Query("exacto", description="Total exacto o estimado (mas rapido con miles de filas)"),
+    incluir_resumen: bool = Query(False, description="Incluir total_debe, total_haber y saldo"),
     supabase = Depends(require_supabase)
 ):
-    """Lista todas las conciliaciones de mayores guardadas"""
+    """
+    Lista las conciliaciones de mayores guardadas, de la más reciente a la
+    más antigua.
+    Con cursor la paginación es por clave (fecha_modificacion, id): cada
+    página cuesta lo mismo sin importar cuán profunda sea. Las filas sin
+    fecha_modificacion van al final, ordenadas por id. Requiere el índice
+    (cliente_id, fecha_modificacion DESC NULLS LAST, id DESC) en
+    conciliaciones_mayor.
+    """
     try:
-        query = supabase.table("conciliaciones_mayor").select(
-            "id, nombre, cliente_id, fecha_creacion, fecha_modificacion, registros_count, agrupaciones_count"
-        )
+        if conteo not in MODOS_CONTEO:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Conteo inválido: {conteo}. Opciones: {', '.join(MODOS_CONTEO)}"
+            )
 
-        if cliente_id:
-            query = query.eq("cliente_id", cliente_id)
+        def consultar(columnas: str):
+            query = supabase.table("conciliaciones_mayor").select(columnas)
+            if cliente_id:
+                query = query.eq("cliente_id", cliente_id)
+            query = query.order(
+                "fecha_modificacion", desc=True, nullsfirst=False
+            ).order("id", desc=True)
+
+            if cursor:
+                fecha, id_ = _decodificar_cursor(cursor)
+                if fecha is None:
+                    # Ya en las filas sin fecha: solo queda seguir por id
+                    query = query.is_("fecha_modificacion", "null").lt("id", id_)
+                else:
+                    query = query.or_(
+                        f'fecha_modificacion.lt."{fecha}",'
+                        f'and(fecha_modificacion.eq."{fecha}",id.lt.{id_}),'
+                        'fecha_modificacion.is.null'
+                    )
+                # Una fila de más para saber si hay página siguiente
+                return query.limit(limit + 1).execute()
+            return query.range(offset, offset + limit).execute()
+
+        if incluir_resumen:
+            try:
+                result = consultar(f"{COLUMNAS_LISTADO}, {COLUMNAS_RESUMEN}")
+            except Exception as e:
+                # Tabla sin las columnas de resumen: listar sin ellas
+                print(f"Advertencia: no se pudo incluir el resumen en el listado: {e}")
+                result = consultar(COLUMNAS_LISTADO)
+        else:
+            result = consultar(COLUMNAS_LISTADO)
 
-        result = query.order("fecha_modificacion", desc=True).range(offset, offset + limit - 1).execute()
+        filas = result.data[:limit]
+        siguiente_cursor = (
+            _codificar_cursor(filas[-1]) if len(result.data) > limit else None
+        )
 
         return {
-            "conciliaciones": result.data,
-            "total": len(result.data)
+            "conciliaciones": filas,
+            "total": _total_conciliaciones(supabase, cliente_id, conteo),
+            "siguiente_cursor": siguiente_cursor
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al listar conciliaciones: {str(e)}")
 
 
-@router.get("/conciliaciones/{conciliacion_id}", response_model=ConciliacionResponse)
-async def obtener_conciliacion(
-    conciliacion_id: int,
-    supabase = Depends(require_supabase)
-):
-    """Obtiene una conciliación específica con todos sus datos"""
-    try:
-        # Obtener conciliación principal
-        result = supabase.table("conciliaciones_mayor").select("*").eq("id", conciliacion_id).single().execute()
+def _cargar_conciliacion(supabase, conciliacion_id: int) -> dict:
+    """Carga una conciliación completa, incluyendo datos guardados en tablas auxiliares"""
+    # Obtener conciliación principal
+    result = supabase.table("conciliaciones_mayor").select("*").eq("id", conciliacion_id).single().execute()
 
-        if not result.data:
-            raise HTTPException(status_code=404, detail="Conciliación no encontrada")
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Conciliación no encontrada")
 
-        conciliacion = result.data
+    conciliacion = result.data
 
-        # Cargar registros desde tabla auxiliar si es necesario
-        if conciliacion.get("registros_guardados_separado"):
-            registros_result = supabase.table("registros_mayor_detalle").select(
-                "registros"
-            ).eq("conciliacion_id", conciliacion_id).execute()
+    # Cargar registros desde tabla auxiliar si es necesario
+    if conciliacion.get("registros_guardados_separado"):
+        registros_result = supabase.table("registros_mayor_detalle").select(
+            "registros"
+        ).eq("conciliacion_id", conciliacion_id).execute()
 
-            if registros_result.data:
-                conciliacion["registros"] = registros_result.data[0].get("registros", [])
+        if registros_result.data:
+            conciliacion["registros"] = registros_result.data[0].get("registros", [])
 
-        # Cargar agrupaciones desde tabla auxiliar si es necesario
-        if conciliacion.get("agrupaciones_guardadas_separado"):
-            agrupaciones_result = supabase.table("agrupaciones_mayor_detalle").select(
-                "agrupaciones"
-            ).eq("conciliacion_id", conciliacion_id).execute()
+    # Cargar agrupaciones desde tabla auxiliar si es necesario
+    if conciliacion.get("agrupaciones_guardadas_separado"):
+        agrupaciones_result = supabase.table("agrupaciones_mayor_detalle").select(
+            "agrupaciones"
+        ).eq("conciliacion_id", conciliacion_id).execute()
 
-            if agrupaciones_result.data:
-                conciliacion["agrupaciones"] = agrupaciones_result.data[0].get("agrupaciones", [])
+        if agrupaciones_result.data:
+            conciliacion["agrupaciones"] = agrupaciones_result.data[0].get("agrupaciones", [])
 
-        # Reconstruir registros dentro de agrupaciones si están vacíos
-        registros = conciliacion.get("registros", [])
-        agrupaciones = conciliacion.get("agrupaciones", [])
+    return conciliacion
 
-        if registros and agrupaciones:
-            # Crear mapa de registros por ID para acceso rápido
-            registros_por_id = {r.get("id"): r for r in registros if r.get("id")}
 
-            # Verificar si alguna agrupación tiene registros vacíos pero cantidad > 0
-            necesita_reconstruir = any(
-                a.get("cantidad", 0) > 0 and not a.get("registros")
-                for a in agrupaciones
-            )
+def _invalidar_caches_conciliacion(conciliacion_id: int):
+    """Descarta resultados cacheados de una conciliación modificada o eliminada"""
+    from app.services.antiguedad import CACHE_ANTIGUEDAD
+    from app.services.busqueda import CACHE_INDICES
+    from app.services.cuadro import CACHE_CUADROS
+    from app.services.partidas_abiertas import CACHE_PARTIDAS
+    CACHE_CUADROS.invalidar_si(lambda clave: clave[0] == conciliacion_id)
+    CACHE_INDICES.invalidar_si(lambda clave: clave[0] == conciliacion_id)
+    CACHE_PARTIDAS.invalidar_si(lambda clave: clave[0] == conciliacion_id)
+    CACHE_ANTIGUEDAD.invalidar_si(lambda clave: clave[0] == conciliacion_id)
+    _CACHE_TOTALES.limpiar()
+
+
+def _ids_registros_guardados(supabase, conciliacion_id: int) -> set[str]:
+    """IDs de contenido de los registros ya guardados en una conciliación"""
+    from app.services.procesamiento import ids_de_registros
+    if supabase is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Base de datos no configurada. Configure SUPABASE_URL y SUPABASE_KEY."
+        )
+    conciliacion = _cargar_conciliacion(supabase, conciliacion_id)
+    return ids_de_registros(conciliacion.get("registros") or [])
+
+
+def _alias_cliente(supabase, cliente_id: Optional[str]) -> Optional[dict]:
+    """Alias aprendidos del cliente, o None si no se indicó cliente o no hay base"""
+    from app.services.alias import obtener_alias
+    if not cliente_id or supabase is None:
+        return None
+    return obtener_alias(supabase, cliente_id)
+
+
+def _version_conciliacion(supabase, conciliacion_id: int) -> str:
+    """Versión de una conciliación (fecha de modificación), sin traer sus datos"""
+    result = supabase.table("conciliaciones_mayor").select(
+        "id, fecha_modificacion"
+    ).eq("id", conciliacion_id).execute()
+
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Conciliación no encontrada")
+
+    return str(result.data[0].get("fecha_modificacion"))
 
-            if necesita_reconstruir:
-                # Crear mapa de razón social normalizada a registros
-                from app.services.agrupacion import generar_clave_agrupacion
 
-                registros_por_grupo: dict[str, list] = {}
-                for r in registros:
-                    razon_social = r.get("razon_social", "Sin Asignar")
+def _agregados_conciliacion(supabase, conciliacion_id: int):
+    """
+    Agregados materializados de una conciliación. Si no los tiene se calculan
+    desde sus agrupaciones y saldos (sin cargar los registros) y se guardan.
+    """
+    from app.services.agregados import calcular_agregados, guardar_agregados, obtener_agregados
+    try:
+        agregados = obtener_agregados(supabase, conciliacion_id)
+    except Exception as e:
+        print(f"Advertencia: no se pudieron leer los agregados: {e}")
+        agregados = None
+    if agregados is not None:
+        return agregados
+
+    try:
+        result = supabase.table("conciliaciones_mayor").select(
+            "id, agrupaciones, agrupaciones_guardadas_separado, saldos_inicio, saldos_cierre"
+        ).eq("id", conciliacion_id).execute()
+    except Exception:
+        # Tabla sin columnas de saldos
+        result = supabase.table("conciliaciones_mayor").select(
+            "id, agrupaciones, agrupaciones_guardadas_separado"
+        ).eq("id", conciliacion_id).execute()
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Conciliación no encontrada")
+    conciliacion = result.data[0]
+
+    agrupaciones = conciliacion.get("agrupaciones") or []
+    if conciliacion.get("agrupaciones_guardadas_separado"):
+        detalle = supabase.table("agrupaciones_mayor_detalle").select(
+            "agrupaciones"
+        ).eq("conciliacion_id", conciliacion_id).execute()
+        if detalle.data:
+            agrupaciones = detalle.data[0].get("agrupaciones") or []
+
+    agregados = calcular_agregados(
+        agrupaciones,
+        conciliacion.get("saldos_inicio") or [],
+        conciliacion.get("saldos_cierre") or []
+    )
+    try:
+        guardar_agregados(supabase, conciliacion_id, agregados)
+    except Exception as e:
+        print(f"Advertencia: no se guardaron los agregados de la conciliación: {e}")
+    return agregados
+
+
+def _reconstruir_registros_agrupaciones(conciliacion: dict):
+    """Completa los registros de las agrupaciones guardadas sin ellos (solo con cantidad)"""
+    registros = conciliacion.get("registros", [])
+    agrupaciones = conciliacion.get("agrupaciones", [])
+
+    if registros and agrupaciones:
+        # Crear mapa de registros por ID para acceso rápido
+        registros_por_id = {r.get("id"): r for r in registros if r.get("id")}
+
+        # Verificar si alguna agrupación tiene registros vacíos pero cantidad > 0
+        necesita_reconstruir = any(
+            a.get("cantidad", 0) > 0 and not a.get("registros")
+            for a in agrupaciones
+        )
+
+        if necesita_reconstruir:
+            # Crear mapa de razón social normalizada a registros
+            from app.services.agrupacion import generar_clave_agrupacion
+
+            registros_por_grupo: dict[str, list] = {}
+            for r in registros:
+                razon_social = r.get("razon_social", "Sin Asignar")
+                clave = generar_clave_agrupacion(razon_social)
+                if clave not in registros_por_grupo:
+                    registros_por_grupo[clave] = []
+                registros_por_grupo[clave].append(r)
+
+            # Reconstruir registros en cada agrupación
+            for agrupacion in agrupaciones:
+                if agrupacion.get("cantidad", 0) > 0 and not agrupacion.get("registros"):
+                    razon_social = agrupacion.get("razonSocial", "")
                     clave = generar_clave_agrupacion(razon_social)
-                    if clave not in registros_por_grupo:
-                        registros_por_grupo[clave] = []
-                    registros_por_grupo[clave].append(r)
-
-                # Reconstruir registros en cada agrupación
-                for agrupacion in agrupaciones:
-                    if agrupacion.get("cantidad", 0) > 0 and not agrupacion.get("registros"):
-                        razon_social = agrupacion.get("razonSocial", "")
-                        clave = generar_clave_agrupacion(razon_social)
-
-                        # Buscar registros que coincidan
-                        if clave in registros_por_grupo:
-                            agrupacion["registros"] = registros_por_grupo[clave]
-                        else:
-                            # Intentar buscar por variantes
-                            variantes = agrupacion.get("variantes", [razon_social])
-                            registros_encontrados = []
-                            for variante in variantes:
-                                clave_var = generar_clave_agrupacion(variante)
-                                if clave_var in registros_por_grupo:
-                                    registros_encontrados.extend(registros_por_grupo[clave_var])
-                            if registros_encontrados:
-                                agrupacion["registros"] = registros_encontrados
-
-                conciliacion["agrupaciones"] = agrupaciones
-                conciliacion["_registros_reconstruidos"] = True
-
-        # Mapear saldos a camelCase para el frontend
-        if conciliacion.get("saldos_inicio"):
-            conciliacion["saldosInicio"] = conciliacion.pop("saldos_inicio")
-        if conciliacion.get("saldos_cierre"):
-            conciliacion["saldosCierre"] = conciliacion.pop("saldos_cierre")
-
-        return conciliacion
+
+                    # Buscar registros que coincidan
+                    if clave in registros_por_grupo:
+                        agrupacion["registros"] = registros_por_grupo[clave]
+                    else:
+                        # Intentar buscar por variantes
+                        variantes = agrupacion.get("variantes", [razon_social])
+                        registros_encontrados = []
+                        for variante in variantes:
+                            clave_var = generar_clave_agrupacion(variante)
+                            if clave_var in registros_por_grupo:
+                                registros_encontrados.extend(registros_por_grupo[clave_var])
+                        if registros_encontrados:
+                            agrupacion["registros"] = registros_encontrados
+
+            conciliacion["agrupaciones"] = agrupaciones
+            conciliacion["_registros_reconstruidos"] = True
+
+
+# Columnas de la fila principal sin los arreglos, de la más completa a la
+# mínima (saldos y totales pueden no existir en tablas viejas)
+_COLUMNAS_CABECERA_BASE = (
+    "id, nombre, cliente_id, fecha_creacion, fecha_modificacion, registros_count, "
+    "agrupaciones_count, registros_guardados_separado, agrupaciones_guardadas_separado"
+)
+_COLUMNAS_CABECERA = (
+    _COLUMNAS_CABECERA_BASE + ", saldos_inicio, saldos_cierre, total_debe, total_haber, saldo",
+    _COLUMNAS_CABECERA_BASE + ", saldos_inicio, saldos_cierre",
+    _COLUMNAS_CABECERA_BASE,
+)
+
+
+def _cargar_cabecera(supabase, conciliacion_id: int) -> dict:
+    """Fila principal de una conciliación sin registros ni agrupaciones"""
+    for i, columnas in enumerate(_COLUMNAS_CABECERA):
+        try:
+            result = supabase.table("conciliaciones_mayor").select(
+                columnas
+            ).eq("id", conciliacion_id).execute()
+            break
+        except Exception:
+            if i == len(_COLUMNAS_CABECERA) - 1:
+                raise
+
+    if not result.data:
+        raise HTTPException(status_code=404, detail="Conciliación no encontrada")
+    return result.data[0]
+
+
+def _agrupaciones_sin_registros(agrupaciones: Iterable[dict]) -> list[dict]:
+    """Agrupaciones con sus totales y campos propios, sin la lista de registros"""
+    return [{k: v for k, v in a.items() if k != "registros"} for a in agrupaciones]
+
+
+def _arreglos_crudos(supabase, cabecera: dict) -> Optional[dict[str, bytes]]:
+    """
+    Registros y agrupaciones guardados, como bytes JSON sin parsear. None si
+    no se pudieron leer así o si las agrupaciones necesitan reconstrucción.
+    """
+    from app.services.serializacion import arreglo_crudo, necesita_reconstruir
+    conciliacion_id = cabecera["id"]
+    arreglos = {}
+    for campo, separado, tabla in (
+        ("registros", "registros_guardados_separado", "registros_mayor_detalle"),
+        ("agrupaciones", "agrupaciones_guardadas_separado", "agrupaciones_mayor_detalle"),
+    ):
+        if cabecera.get(separado):
+            arreglo = arreglo_crudo(supabase, tabla, campo, "conciliacion_id", conciliacion_id)
+        else:
+            arreglo = arreglo_crudo(supabase, "conciliaciones_mayor", campo, "id", conciliacion_id)
+        if arreglo is None:
+            return None
+        arreglos[campo] = arreglo
+
+    if arreglos["registros"] != b'[]' and necesita_reconstruir(
+        arreglos["agrupaciones"], cabecera.get("agrupaciones_count")
+    ):
+        return None
+    return arreglos
+
+
+def _cabecera_respuesta(conciliacion: dict) -> bytes:
+    """Valida los campos chicos de la conciliación y los serializa (sin los arreglos)"""
+    from app.services.serializacion import a_json
+
+    # Mapear saldos a camelCase para el frontend
+    if conciliacion.get("saldos_inicio"):
+        conciliacion["saldosInicio"] = conciliacion.pop("saldos_inicio")
+    if conciliacion.get("saldos_cierre"):
+        conciliacion["saldosCierre"] = conciliacion.pop("saldos_cierre")
+
+    cabecera = {k: v for k, v in conciliacion.items() if k not in ("registros", "agrupaciones")}
+    return a_json(
+        ConciliacionResponse.model_validate(cabecera).model_dump(
+            mode="json", exclude={"registros", "agrupaciones"}
+        )
+    )
+
+
+@router.get("/conciliaciones/{conciliacion_id}", response_model=ConciliacionResponse)
+async def obtener_conciliacion(
+    conciliacion_id: int,
+    supabase = Depends(require_supabase)
+):
+    """
+    Obtiene una conciliación específica con todos sus datos.
+
+    Solo la cabecera se valida con ConciliacionResponse: los registros y las
+    agrupaciones se leen de PostgREST como JSON y se copian a la respuesta sin
+    parsearlos. Si las agrupaciones se guardaron sin sus registros se cargan
+    completas para reconstruirlas.
+    """
+    from app.services.serializacion import a_json, componer_objeto
+    try:
+        cabecera = _cargar_cabecera(supabase, conciliacion_id)
+        try:
+            arreglos = _arreglos_crudos(supabase, cabecera)
+        except Exception as e:
+            print(f"Advertencia: no se pudieron leer los datos sin parsear: {e}")
+            arreglos = None
+
+        if arreglos is None:
+            conciliacion = _cargar_conciliacion(supabase, conciliacion_id)
+            _reconstruir_registros_agrupaciones(conciliacion)
+            arreglos = {
+                "registros": a_json(conciliacion.get("registros") or []),
+                "agrupaciones": a_json(conciliacion.get("agrupaciones") or []),
+            }
+            cabecera = conciliacion
+
+        return Response(
+            content=componer_objeto(_cabecera_respuesta(cabecera), arreglos),
+            media_type="application/json"
+        )
 
     except HTTPException:
         raise
@@ -203,6 +510,17 @@ def limpiar_valores_json(obj):
     return obj
 
 
+def _resumen_registros(registros: list[dict]) -> dict:
+    """Totales de debe, haber y saldo de los registros de una conciliación"""
+    total_debe = sum(float(r.get("debe") or 0) for r in registros)
+    total_haber = sum(float(r.get("haber") or 0) for r in registros)
+    return {
+        "total_debe": round(total_debe, 2),
+        "total_haber": round(total_haber, 2),
+        "saldo": round(total_debe - total_haber, 2),
+    }
+
+
 @router.post("/conciliaciones")
 async def crear_conciliacion(
     request: Request,
@@ -244,6 +562,11 @@ async def crear_conciliacion(
             "agrupaciones_guardadas_separado": guardar_agrupaciones_separado,
         }
 
+        if conciliacion_id_existente:
+            # La fecha de modificación funciona como versión para los caches
+            data_principal["fecha_modificacion"] = datetime.now(timezone.utc).isoformat()
+            _invalidar_caches_conciliacion(conciliacion_id_existente)
+
         if not guardar_registros_separado:
             data_principal["registros"] = registros
 
@@ -290,6 +613,29 @@ async def crear_conciliacion(
             else:
                 raise e
 
+        if not conciliacion_id_existente:
+            _invalidar_caches_conciliacion(conciliacion_id)
+
+        # Totales precalculados para el listado (opcional: las columnas
+        # total_debe, total_haber y saldo pueden no existir)
+        try:
+            supabase.table("conciliaciones_mayor").update(
+                _resumen_registros(registros)
+            ).eq("id", conciliacion_id).execute()
+        except Exception as e:
+            print(f"Advertencia: no se guardó el resumen de la conciliación: {e}")
+
+        # Agregados por agrupación para el roll-forward (opcional: la tabla
+        # agregados_agrupacion puede no existir)
+        try:
+            from app.services.agregados import calcular_agregados, guardar_agregados
+            guardar_agregados(
+                supabase, conciliacion_id,
+                calcular_agregados(agrupaciones, saldos_inicio, saldos_cierre)
+            )
+        except Exception as e:
+            print(f"Advertencia: no se guardaron los agregados de la conciliación: {e}")
+
         # Guardar registros en tabla auxiliar si es necesario
         if guardar_registros_separado:
             supabase.table("registros_mayor_detalle").upsert({
@@ -324,41 +670,81 @@ async def crear_conciliacion(
 @router.post("/procesar-excel")
 async def procesar_archivo_excel(
     archivo: UploadFile = File(...),
-    agrupar: bool = Query(True, description="Agrupar automaticamente por razon social")
+    agrupar: bool = Query(True, description="Agrupar automaticamente por razon social"),
+    conciliacion_id: Optional[int] = Query(
+        None, description="Descartar registros ya guardados en esta conciliacion"
+    ),
+    cliente_id: Optional[str] = Query(None, description="Usar los alias aprendidos del cliente"),
+    detectar_duplicados: bool = Query(False, description="Informar movimientos posiblemente duplicados"),
+    supabase = Depends(get_supabase_client)
 ):
     """
     Procesa un archivo Excel con mayores contables.
     Opcionalmente agrupa por razon social automaticamente.
+    Con conciliacion_id se descartan los registros que ya estaban guardados
+    (útil al subir períodos superpuestos).
     """
+    from app.services.modelo import a_registros, columnas_publicas
+    from app.services.procesamiento import (
+        agrupar_por_razon_social, cargar_mayor, deduplicar_registros
+    )
+    from app.services.duplicados import detectar_duplicados as buscar_duplicados
     try:
         if not archivo.filename.endswith(('.xlsx', '.xls')):
             raise HTTPException(status_code=400, detail="El archivo debe ser Excel (.xlsx o .xls)")
 
-        # Leer archivo en memoria
-        contenido = await archivo.read()
+        # Leer archivo en memoria (con límite de tamaño)
+        contenido = await leer_archivo_limitado(archivo)
+        filas = contar_filas_estimadas(contenido, archivo.filename)
+
+        async with admitir("procesar_excel", len(contenido), filas):
+            # Procesar Excel fuera del event loop (modelo tipado hasta la respuesta)
+            df, _, normalizacion = await run_in_threadpool(
+                cargar_mayor, contenido, archivo.filename
+            )
 
-        # Procesar Excel
-        resultado = procesar_excel(contenido, archivo.filename)
+            descartados = 0
+            if conciliacion_id is not None:
+                ids_existentes = await run_in_threadpool(
+                    _ids_registros_guardados, supabase, conciliacion_id
+                )
+                df, descartados = deduplicar_registros(df, ids_existentes)
 
-        if agrupar and resultado['registros']:
-            # Agrupar por razon social
-            agrupacion_result = agrupar_por_razon_social(resultado['registros'])
+            registros = await run_in_threadpool(a_registros, df)
 
+            if agrupar and registros:
+                # Agrupar por razon social
+                alias = await run_in_threadpool(_alias_cliente, supabase, cliente_id)
+                agrupacion_result = await run_in_threadpool(
+                    agrupar_por_razon_social, df, alias=alias
+                )
+
+            duplicados = None
+            if detectar_duplicados:
+                duplicados = await run_in_threadpool(buscar_duplicados, df)
+
+        if agrupar and registros:
             return {
                 "success": True,
-                "registros": resultado['registros'],
+                "registros": registros,
                 "agrupaciones": agrupacion_result['agrupaciones'],
                 "sin_asignar": agrupacion_result['sin_asignar'],
                 "totales": agrupacion_result['totales'],
                 "estadisticas": agrupacion_result['estadisticas'],
-                "columnas": resultado['columnas']
+                "columnas": columnas_publicas(df),
+                "normalizacion": normalizacion,
+                "duplicados_descartados": descartados,
+                "duplicados": duplicados
             }
 
         return {
             "success": True,
-            "registros": resultado['registros'],
-            "total": resultado['total'],
-            "columnas": resultado['columnas']
+            "registros": registros,
+            "total": len(registros),
+            "columnas": columnas_publicas(df),
+            "normalizacion": normalizacion,
+            "duplicados_descartados": descartados,
+            "duplicados": duplicados
         }
 
     except HTTPException:
@@ -367,44 +753,738 @@ async def procesar_archivo_excel(
         raise HTTPException(status_code=500, detail=f"Error al procesar Excel: {str(e)}")
 
 
+@router.post("/procesar-excel-multiple")
+async def procesar_archivos_excel(
+    archivos: list[UploadFile] = File(...),
+    todas_las_hojas: bool = Query(True, description="Procesar todas las hojas de cada archivo"),
+    agrupar: bool = Query(True, description="Agrupar automaticamente por razon social"),
+    deduplicar: bool = Query(False, description="Descartar registros repetidos entre archivos"),
+    conciliacion_id: Optional[int] = Query(
+        None, description="Descartar registros ya guardados en esta conciliacion"
+    ),
+    cliente_id: Optional[str] = Query(None, description="Usar los alias aprendidos del cliente"),
+    detectar_duplicados: bool = Query(False, description="Informar movimientos posiblemente duplicados"),
+    supabase = Depends(get_supabase_client)
+):
+    """
+    Procesa un mayor dividido en varios archivos y/o varias hojas.
+    Las hojas se parsean en paralelo y los registros se agrupan en una sola pasada.
+    Cada registro queda etiquetado con su archivo, hoja y cuenta.
+    """
+    from app.services.modelo import a_registros, columnas_publicas
+    from app.services.procesamiento import (
+        agrupar_por_razon_social, cargar_mayor_multiple, deduplicar_registros
+    )
+    from app.services.duplicados import detectar_duplicados as buscar_duplicados
+    try:
+        for archivo in archivos:
+            if not archivo.filename.endswith(('.xlsx', '.xls')):
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"El archivo {archivo.filename} debe ser Excel (.xlsx o .xls)"
+                )
+
+        contenidos = [
+            (await leer_archivo_limitado(archivo), archivo.filename)
+            for archivo in archivos
+        ]
+        tamano_total = sum(len(c) for c, _ in contenidos)
+        filas = [contar_filas_estimadas(c, n) for c, n in contenidos]
+
+        async with admitir(
+            "procesar_excel_multiple", tamano_total, None if None in filas else sum(filas)
+        ):
+            df, fuentes = await run_in_threadpool(
+                cargar_mayor_multiple, contenidos, todas_las_hojas, deduplicar
+            )
+            descartados = sum(f['registros'] for f in fuentes) - len(df)
+
+            if conciliacion_id is not None:
+                ids_existentes = await run_in_threadpool(
+                    _ids_registros_guardados, supabase, conciliacion_id
+                )
+                df, ya_guardados = deduplicar_registros(df, ids_existentes)
+                descartados += ya_guardados
+
+            registros = await run_in_threadpool(a_registros, df)
+
+            if agrupar and registros:
+                alias = await run_in_threadpool(_alias_cliente, supabase, cliente_id)
+                agrupacion_result = await run_in_threadpool(
+                    agrupar_por_razon_social, df, alias=alias
+                )
+
+            duplicados = None
+            if detectar_duplicados:
+                duplicados = await run_in_threadpool(buscar_duplicados, df)
+
+        if agrupar and registros:
+            return {
+                "success": True,
+                "registros": registros,
+                "agrupaciones": agrupacion_result['agrupaciones'],
+                "sin_asignar": agrupacion_result['sin_asignar'],
+                "totales": agrupacion_result['totales'],
+                "estadisticas": agrupacion_result['estadisticas'],
+                "columnas": columnas_publicas(df),
+                "fuentes": fuentes,
+                "duplicados_descartados": descartados,
+                "duplicados": duplicados
+            }
+
+        return {
+            "success": True,
+            "registros": registros,
+            "total": len(registros),
+            "columnas": columnas_publicas(df),
+            "fuentes": fuentes,
+            "duplicados_descartados": descartados,
+            "duplicados": duplicados
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al procesar archivos Excel: {str(e)}")
+
+
 @router.post("/agrupar")
 async def agrupar_registros(
+    background_tasks: BackgroundTasks,
     registros: list[dict] = Body(..., description="Lista de registros a agrupar"),
-    umbral_similitud: float = Query(0.75, ge=0, le=1, description="Umbral de similitud para agrupar")
+    umbral_similitud: float = Query(0.75, ge=0, le=1, description="Umbral de similitud para agrupar"),
+    cliente_id: Optional[str] = Query(None, description="Usar los alias aprendidos del cliente"),
+    candidatos_max: Optional[int] = Query(
+        None, ge=1, le=1000,
+        description="Busqueda aproximada: comparar cada clave solo con las N mas parecidas por n-gramas"
+    ),
+    motor: str = Query("voraz", description="Motor de agrupacion: voraz o union_find"),
+    enlace: str = Query("simple", description="Enlace del motor union_find: simple o completo"),
+    supabase = Depends(get_supabase_client),
+    settings: Settings = Depends(get_settings)
 ):
     """
     Agrupa registros por razon social.
     Util cuando ya tienes los registros y quieres reagrupar.
+    Para mayores con muchas razones sociales distintas, candidatos_max activa
+    la busqueda aproximada (mas rapida, con recall configurable).
+    El motor union_find da el mismo resultado sin importar el orden de los registros.
+    Con SOMBRA_FRACCION > 0 una muestra de los requests se reagrupa con el
+    motor SOMBRA_MOTOR despues de responder, para comparar resultados.
     """
+    from app.services.procesamiento import agrupar_por_razon_social
     try:
-        resultado = agrupar_por_razon_social(registros, umbral_similitud)
+        async with admitir("agrupar", 0, len(registros)):
+            alias = await run_in_threadpool(_alias_cliente, supabase, cliente_id)
+            inicio = time.perf_counter()
+            resultado = await run_in_threadpool(
+                agrupar_por_razon_social, registros, umbral_similitud, alias,
+                candidatos_max, motor, enlace
+            )
+            segundos = time.perf_counter() - inicio
+
+        if settings.sombra_fraccion > 0:
+            from app.services.sombra import ejecutar_sombra_admitida, reservar_sombra
+            if reservar_sombra(settings.sombra_fraccion):
+                background_tasks.add_task(
+                    ejecutar_sombra_admitida, registros,
+                    {
+                        "umbral_similitud": umbral_similitud, "alias": alias,
+                        "candidatos_max": candidatos_max, "motor": motor, "enlace": enlace
+                    },
+                    resultado, segundos, settings.sombra_motor
+                )
+
         return {
             "success": True,
             **resultado
         }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al agrupar: {str(e)}")
 
 
+@router.get("/agrupar/sombra")
+async def estado_sombra_agrupar(settings: Settings = Depends(get_settings)):
+    """
+    Resumen del modo sombra de /agrupar en este worker: ejecuciones,
+    coincidencias, divergencias (las ultimas en detalle) y diferencia de tiempos.
+    """
+    from app.services.sombra import estado_sombra
+    return {
+        "success": True,
+        "fraccion": settings.sombra_fraccion,
+        "motor": settings.sombra_motor,
+        **estado_sombra()
+    }
+
+
+@router.post("/agrupar/barrido")
+async def barrido_umbrales(
+    registros: list[dict] = Body(..., description="Lista de registros a agrupar"),
+    umbrales: Optional[list[float]] = Query(
+        None, description="Umbrales a evaluar (por defecto de 0.5 a 0.95 cada 0.05)"
+    ),
+    historial: bool = Query(False, description="Incluir el historial de uniones por similitud"),
+    cliente_id: Optional[str] = Query(None, description="Usar los alias aprendidos del cliente"),
+    supabase = Depends(get_supabase_client)
+):
+    """
+    Resume la agrupacion de los registros para varios umbrales de similitud.
+    Las similitudes se calculan una vez (y quedan en cache para los mismos
+    registros), asi la UI puede mover el umbral sin reagrupar.
+    Los grupos coinciden con /agrupar con motor union_find y enlace simple.
+    """
+    from app.services.barrido import barrer_umbrales
+    try:
+        async with admitir("agrupar", 0, len(registros)):
+            alias = await run_in_threadpool(_alias_cliente, supabase, cliente_id)
+            resultado = await run_in_threadpool(
+                barrer_umbrales, registros, umbrales, alias, historial
+            )
+        return {
+            "success": True,
+            **resultado
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al barrer umbrales: {str(e)}")
+
+
+@router.post("/duplicados")
+async def buscar_duplicados(
+    registros: list[dict] = Body(..., description="Lista de registros del mayor"),
+    ventana_dias: int = Query(
+        3, ge=0, le=365, description="Dias maximos entre movimientos del mismo importe"
+    ),
+    incluir_cercanos: bool = Query(
+        True, description="Buscar tambien duplicados por importe y fecha cercana"
+    )
+):
+    """
+    Detecta movimientos posiblemente duplicados en el mayor:
+    exactos (mismo comprobante, importe y razon social) y cercanos
+    (mismo importe y razon social con fechas dentro de la ventana).
+    """
+    from app.services.duplicados import detectar_duplicados
+    try:
+        async with admitir("duplicados", 0, len(registros)):
+            resultado = await run_in_threadpool(
+                detectar_duplicados, registros, ventana_dias, incluir_cercanos
+            )
+        return {
+            "success": True,
+            **resultado
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al detectar duplicados: {str(e)}")
+
+
 @router.post("/fusionar")
-async def fusionar_grupos(fusion: FusionRequest):
+async def fusionar_grupos(
+    fusion: FusionRequest,
+    supabase = Depends(get_supabase_client)
+):
     """
     Fusiona dos agrupaciones en una sola.
     La agrupacion destino absorbe a la origen.
+    Si se indica cliente_id, las variantes quedan guardadas como alias del destino.
     """
+    from app.services.alias import aprender_de_fusion
+    from app.services.procesamiento import fusionar_agrupaciones
     try:
         resultado = fusionar_agrupaciones(
             fusion.agrupacion_destino,
             fusion.agrupacion_origen
         )
+
+        alias_guardados = 0
+        if fusion.cliente_id and supabase is not None:
+            try:
+                alias_guardados = await run_in_threadpool(
+                    aprender_de_fusion, supabase, fusion.cliente_id,
+                    fusion.agrupacion_destino, fusion.agrupacion_origen
+                )
+            except Exception as e:
+                # La fusión es válida aunque no se pueda guardar el alias
+                print(f"No se pudieron guardar los alias de la fusión: {e}")
+
         return {
             "success": True,
-            "agrupacion": resultado
+            "agrupacion": resultado,
+            "alias_guardados": alias_guardados
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al fusionar: {str(e)}")
 
 
+@router.get("/alias")
+async def listar_alias(
+    cliente_id: str = Query(..., description="Cliente"),
+    supabase = Depends(require_supabase)
+):
+    """Lista los alias aprendidos de un cliente (clave -> razón social canónica)"""
+    from app.services.alias import obtener_alias
+    try:
+        alias = await run_in_threadpool(obtener_alias, supabase, cliente_id)
+        return {
+            "alias": [{"clave": c, "razon_canonica": r} for c, r in alias.items()],
+            "total": len(alias)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al listar alias: {str(e)}")
+
+
+@router.post("/alias")
+async def crear_alias(
+    datos: AliasRequest,
+    supabase = Depends(require_supabase)
+):
+    """
+    Guarda alias de un cliente. Lo usa el frontend al mover registros o
+    variantes de una agrupación a otra.
+    """
+    from app.services.alias import guardar_alias
+    try:
+        guardados = await run_in_threadpool(
+            guardar_alias, supabase, datos.cliente_id, datos.razon_canonica, datos.variantes
+        )
+        return {"success": True, "guardados": guardados}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al guardar alias: {str(e)}")
+
+
+@router.delete("/alias")
+async def borrar_alias(
+    cliente_id: str = Query(..., description="Cliente"),
+    clave: list[str] = Query(..., description="Claves a eliminar"),
+    supabase = Depends(require_supabase)
+):
+    """Elimina alias de un cliente"""
+    from app.services.alias import eliminar_alias
+    try:
+        eliminados = await run_in_threadpool(eliminar_alias, supabase, cliente_id, clave)
+        return {"success": True, "eliminados": eliminados}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al eliminar alias: {str(e)}")
+
+
+@router.post("/cuadro-comparativo")
+async def cuadro_comparativo(
+    datos: CuadroComparativoRequest,
+    orden: Optional[str] = Query(None, description="Columna por la que ordenar"),
+    desc: bool = Query(False, description="Orden descendente"),
+    estado: Optional[list[str]] = Query(None, description="Filtrar por estado (ok, diferencia, sin_cierre)"),
+    limit: Optional[int] = Query(None, ge=1, description="Filas por página"),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Calcula el cuadro comparativo (saldo inicio + debe - haber + ajuste vs saldo reportado)
+    a partir de agrupaciones y saldos enviados en el body.
+    """
+    from app.services.cuadro import calcular_cuadro_comparativo, consultar_cuadro
+    try:
+        cuadro = await run_in_threadpool(
+            calcular_cuadro_comparativo,
+            datos.agrupaciones,
+            datos.saldosInicio,
+            datos.saldosCierre
+        )
+        return {
+            "success": True,
+            **consultar_cuadro(cuadro, orden, desc, estado, limit, offset)
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular cuadro comparativo: {str(e)}")
+
+
+@router.get("/conciliaciones/{conciliacion_id}/cuadro-comparativo")
+async def cuadro_comparativo_conciliacion(
+    conciliacion_id: int,
+    orden: Optional[str] = Query(None, description="Columna por la que ordenar"),
+    desc: bool = Query(False, description="Orden descendente"),
+    estado: Optional[list[str]] = Query(None, description="Filtrar por estado (ok, diferencia, sin_cierre)"),
+    limit: Optional[int] = Query(None, ge=1, description="Filas por página"),
+    offset: int = Query(0, ge=0),
+    supabase = Depends(require_supabase)
+):
+    """
+    Cuadro comparativo de una conciliación guardada.
+    Se cachea por versión (fecha de modificación) de la conciliación.
+    """
+    from app.services.cuadro import (
+        CACHE_CUADROS, calcular_cuadro_comparativo, consultar_cuadro
+    )
+    try:
+        version = _version_conciliacion(supabase, conciliacion_id)
+        clave_cache = (conciliacion_id, version)
+
+        cuadro = CACHE_CUADROS.obtener(clave_cache)
+        if cuadro is None:
+            conciliacion = _cargar_conciliacion(supabase, conciliacion_id)
+            cuadro = await run_in_threadpool(
+                calcular_cuadro_comparativo,
+                conciliacion.get("agrupaciones") or [],
+                conciliacion.get("saldos_inicio") or [],
+                conciliacion.get("saldos_cierre") or []
+            )
+            CACHE_CUADROS.guardar(clave_cache, cuadro)
+
+        return {
+            "success": True,
+            **consultar_cuadro(cuadro, orden, desc, estado, limit, offset)
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular cuadro comparativo: {str(e)}")
+
+
+@router.post("/partidas-abiertas")
+async def partidas_abiertas(
+    agrupaciones: list[dict] = Body(..., description="Agrupaciones con sus registros"),
+    max_combinacion: int = Query(
+        3, ge=1, le=6, description="Partidas que un pago puede cancelar por suma exacta (1 desactiva)"
+    ),
+    max_candidatos: int = Query(
+        20, ge=2, le=100, description="Partidas abiertas mas antiguas consideradas en cada combinacion"
+    )
+):
+    """
+    Imputa facturas contra pagos dentro de cada agrupacion (por comprobante
+    citado, por importe y por combinaciones acotadas) y devuelve las partidas
+    abiertas de cada razon social.
+    """
+    from app.services.partidas_abiertas import calcular_partidas_abiertas
+    try:
+        cantidad = sum(len(a.get("registros") or []) for a in agrupaciones)
+        async with admitir("partidas_abiertas", 0, cantidad):
+            resultado = await run_in_threadpool(
+                calcular_partidas_abiertas, agrupaciones, max_combinacion, max_candidatos
+            )
+        return {
+            "success": True,
+            **resultado
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular partidas abiertas: {str(e)}")
+
+
+@router.get("/conciliaciones/{conciliacion_id}/partidas-abiertas")
+async def partidas_abiertas_conciliacion(
+    conciliacion_id: int,
+    max_combinacion: int = Query(
+        3, ge=1, le=6, description="Partidas que un pago puede cancelar por suma exacta (1 desactiva)"
+    ),
+    max_candidatos: int = Query(
+        20, ge=2, le=100, description="Partidas abiertas mas antiguas consideradas en cada combinacion"
+    ),
+    supabase = Depends(require_supabase)
+):
+    """
+    Partidas abiertas de una conciliación guardada.
+    Se cachea por versión (fecha de modificación) y límites de la búsqueda.
+    """
+    from app.services.partidas_abiertas import CACHE_PARTIDAS, calcular_partidas_abiertas
+    try:
+        version = _version_conciliacion(supabase, conciliacion_id)
+        clave_cache = (conciliacion_id, version, max_combinacion, max_candidatos)
+
+        resultado = CACHE_PARTIDAS.obtener(clave_cache)
+        if resultado is None:
+            conciliacion = _cargar_conciliacion(supabase, conciliacion_id)
+            _reconstruir_registros_agrupaciones(conciliacion)
+            agrupaciones = conciliacion.get("agrupaciones") or []
+            cantidad = sum(len(a.get("registros") or []) for a in agrupaciones)
+            async with admitir("partidas_abiertas", 0, cantidad):
+                resultado = await run_in_threadpool(
+                    calcular_partidas_abiertas, agrupaciones, max_combinacion, max_candidatos
+                )
+            CACHE_PARTIDAS.guardar(clave_cache, resultado)
+
+        return {
+            "success": True,
+            **resultado
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular partidas abiertas: {str(e)}")
+
+
+@router.post("/antiguedad")
+async def antiguedad_saldos(
+    agrupaciones: list[dict] = Body(..., description="Agrupaciones con sus registros"),
+    corte: Optional[date] = Query(None, description="Fecha de corte (por defecto hoy)"),
+    tramos: Optional[list[int]] = Query(None, description="Limites de los tramos en dias (por defecto 30, 60 y 90)"),
+    fifo: bool = Query(True, description="Cancelar el haber contra el debe mas antiguo"),
+    incluir_saldados: bool = Query(False, description="Incluir razones sociales con saldo cero")
+):
+    """
+    Antiguedad del saldo de cada razon social a la fecha de corte,
+    por tramos de dias.
+    """
+    from app.services.antiguedad import calcular_antiguedad
+    try:
+        cantidad = sum(len(a.get("registros") or []) for a in agrupaciones)
+        async with admitir("antiguedad", 0, cantidad):
+            resultado = await run_in_threadpool(
+                calcular_antiguedad, agrupaciones, corte, tramos, fifo, incluir_saldados
+            )
+        return {
+            "success": True,
+            **resultado
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular antigüedad: {str(e)}")
+
+
+@router.get("/conciliaciones/{conciliacion_id}/antiguedad")
+async def antiguedad_conciliacion(
+    conciliacion_id: int,
+    corte: Optional[date] = Query(None, description="Fecha de corte (por defecto hoy)"),
+    tramos: Optional[list[int]] = Query(None, description="Limites de los tramos en dias (por defecto 30, 60 y 90)"),
+    fifo: bool = Query(True, description="Cancelar el haber contra el debe mas antiguo"),
+    incluir_saldados: bool = Query(False, description="Incluir razones sociales con saldo cero"),
+    supabase = Depends(require_supabase)
+):
+    """
+    Antiguedad de saldos de una conciliación guardada.
+    Se cachea por versión (fecha de modificación) y parámetros.
+    """
+    from app.services.antiguedad import CACHE_ANTIGUEDAD, calcular_antiguedad
+    try:
+        corte = corte or date.today()
+        version = _version_conciliacion(supabase, conciliacion_id)
+        clave_cache = (
+            conciliacion_id, version, corte, tuple(tramos or ()), fifo, incluir_saldados
+        )
+
+        resultado = CACHE_ANTIGUEDAD.obtener(clave_cache)
+        if resultado is None:
+            conciliacion = _cargar_conciliacion(supabase, conciliacion_id)
+            _reconstruir_registros_agrupaciones(conciliacion)
+            agrupaciones = conciliacion.get("agrupaciones") or []
+            cantidad = sum(len(a.get("registros") or []) for a in agrupaciones)
+            async with admitir("antiguedad", 0, cantidad):
+                resultado = await run_in_threadpool(
+                    calcular_antiguedad, agrupaciones, corte, tramos, fifo, incluir_saldados
+                )
+            CACHE_ANTIGUEDAD.guardar(clave_cache, resultado)
+
+        return {
+            "success": True,
+            **resultado
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular antigüedad: {str(e)}")
+
+
+@router.post("/conciliaciones/{conciliacion_id}/roll-forward")
+async def roll_forward_conciliacion(
+    conciliacion_id: int,
+    siguiente_id: Optional[int] = Query(None, description="Conciliacion del periodo siguiente"),
+    aplicar: bool = Query(False, description="Guardar los cierres como saldos de inicio de siguiente_id"),
+    supabase = Depends(require_supabase)
+):
+    """
+    Lleva los saldos de cierre de una conciliación al período siguiente.
+    Con siguiente_id compara ambos períodos por agrupación (cierre anterior,
+    apertura, movimientos y variación). Trabaja con los agregados
+    materializados de cada conciliación, sin cargar registros.
+    """
+    from app.services.agregados import eliminar_agregados, roll_forward
+    try:
+        if aplicar and siguiente_id is None:
+            raise HTTPException(status_code=400, detail="aplicar requiere siguiente_id")
+        if siguiente_id == conciliacion_id:
+            raise HTTPException(status_code=400, detail="siguiente_id debe ser otra conciliación")
+
+        anterior = await run_in_threadpool(_agregados_conciliacion, supabase, conciliacion_id)
+        siguiente = None
+        if siguiente_id is not None:
+            siguiente = await run_in_threadpool(_agregados_conciliacion, supabase, siguiente_id)
+
+        resultado = await run_in_threadpool(roll_forward, anterior, siguiente)
+
+        if aplicar:
+            supabase.table("conciliaciones_mayor").update({
+                "saldos_inicio": resultado["saldos_inicio"],
+                "fecha_modificacion": datetime.now(timezone.utc).isoformat(),
+            }).eq("id", siguiente_id).execute()
+            _invalidar_caches_conciliacion(siguiente_id)
+
+            # Los agregados del siguiente dependen de sus saldos de inicio
+            try:
+                eliminar_agregados(supabase, siguiente_id)
+            except Exception as e:
+                print(f"Advertencia: no se eliminaron los agregados de la conciliación: {e}")
+            siguiente = await run_in_threadpool(_agregados_conciliacion, supabase, siguiente_id)
+            resultado = await run_in_threadpool(roll_forward, anterior, siguiente)
+
+        return {
+            "success": True,
+            "conciliacion_id": conciliacion_id,
+            "siguiente_id": siguiente_id,
+            "aplicado": aplicar,
+            **resultado
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al calcular roll-forward: {str(e)}")
+
+
+@router.get("/conciliaciones/{conciliacion_id}/exportar")
+async def exportar_conciliacion(
+    conciliacion_id: int,
+    supabase = Depends(require_supabase)
+):
+    """
+    Exporta una conciliación guardada a Excel: resumen de agrupaciones,
+    detalle de registros, sin asignar y cuadro comparativo (si hay saldos).
+    Registros y agrupaciones se leen como bytes y se recorren elemento por
+    elemento (ArregloJSON) sin cargarlos como listas; solo si las agrupaciones
+    se guardaron sin sus registros se carga la conciliación completa para
+    reconstruirlas. El libro se escribe fila por fila a un archivo temporal y
+    se envía en streaming.
+    """
+    from app.services.cuadro import CACHE_CUADROS, calcular_cuadro_comparativo
+    from app.services.exportacion import escribir_xlsx, registros_sin_asignar
+    from app.services.serializacion import ArregloJSON
+    destino = None
+    try:
+        # Admitir con la cantidad de la cabecera, antes de cargar los registros
+        cabecera = _cargar_cabecera(supabase, conciliacion_id)
+
+        with tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False) as archivo:
+            destino = archivo.name
+
+        async with admitir("exportar_xlsx", 0, cabecera.get("registros_count") or 0):
+            arreglos = await run_in_threadpool(_arreglos_crudos, supabase, cabecera)
+            if arreglos is not None:
+                conciliacion = cabecera
+                registros = ArregloJSON(arreglos["registros"])
+                agrupaciones = ArregloJSON(arreglos["agrupaciones"])
+            else:
+                conciliacion = await run_in_threadpool(_cargar_conciliacion, supabase, conciliacion_id)
+                _reconstruir_registros_agrupaciones(conciliacion)
+                registros = conciliacion.get("registros") or []
+                agrupaciones = conciliacion.get("agrupaciones") or []
+
+            cuadro = None
+            if conciliacion.get("saldos_inicio") or conciliacion.get("saldos_cierre"):
+                clave_cache = (conciliacion_id, str(conciliacion.get("fecha_modificacion")))
+                cuadro = CACHE_CUADROS.obtener(clave_cache)
+                if cuadro is None:
+                    # El cuadro solo usa los totales de cada agrupación
+                    totales = await run_in_threadpool(_agrupaciones_sin_registros, agrupaciones)
+                    cuadro = await run_in_threadpool(
+                        calcular_cuadro_comparativo,
+                        totales,
+                        conciliacion.get("saldos_inicio") or [],
+                        conciliacion.get("saldos_cierre") or []
+                    )
+                    CACHE_CUADROS.guardar(clave_cache, cuadro)
+
+            await run_in_threadpool(
+                escribir_xlsx, destino, agrupaciones,
+                registros_sin_asignar(registros, agrupaciones), cuadro
+            )
+
+        return FileResponse(
+            destino,
+            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            filename=f"conciliacion_{conciliacion_id}.xlsx",
+            background=BackgroundTask(os.unlink, destino)
+        )
+    except HTTPException:
+        if destino:
+            os.unlink(destino)
+        raise
+    except Exception as e:
+        if destino:
+            os.unlink(destino)
+        raise HTTPException(status_code=500, detail=f"Error al exportar conciliación: {str(e)}")
+
+
+@router.get("/conciliaciones/{conciliacion_id}/registros")
+async def buscar_registros(
+    conciliacion_id: int,
+    q: Optional[str] = Query(None, description="Palabras de la descripcion o razon social"),
+    fecha_desde: Optional[date] = Query(None),
+    fecha_hasta: Optional[date] = Query(None),
+    importe_min: Optional[float] = Query(None, description="Importe minimo del movimiento (debe o haber)"),
+    importe_max: Optional[float] = Query(None),
+    comprobante: Optional[str] = Query(None),
+    asiento: Optional[str] = Query(None),
+    orden: str = Query("posicion", description="posicion, fecha o importe"),
+    desc: bool = Query(False, description="Orden descendente"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    supabase = Depends(require_supabase)
+):
+    """
+    Busca registros de una conciliación guardada sin descargarlos todos.
+    Los índices se construyen la primera vez y se cachean por versión
+    (fecha de modificación) de la conciliación.
+    """
+    from app.services.busqueda import CACHE_INDICES, IndiceRegistros
+    try:
+        version = _version_conciliacion(supabase, conciliacion_id)
+        clave_cache = (conciliacion_id, version)
+
+        indice = CACHE_INDICES.obtener(clave_cache)
+        if indice is None:
+            conciliacion = _cargar_conciliacion(supabase, conciliacion_id)
+            indice = await run_in_threadpool(
+                IndiceRegistros, conciliacion.get("registros") or []
+            )
+            CACHE_INDICES.guardar(clave_cache, indice)
+
+        return {
+            "success": True,
+            **indice.buscar(
+                q, fecha_desde, fecha_hasta, importe_min, importe_max,
+                comprobante, asiento, orden, desc, limit, offset
+            )
+        }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al buscar registros: {str(e)}")
+
+
 @router.post("/procesar-saldos")
 async def procesar_archivo_saldos(
     file: UploadFile = File(...),
@@ -413,97 +1493,60 @@ async def procesar_archivo_saldos(
     Procesa un archivo Excel con saldos por razón social.
     Espera columnas: Razón Social / Nombre y Saldo / Monto / Importe
     """
-    import pandas as pd
-    from io import BytesIO
-
+    from app.services.procesamiento import procesar_saldos
     try:
         if not file.filename.endswith(('.xlsx', '.xls', '.csv')):
             raise HTTPException(status_code=400, detail="El archivo debe ser Excel o CSV")
 
-        contenido = await file.read()
+        contenido = await leer_archivo_limitado(file)
+        filas = contar_filas_estimadas(contenido, file.filename)
 
-        # Leer archivo
-        if file.filename.endswith('.csv'):
-            df = pd.read_csv(BytesIO(contenido))
-        else:
-            df = pd.read_excel(BytesIO(contenido))
-
-        # Normalizar nombres de columnas
-        df.columns = df.columns.str.strip().str.lower()
-
-        # Buscar columna de razón social
-        col_razon = None
-        for col in df.columns:
-            if any(x in col for x in ['razon', 'razón', 'nombre', 'cliente', 'proveedor', 'deudor']):
-                col_razon = col
-                break
-
-        if not col_razon:
-            # Usar primera columna de texto
-            for col in df.columns:
-                if df[col].dtype == 'object':
-                    col_razon = col
-                    break
-
-        if not col_razon:
-            raise HTTPException(status_code=400, detail="No se encontró columna de razón social")
-
-        # Buscar columna de saldo
-        col_saldo = None
-        for col in df.columns:
-            if any(x in col for x in ['saldo', 'monto', 'importe', 'total', 'debe', 'haber']):
-                col_saldo = col
-                break
-
-        if not col_saldo:
-            # Buscar primera columna numérica
-            for col in df.columns:
-                if col != col_razon and pd.api.types.is_numeric_dtype(df[col]):
-                    col_saldo = col
-                    break
-
-        if not col_saldo:
-            raise HTTPException(status_code=400, detail="No se encontró columna de saldo")
-
-        # Procesar datos
-        saldos = []
-        for _, row in df.iterrows():
-            razon = str(row[col_razon]).strip() if pd.notna(row[col_razon]) else ''
-            if not razon or razon.lower() in ['nan', 'none', '']:
-                continue
-
-            try:
-                saldo_val = row[col_saldo]
-                if pd.isna(saldo_val):
-                    saldo = 0.0
-                elif isinstance(saldo_val, str):
-                    # Limpiar formato de moneda
-                    saldo_str = saldo_val.replace('$', '').replace('.', '').replace(',', '.').strip()
-                    saldo = float(saldo_str) if saldo_str else 0.0
-                else:
-                    saldo = float(saldo_val)
-            except (ValueError, TypeError):
-                saldo = 0.0
-
-            saldos.append({
-                "razonSocial": razon,
-                "saldo": saldo
-            })
+        async with admitir("procesar_saldos", len(contenido), filas):
+            resultado = await run_in_threadpool(procesar_saldos, contenido, file.filename)
 
         return {
             "success": True,
-            "saldos": saldos,
-            "total": len(saldos),
-            "columna_razon": col_razon,
-            "columna_saldo": col_saldo
+            "saldos": resultado['saldos'],
+            "total": resultado['total'],
+            "columna_razon": resultado['columna_razon'],
+            "columna_saldo": resultado['columna_saldo']
         }
 
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al procesar saldos: {str(e)}")
 
 
+@router.post("/emparejar-saldos")
+async def emparejar_saldos_agrupaciones(
+    datos: EmparejarSaldosRequest,
+    umbral_similitud: float = Query(0.75, ge=0, le=1, description="Similitud mínima para proponer un emparejamiento"),
+    max_alternativas: int = Query(3, ge=0, le=20, description="Candidatos adicionales por saldo")
+):
+    """
+    Propone la agrupación correspondiente a cada saldo del archivo de saldos.
+    Devuelve el mejor candidato, su similitud y candidatos alternativos.
+    """
+    from app.services.emparejamiento import emparejar_saldos
+    try:
+        resultado = await run_in_threadpool(
+            emparejar_saldos,
+            datos.saldos,
+            datos.agrupaciones,
+            umbral_similitud,
+            max_alternativas
+        )
+        return {
+            "success": True,
+            **resultado
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error al emparejar saldos: {str(e)}")
+
+
 @router.delete("/conciliaciones/{conciliacion_id}")
 async def eliminar_conciliacion(
     conciliacion_id: int,
@@ -520,6 +1563,14 @@ async def eliminar_conciliacion(
             "conciliacion_id", conciliacion_id
         ).execute()
 
+        try:
+            from app.services.agregados import eliminar_agregados
+            eliminar_agregados(supabase, conciliacion_id)
+        except Exception as e:
+            print(f"Advertencia: no se eliminaron los agregados de la conciliación: {e}")
+
+        _invalidar_caches_conciliacion(conciliacion_id)
+
         # Eliminar conciliacion principal
         supabase.table("conciliaciones_mayor").delete().eq(
             "id", conciliacion_id
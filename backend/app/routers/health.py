@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
 
 from app.config import get_settings, Settings
+from app.services.admision import obtener_metricas
 
 router = APIRouter()
 
@@ -30,6 +31,15 @@ async def health_check():
     )
 
 
+@router.get("/health/metrics")
+async def metrics():
+    """Uso de memoria del worker y métricas de admisión por operación"""
+    return JSONResponse(
+        content=obtener_metricas(),
+        headers={"Access-Control-Allow-Origin": "*"}
+    )
+
+
 @router.get("/health/db")
 async def db_health_check(settings: Settings = Depends(get_settings)):
     """Verifica la conexión a Supabase"""
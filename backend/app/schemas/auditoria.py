@@ -42,15 +42,41 @@ class ConciliacionListItem(BaseModel):
     fecha_modificacion: Optional[datetime] = None
     registros_count: Optional[int] = 0
     agrupaciones_count: Optional[int] = 0
+    # Resumen precalculado (solo con incluir_resumen)
+    total_debe: Optional[float] = None
+    total_haber: Optional[float] = None
+    saldo: Optional[float] = None
 
 
 class ConciliacionListResponse(BaseModel):
     """Respuesta de listado de conciliaciones"""
     conciliaciones: List[ConciliacionListItem]
     total: int
+    siguiente_cursor: Optional[str] = None  # None en la última página
 
 
 class FusionRequest(BaseModel):
     """Request para fusionar dos agrupaciones"""
     agrupacion_destino: dict
     agrupacion_origen: dict
+    cliente_id: Optional[str] = None  # Si se indica, la fusión se guarda como alias
+
+
+class AliasRequest(BaseModel):
+    """Alias a guardar: las variantes pasan a pertenecer a la razón canónica"""
+    cliente_id: str
+    razon_canonica: str
+    variantes: List[str]
+
+
+class CuadroComparativoRequest(BaseModel):
+    """Datos para calcular el cuadro comparativo sin guardar la conciliación"""
+    agrupaciones: List[dict]
+    saldosInicio: Optional[List[dict]] = []
+    saldosCierre: Optional[List[dict]] = []
+
+
+class EmparejarSaldosRequest(BaseModel):
+    """Saldos a emparejar contra las agrupaciones del mayor"""
+    saldos: List[dict]
+    agrupaciones: List[dict]
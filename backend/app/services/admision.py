@@ -0,0 +1,283 @@
+"""
+Control de admisión para trabajos pesados (carga y procesamiento de mayores).
+Limita el tamaño de los archivos, reserva memoria estimada contra un
+presupuesto global del worker y mide el pico real de memoria por request.
+"""
+import asyncio
+import os
+import re
+import threading
+import time
+import zipfile
+from contextlib import asynccontextmanager
+from io import BytesIO
+from typing import Any
+
+from fastapi import HTTPException, UploadFile
+
+from app.config import get_settings
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+TAMANO_BLOQUE = 1024 * 1024
+
+# Costo aproximado en memoria de cada fila durante todo el pipeline
+# (parseo de openpyxl, DataFrame, dicts de registros y agrupaciones)
+BYTES_POR_FILA = 4 * 1024
+
+# Bytes comprimidos por fila en un .xlsx típico, para estimar filas sin leerlo
+BYTES_XLSX_POR_FILA = 100
+
+_PATRON_DIMENSION = re.compile(rb'<dimension ref="[A-Z]+\d+(?::[A-Z]+(\d+))?"')
+
+
+async def leer_archivo_limitado(archivo: UploadFile, max_bytes: int | None = None) -> bytes:
+    """
+    Lee un archivo subido por bloques, cortando apenas supera el límite.
+
+    Raises:
+        HTTPException 413 si el archivo excede el tamaño permitido
+    """
+    if max_bytes is None:
+        max_bytes = get_settings().max_upload_mb * 1024 * 1024
+
+    if archivo.size is not None and archivo.size > max_bytes:
+        raise _error_tamano(max_bytes, archivo.filename)
+
+    partes = []
+    leidos = 0
+    while True:
+        bloque = await archivo.read(TAMANO_BLOQUE)
+        if not bloque:
+            break
+        leidos += len(bloque)
+        if leidos > max_bytes:
+            raise _error_tamano(max_bytes, archivo.filename)
+        partes.append(bloque)
+
+    return b''.join(partes)
+
+
+def _error_tamano(max_bytes: int, nombre_archivo: str | None = None) -> HTTPException:
+    archivo = f"El archivo {nombre_archivo}" if nombre_archivo else "El archivo"
+    return HTTPException(
+        status_code=413,
+        detail=f"{archivo} supera el tamaño máximo permitido ({max_bytes // (1024 * 1024)} MB)"
+    )
+
+
+def contar_filas_estimadas(contenido: bytes, nombre_archivo: str) -> int | None:
+    """
+    Estima la cantidad de filas sin parsear el archivo completo.
+    En .xlsx lee la etiqueta <dimension> de la primera hoja; en CSV cuenta saltos de línea.
+    """
+    nombre = nombre_archivo.lower()
+    if nombre.endswith('.csv'):
+        return contenido.count(b'\n')
+
+    if nombre.endswith('.xlsx'):
+        try:
+            with zipfile.ZipFile(BytesIO(contenido)) as zf:
+                hojas = sorted(
+                    n for n in zf.namelist()
+                    if n.startswith('xl/worksheets/sheet') and n.endswith('.xml')
+                )
+                if not hojas:
+                    return None
+                with zf.open(hojas[0]) as f:
+                    cabecera = f.read(4096)
+            match = _PATRON_DIMENSION.search(cabecera)
+            if match and match.group(1):
+                return int(match.group(1))
+        except (zipfile.BadZipFile, KeyError, ValueError):
+            return None
+
+    return None
+
+
+def estimar_memoria(tamano_bytes: int, filas: int | None = None) -> int:
+    """
+    Estima los bytes que ocupará un trabajo mientras se procesa.
+    Cuenta el contenido crudo (y su copia en BytesIO) más un costo fijo por fila.
+    """
+    if filas is None:
+        filas = tamano_bytes // BYTES_XLSX_POR_FILA
+    return 2 * tamano_bytes + filas * BYTES_POR_FILA
+
+
+def rss_actual() -> int:
+    """RSS actual del proceso en bytes (0 si no se puede medir)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    if resource is not None:
+        # ru_maxrss es el pico del proceso (KB en Linux), mejor que nada
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return 0
+
+
+class MedidorMemoria:
+    """
+    Muestrea el RSS del proceso en un hilo mientras dura un bloque `with`.
+    El pico es relativo al RSS al entrar, por lo que con trabajos concurrentes
+    incluye también la memoria de los demás.
+    """
+
+    def __init__(self, intervalo: float = 0.05):
+        self.intervalo = intervalo
+        self.base = 0
+        self.pico = 0
+        self._detener = threading.Event()
+        self._hilo: threading.Thread | None = None
+
+    def _muestrear(self):
+        while not self._detener.wait(self.intervalo):
+            self.pico = max(self.pico, rss_actual())
+
+    def __enter__(self):
+        self.base = rss_actual()
+        self.pico = self.base
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._detener.set()
+        self._hilo.join()
+        self.pico = max(self.pico, rss_actual())
+        return False
+
+    @property
+    def pico_mb(self) -> float:
+        return round(max(self.pico - self.base, 0) / (1024 * 1024), 1)
+
+
+class PresupuestoMemoria:
+    """
+    Presupuesto global de memoria del worker.
+    Cada trabajo reserva su costo estimado; si no hay lugar espera en cola
+    hasta `espera` segundos y luego responde 429.
+    """
+
+    def __init__(self, capacidad: int):
+        self.capacidad = capacidad
+        self.en_uso = 0
+        self.en_espera = 0
+        self._condicion = asyncio.Condition()
+
+    async def adquirir(self, costo: int, espera: float) -> int:
+        """Reserva `costo` bytes y retorna lo efectivamente reservado."""
+        # Un trabajo más grande que el presupuesto corre solo, no se rechaza siempre
+        costo = min(costo, self.capacidad)
+
+        async with self._condicion:
+            if self.en_uso + costo > self.capacidad:
+                self.en_espera += 1
+                try:
+                    await asyncio.wait_for(
+                        self._condicion.wait_for(lambda: self.en_uso + costo <= self.capacidad),
+                        timeout=espera
+                    )
+                except asyncio.TimeoutError:
+                    raise HTTPException(
+                        status_code=429,
+                        detail="Servidor ocupado procesando otros archivos. Intente nuevamente en unos segundos.",
+                        headers={"Retry-After": str(max(int(espera), 1))}
+                    )
+                finally:
+                    self.en_espera -= 1
+            self.en_uso += costo
+
+        return costo
+
+    async def liberar(self, costo: int):
+        async with self._condicion:
+            self.en_uso -= costo
+            self._condicion.notify_all()
+
+
+_presupuesto: PresupuestoMemoria | None = None
+_metricas: dict[str, dict[str, Any]] = {}
+
+
+def obtener_presupuesto() -> PresupuestoMemoria:
+    global _presupuesto
+    if _presupuesto is None:
+        settings = get_settings()
+        _presupuesto = PresupuestoMemoria(settings.memoria_presupuesto_mb * 1024 * 1024)
+    return _presupuesto
+
+
+def _metricas_operacion(operacion: str) -> dict[str, Any]:
+    if operacion not in _metricas:
+        _metricas[operacion] = {
+            'trabajos': 0,
+            'rechazados': 0,
+            'estimado_mb_ultimo': 0.0,
+            'pico_mb_ultimo': 0.0,
+            'pico_mb_max': 0.0,
+            'duracion_ms_ultimo': 0,
+        }
+    return _metricas[operacion]
+
+
+@asynccontextmanager
+async def admitir(
+    operacion: str,
+    tamano_bytes: int,
+    filas: int | None = None,
+    espera: float | None = None
+):
+    """
+    Reserva memoria para un trabajo y mide su pico real. `espera` reemplaza
+    la espera máxima en cola de la configuración (0 = solo si hay lugar ya).
+
+    Uso:
+        async with admitir("procesar_excel", len(contenido), filas):
+            resultado = await run_in_threadpool(procesar_excel, ...)
+    """
+    settings = get_settings()
+    costo = estimar_memoria(tamano_bytes, filas)
+    metricas = _metricas_operacion(operacion)
+
+    presupuesto = obtener_presupuesto()
+    try:
+        reservado = await presupuesto.adquirir(
+            costo, settings.admision_espera_segundos if espera is None else espera
+        )
+    except HTTPException:
+        metricas['rechazados'] += 1
+        raise
+
+    try:
+        inicio = time.perf_counter()
+        with MedidorMemoria() as medidor:
+            yield
+    finally:
+        await presupuesto.liberar(reservado)
+
+    metricas['trabajos'] += 1
+    metricas['estimado_mb_ultimo'] = round(costo / (1024 * 1024), 1)
+    metricas['pico_mb_ultimo'] = medidor.pico_mb
+    metricas['pico_mb_max'] = max(metricas['pico_mb_max'], medidor.pico_mb)
+    metricas['duracion_ms_ultimo'] = int((time.perf_counter() - inicio) * 1000)
+
+
+def obtener_metricas() -> dict[str, Any]:
+    """Estado del presupuesto y métricas por operación."""
+    presupuesto = obtener_presupuesto()
+    return {
+        'memoria': {
+            'presupuesto_mb': round(presupuesto.capacidad / (1024 * 1024), 1),
+            'en_uso_mb': round(presupuesto.en_uso / (1024 * 1024), 1),
+            'en_espera': presupuesto.en_espera,
+            'rss_mb': round(rss_actual() / (1024 * 1024), 1),
+        },
+        'operaciones': _metricas,
+    }
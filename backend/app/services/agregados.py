@@ -0,0 +1,220 @@
+"""
+Agregados materializados por conciliación y agrupación.
+
+Al guardar una conciliación se guarda también una fila compacta por
+agrupación (saldo inicio, debe, haber, ajuste y cierre, en centavos), con la
+misma lógica del cuadro comparativo. El roll-forward entre períodos trabaja
+solo con estas filas: no carga registros ni agrupaciones completas.
+
+Las agrupaciones de distintos períodos se cruzan por clave de agrupación
+(generar_clave_agrupacion de la razón social), así variantes menores del
+nombre siguen siendo la misma contraparte.
+
+Tabla en Supabase:
+    agregados_agrupacion(conciliacion_id, clave, razon_social, cantidad,
+        saldo_inicio, debe, haber, ajuste, saldo_cierre)
+    con clave única (conciliacion_id, clave); importes BIGINT en centavos
+"""
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from app.services.agrupacion import generar_clave_agrupacion
+from app.services.cuadro import calcular_cuadro_comparativo, mapa_saldos, normalizar_razones
+from app.services.modelo import a_centavos
+
+
+TABLA_AGREGADOS = "agregados_agrupacion"
+
+COLUMNAS_AGREGADOS = [
+    'clave', 'razon_social', 'cantidad',
+    'saldo_inicio', 'debe', 'haber', 'ajuste', 'saldo_cierre'
+]
+COLUMNAS_IMPORTES = ['saldo_inicio', 'debe', 'haber', 'ajuste', 'saldo_cierre']
+
+TAMANO_LOTE_INSERCION = 1000
+
+ESTADO_CONTINUA = 'continua'
+ESTADO_NUEVA = 'nueva'
+ESTADO_SIN_MOVIMIENTO = 'sin_movimiento'
+
+
+def _saldos_sin_agrupacion(agrupaciones: list[dict], saldos_inicio: list[dict]) -> pd.DataFrame:
+    """
+    Filas de los saldos de inicio que no cruzan con ninguna agrupación (la
+    contraparte no tuvo movimientos en el período): el cierre es el inicio.
+    """
+    mapa_inicio = mapa_saldos(saldos_inicio)
+    razones_agrupaciones = normalizar_razones(
+        pd.Series([a.get('razonSocial') for a in agrupaciones], dtype=object)
+    )
+    sin_agrupacion = mapa_inicio[~mapa_inicio.index.isin(razones_agrupaciones)]
+    sin_agrupacion = sin_agrupacion[sin_agrupacion != 0]
+
+    # Razón social original del último saldo de cada razón normalizada
+    razones_saldos = pd.Series([s.get('razonSocial') for s in saldos_inicio], dtype=object)
+    originales = dict(zip(normalizar_razones(razones_saldos), razones_saldos.fillna('').astype(str)))
+
+    razones = [originales.get(r, r) for r in sin_agrupacion.index]
+    inicio = a_centavos(sin_agrupacion.reset_index(drop=True))
+    ceros = np.zeros(len(razones), dtype=np.int64)
+    return pd.DataFrame({
+        'clave': [generar_clave_agrupacion(r) for r in razones],
+        'razon_social': razones,
+        'cantidad': ceros,
+        'saldo_inicio': inicio,
+        'debe': ceros,
+        'haber': ceros,
+        'ajuste': ceros,
+        'saldo_cierre': inicio,
+    })
+
+
+def calcular_agregados(
+    agrupaciones: list[dict],
+    saldos_inicio: list[dict] | None = None,
+    saldos_cierre: list[dict] | None = None
+) -> pd.DataFrame:
+    """
+    Una fila por clave de agrupación con los importes del cuadro comparativo
+    en centavos. El cierre es el saldo calculado más el ajuste de auditoría.
+    Agrupaciones con la misma clave se suman. Los saldos de inicio sin
+    agrupación en el período tienen su propia fila (sin movimientos), para
+    que el roll-forward no los pierda.
+
+    Returns:
+        DataFrame con las columnas de COLUMNAS_AGREGADOS
+    """
+    partes = []
+    if agrupaciones:
+        cuadro = calcular_cuadro_comparativo(agrupaciones, saldos_inicio, saldos_cierre)
+        df = pd.DataFrame({
+            'clave': [generar_clave_agrupacion(str(r or '')) for r in cuadro['razonSocial']],
+            'razon_social': cuadro['razonSocial'],
+            'cantidad': [
+                int(a.get('cantidad') or len(a.get('registros') or [])) for a in agrupaciones
+            ],
+            'saldo_inicio': a_centavos(cuadro['saldoInicio']),
+            'debe': a_centavos(cuadro['debe']),
+            'haber': a_centavos(cuadro['haber']),
+            'ajuste': a_centavos(cuadro['ajusteAuditoria']),
+        })
+        df['saldo_cierre'] = df['saldo_inicio'] + df['debe'] - df['haber'] + df['ajuste']
+        partes.append(df)
+    if saldos_inicio:
+        partes.append(_saldos_sin_agrupacion(agrupaciones or [], saldos_inicio))
+
+    partes = [p for p in partes if len(p)]
+    if not partes:
+        return pd.DataFrame(columns=COLUMNAS_AGREGADOS)
+
+    return pd.concat(partes, ignore_index=True).groupby('clave', sort=False, as_index=False).agg({
+        'razon_social': 'first',
+        'cantidad': 'sum',
+        **{c: 'sum' for c in COLUMNAS_IMPORTES}
+    })[COLUMNAS_AGREGADOS]
+
+
+def guardar_agregados(supabase, conciliacion_id: int, agregados: pd.DataFrame):
+    """Reemplaza los agregados guardados de una conciliación"""
+    supabase.table(TABLA_AGREGADOS).delete().eq("conciliacion_id", conciliacion_id).execute()
+    filas = agregados.assign(conciliacion_id=conciliacion_id).to_dict('records')
+    for inicio in range(0, len(filas), TAMANO_LOTE_INSERCION):
+        supabase.table(TABLA_AGREGADOS).insert(
+            filas[inicio:inicio + TAMANO_LOTE_INSERCION]
+        ).execute()
+
+
+def eliminar_agregados(supabase, conciliacion_id: int):
+    supabase.table(TABLA_AGREGADOS).delete().eq("conciliacion_id", conciliacion_id).execute()
+
+
+def obtener_agregados(supabase, conciliacion_id: int) -> pd.DataFrame | None:
+    """
+    Agregados guardados de una conciliación, o None si no tiene (guardada
+    antes de existir la tabla, o con agregados invalidados).
+    """
+    result = supabase.table(TABLA_AGREGADOS).select(
+        ", ".join(COLUMNAS_AGREGADOS)
+    ).eq("conciliacion_id", conciliacion_id).execute()
+    if not result.data:
+        return None
+    df = pd.DataFrame(result.data, columns=COLUMNAS_AGREGADOS)
+    df[COLUMNAS_IMPORTES + ['cantidad']] = df[COLUMNAS_IMPORTES + ['cantidad']].fillna(0).astype('int64')
+    return df
+
+
+def _a_importes(df: pd.DataFrame, columnas: list[str]) -> pd.DataFrame:
+    """Columnas en centavos a importes con dos decimales"""
+    df = df.copy()
+    for col in columnas:
+        df[col] = (df[col] / 100).round(2)
+    return df
+
+
+def roll_forward(anterior: pd.DataFrame, siguiente: pd.DataFrame | None = None) -> dict[str, Any]:
+    """
+    Lleva los cierres de un período como saldos de inicio del siguiente y,
+    si se da el siguiente, compara ambos períodos por clave.
+
+    Args:
+        anterior: Agregados del período que cierra
+        siguiente: Agregados del período siguiente (opcional)
+
+    Returns:
+        Dict con saldos_inicio (lista {razonSocial, saldo} para el siguiente
+        período; con siguiente se usa su razón social para cada clave) y, si
+        hay siguiente, los movimientos por clave y sus totales
+    """
+    cierres = anterior[anterior['saldo_cierre'] != 0]
+
+    if siguiente is None:
+        saldos = _a_importes(cierres, ['saldo_cierre'])
+        return {
+            'saldos_inicio': [
+                {'razonSocial': r, 'saldo': s}
+                for r, s in zip(saldos['razon_social'].tolist(), saldos['saldo_cierre'].tolist())
+            ],
+        }
+
+    cruce = anterior.merge(
+        siguiente, on='clave', how='outer', suffixes=('_anterior', ''), indicator=True
+    )
+    for col in COLUMNAS_IMPORTES:
+        cruce[col] = cruce[col].fillna(0).astype('int64')
+    cruce['cierre_anterior'] = cruce['saldo_cierre_anterior'].fillna(0).astype('int64')
+    cruce['razon_social'] = cruce['razon_social'].fillna(cruce['razon_social_anterior'])
+
+    cruce['diferencia_apertura'] = cruce['saldo_inicio'] - cruce['cierre_anterior']
+    cruce['variacion'] = cruce['saldo_cierre'] - cruce['cierre_anterior']
+    cruce['estado'] = np.select(
+        [cruce['_merge'] == 'right_only', cruce['_merge'] == 'left_only'],
+        [ESTADO_NUEVA, ESTADO_SIN_MOVIMIENTO],
+        ESTADO_CONTINUA
+    )
+
+    columnas_importe = [
+        'cierre_anterior', 'saldo_inicio', 'debe', 'haber', 'ajuste',
+        'saldo_cierre', 'variacion', 'diferencia_apertura'
+    ]
+    totales = {c: round(int(cruce[c].sum()) / 100, 2) for c in columnas_importe}
+    cruce = cruce.iloc[np.argsort(-cruce['variacion'].abs().to_numpy(), kind='stable')]
+
+    con_cierre = cruce[cruce['cierre_anterior'] != 0]
+    movimientos = _a_importes(cruce, columnas_importe)[
+        ['clave', 'razon_social', 'estado'] + columnas_importe
+    ].rename(columns={'razon_social': 'razonSocial'})
+
+    return {
+        'saldos_inicio': [
+            {'razonSocial': r, 'saldo': round(s / 100, 2)}
+            for r, s in zip(con_cierre['razon_social'].tolist(), con_cierre['cierre_anterior'].tolist())
+        ],
+        'movimientos': movimientos.to_dict('records'),
+        'totales': totales,
+        'conteo_estados': {
+            e: int((cruce['estado'] == e).sum())
+            for e in (ESTADO_CONTINUA, ESTADO_NUEVA, ESTADO_SIN_MOVIMIENTO)
+        },
+    }
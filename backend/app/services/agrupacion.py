@@ -2,8 +2,10 @@
 Servicio de agrupación de registros contables por razón social.
 Optimizado para patrones de sistemas contables argentinos.
 """
+import hashlib
 import re
 import unicodedata
+from functools import lru_cache
 
 
 # Palabras comunes que NO son razones sociales
@@ -42,37 +44,69 @@ PALABRAS_GENERICAS = {
 }
 
 
-def quitar_acentos(texto: str) -> str:
-    """Elimina acentos de un texto."""
+def _quitar_acentos_unicode(texto: str) -> str:
     return ''.join(
         c for c in unicodedata.normalize('NFD', texto)
         if unicodedata.category(c) != 'Mn'
     )
 
 
+def _tabla_acentos() -> dict[int, str]:
+    """
+    Letras de Latin-1 y Latin Extended-A cuya versión sin acentos es ASCII
+    (Á -> A, Ñ -> N, Ü -> U, ...), calculada con la misma regla que
+    quitar_acentos para que el resultado sea idéntico.
+    """
+    tabla = {}
+    for codigo in range(0x00C0, 0x0180):
+        letra = chr(codigo)
+        sin_acento = _quitar_acentos_unicode(letra)
+        if sin_acento != letra and sin_acento.isascii():
+            tabla[codigo] = sin_acento
+    return tabla
+
+
+TABLA_ACENTOS = str.maketrans(_tabla_acentos())
+# Para normalizar nombres además se reemplazan las comas por espacios
+TABLA_NORMALIZACION = str.maketrans({**_tabla_acentos(), ord(','): ' '})
+
+# Se aplican en este orden: cada una puede actuar sobre el resultado de la
+# anterior ("SAS A" -> "SASA "), por eso no se combinan en una sola alternancia
+_RE_SRL = re.compile(r'S\.?\s*R\.?\s*L\.?(?:\s|$)')
+_RE_SAS = re.compile(r'S\.?\s*A\.?\s*S\.?(?:\s|$)')
+_RE_SA = re.compile(r'S\.?\s*A\.?(?:\s|$)')
+# Puntuación y espacios: cualquier secuencia de caracteres que no son de palabra
+_RE_NO_PALABRA = re.compile(r'\W+')
+
+
+def quitar_acentos(texto: str) -> str:
+    """Elimina acentos de un texto."""
+    # Camino rápido: acentos del español con una tabla de translate
+    rapido = texto.translate(TABLA_ACENTOS)
+    if rapido.isascii():
+        return rapido
+    return _quitar_acentos_unicode(texto)
+
+
+@lru_cache(maxsize=200_000)
 def normalizar_nombre(nombre: str) -> str:
     """Normaliza un nombre para comparación y agrupación."""
     if not nombre:
         return ''
 
-    n = nombre.upper().strip()
-    n = quitar_acentos(n)
+    # Mayúsculas, sin acentos y sin comas
+    n = nombre.upper().strip().translate(TABLA_NORMALIZACION)
+    if not n.isascii():
+        n = _quitar_acentos_unicode(n)
 
-    # Quitar comas y reemplazar por espacio
-    n = n.replace(',', ' ')
+    # Normalizar sufijos empresariales (todos empiezan con S)
+    if 'S' in n:
+        n = _RE_SRL.sub('SRL ', n)
+        n = _RE_SAS.sub('SAS ', n)
+        n = _RE_SA.sub('SA ', n)
 
-    # Normalizar sufijos empresariales
-    n = re.sub(r'S\.?\s*R\.?\s*L\.?(?:\s|$)', 'SRL ', n)
-    n = re.sub(r'S\.?\s*A\.?\s*S\.?(?:\s|$)', 'SAS ', n)
-    n = re.sub(r'S\.?\s*A\.?(?:\s|$)', 'SA ', n)
-
-    # Quitar puntuación
-    n = re.sub(r'[^\w\s]', ' ', n)
-
-    # Quitar espacios múltiples
-    n = re.sub(r'\s+', ' ', n).strip()
-
-    return n
+    # Quitar puntuación y espacios múltiples
+    return _RE_NO_PALABRA.sub(' ', n).strip()
 
 
 def extraer_razon_social(leyenda: str) -> str:
@@ -192,17 +226,43 @@ def generar_clave_agrupacion(razon_social: str) -> str:
     return ' '.join(palabras[:4]) if palabras else razon_social
 
 
-def calcular_similitud(str1: str, str2: str) -> float:
+class PerfilNombre:
     """
-    Calcula similitud entre dos razones sociales (0 a 1).
-    Detecta variantes como "SQUILLACE, ROQUE" vs "SQUILLACE ROQUE"
+    Nombre normalizado y separado en palabras, listo para comparar.
+    Se construye una vez por nombre (ver perfil_nombre).
     """
-    if not str1 or not str2:
-        return 0.0
+    __slots__ = (
+        'normalizado', 'palabras', 'significativas', 'n_significativas',
+        'tiene_generica', 'largas'
+    )
 
-    # Normalizar ambos
-    s1 = normalizar_nombre(str1)
-    s2 = normalizar_nombre(str2)
+    def __init__(self, nombre: str):
+        self.normalizado = normalizar_nombre(nombre)
+        # Palabras de 2+ letras
+        self.palabras = tuple(p for p in self.normalizado.split() if len(p) >= 2)
+        # Palabras significativas: no son genéricas ni sufijos
+        significativas = [
+            p for p in self.palabras
+            if p not in SUFIJOS_EMPRESARIALES and p not in PALABRAS_GENERICAS
+        ]
+        self.significativas = frozenset(significativas)
+        # Cantidad con repeticiones (las reglas del mínimo la usan así)
+        self.n_significativas = len(significativas)
+        self.tiene_generica = any(p in PALABRAS_GENERICAS for p in self.palabras)
+        # Candidatas a coincidencia parcial
+        self.largas = frozenset(p for p in self.significativas if len(p) >= 4)
+
+
+@lru_cache(maxsize=100_000)
+def perfil_nombre(nombre: str) -> PerfilNombre:
+    """Perfil de un nombre, cacheado por valor."""
+    return PerfilNombre(nombre)
+
+
+def similitud_perfiles(p1: PerfilNombre, p2: PerfilNombre) -> float:
+    """Similitud entre dos perfiles (ver calcular_similitud)."""
+    s1 = p1.normalizado
+    s2 = p2.normalizado
 
     if s1 == s2:
         return 1.0
@@ -213,46 +273,28 @@ def calcular_similitud(str1: str, str2: str) -> float:
     if len(s1) >= 6 and s1 in s2:
         return 0.9
 
-    # Extraer palabras
-    def extraer_palabras(texto: str):
-        palabras = texto.split()
-        todas = [p for p in palabras if len(p) >= 2]
-        # Palabras significativas: no son genéricas ni sufijos
-        significativas = [
-            p for p in todas
-            if p not in SUFIJOS_EMPRESARIALES and p not in PALABRAS_GENERICAS
-        ]
-        return todas, significativas
-
-    todas1, sig1 = extraer_palabras(s1)
-    todas2, sig2 = extraer_palabras(s2)
-
-    if not sig1 or not sig2:
+    if not p1.n_significativas or not p2.n_significativas:
         return 0.0
 
-    set1 = set(sig1)
-    set2 = set(sig2)
+    set1 = p1.significativas
+    set2 = p2.significativas
 
     # Coincidencias exactas
     coincidencias = len(set1 & set2)
 
     # Coincidencias parciales (una palabra contiene a otra, ej: "SARRIES" en "SARRIES JORGE")
-    for p1 in set1:
-        for p2 in set2:
-            if p1 != p2 and len(p1) >= 4 and len(p2) >= 4:
-                if p1 in p2 or p2 in p1:
-                    coincidencias += 0.5
-                    break
+    for w1 in p1.largas:
+        for w2 in p2.largas:
+            if w1 != w2 and (w1 in w2 or w2 in w1):
+                coincidencias += 0.5
+                break
 
     # Determinar mínimo requerido
     # Si ambos tienen solo 1 palabra significativa, 1 coincidencia basta
     # Si tienen palabras genéricas, necesitan más coincidencias
-    tiene_generica1 = any(p in PALABRAS_GENERICAS for p in todas1)
-    tiene_generica2 = any(p in PALABRAS_GENERICAS for p in todas2)
-
-    if len(sig1) == 1 and len(sig2) == 1:
+    if p1.n_significativas == 1 and p2.n_significativas == 1:
         minimo = 1
-    elif tiene_generica1 or tiene_generica2:
+    elif p1.tiene_generica or p2.tiene_generica:
         # Si hay palabras genéricas, necesita más coincidencias
         minimo = 2
     else:
@@ -266,8 +308,23 @@ def calcular_similitud(str1: str, str2: str) -> float:
     return min(coincidencias / total, 1.0)
 
 
+def calcular_similitud(str1: str, str2: str) -> float:
+    """
+    Calcula similitud entre dos razones sociales (0 a 1).
+    Detecta variantes como "SQUILLACE, ROQUE" vs "SQUILLACE ROQUE"
+    """
+    if not str1 or not str2:
+        return 0.0
+
+    return similitud_perfiles(perfil_nombre(str1), perfil_nombre(str2))
+
+
 def generar_id_agrupacion(razon_social: str) -> str:
-    """Genera un ID único para una agrupación."""
-    import time
+    """
+    Genera el ID de una agrupación a partir de su clave canónica.
+    Es estable: la misma razón social produce siempre el mismo ID.
+    """
     base = re.sub(r'[^a-z0-9]', '_', razon_social.lower())[:50]
-    return f"agrup_{base}_{int(time.time() * 1000)}"
+    clave = generar_clave_agrupacion(razon_social)
+    digest = hashlib.blake2b(clave.encode('utf-8'), digest_size=6).hexdigest()
+    return f"agrup_{base}_{digest}"
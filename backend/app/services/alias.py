@@ -0,0 +1,124 @@
+"""
+Diccionario de alias de razones sociales por cliente.
+
+Guarda lo que el auditor ya decidió (fusiones y movimientos de registros
+entre agrupaciones): clave de agrupación -> razón social canónica. Al agrupar
+se consulta antes de comparar similitudes, así la misma variante cae siempre
+en el mismo grupo sin volver a calcularla.
+
+Tabla en Supabase:
+    alias_razon_social(cliente_id, clave, razon_canonica, fecha_modificacion)
+    con clave única (cliente_id, clave)
+"""
+import time
+from datetime import datetime, timezone
+from typing import Iterable
+
+from app.services.agrupacion import generar_clave_agrupacion
+from app.services.cache import CacheLRU
+
+
+TABLA_ALIAS = "alias_razon_social"
+
+# Cada worker mantiene su copia; otros workers ven los cambios al vencer el TTL
+TTL_ALIAS_SEGUNDOS = 300
+
+# cliente_id -> (momento de carga, dict clave -> razón canónica)
+_CACHE_ALIAS = CacheLRU(max_entradas=64)
+
+
+def _claves_validas(nombres: Iterable[str]) -> list[str]:
+    """Claves de agrupación distintas de los nombres, sin vacías ni 'Sin Asignar'."""
+    claves = (generar_clave_agrupacion(str(n or '')) for n in nombres)
+    return list(dict.fromkeys(c for c in claves if c and c != 'Sin Asignar'))
+
+
+def obtener_alias(supabase, cliente_id: str) -> dict[str, str]:
+    """
+    Alias de un cliente (clave -> razón social canónica), desde la cache del
+    worker o desde Supabase. Si la tabla no existe o falla la consulta se
+    retorna un diccionario vacío: agrupar sin alias sigue siendo válido.
+    """
+    en_cache = _CACHE_ALIAS.obtener(cliente_id)
+    if en_cache is not None and time.monotonic() - en_cache[0] < TTL_ALIAS_SEGUNDOS:
+        return en_cache[1]
+
+    try:
+        result = supabase.table(TABLA_ALIAS).select(
+            "clave, razon_canonica"
+        ).eq("cliente_id", cliente_id).execute()
+        alias = {r["clave"]: r["razon_canonica"] for r in result.data or []}
+    except Exception as e:
+        print(f"No se pudieron cargar los alias del cliente {cliente_id}: {e}")
+        return {}
+
+    _CACHE_ALIAS.guardar(cliente_id, (time.monotonic(), alias))
+    return alias
+
+
+def invalidar_alias(cliente_id: str):
+    _CACHE_ALIAS.invalidar(cliente_id)
+
+
+def guardar_alias(
+    supabase,
+    cliente_id: str,
+    razon_canonica: str,
+    variantes: Iterable[str]
+) -> int:
+    """
+    Registra que las variantes pertenecen a la razón social canónica.
+
+    Args:
+        supabase: Cliente Supabase
+        cliente_id: Cliente al que aplican los alias
+        razon_canonica: Razón social del grupo destino
+        variantes: Razones sociales (o variantes) que deben caer en ese grupo
+
+    Returns:
+        Cantidad de claves guardadas
+    """
+    claves = _claves_validas([razon_canonica, *variantes])
+    if not claves:
+        return 0
+
+    ahora = datetime.now(timezone.utc).isoformat()
+    filas = [
+        {
+            "cliente_id": cliente_id,
+            "clave": clave,
+            "razon_canonica": razon_canonica,
+            "fecha_modificacion": ahora,
+        }
+        for clave in claves
+    ]
+    supabase.table(TABLA_ALIAS).upsert(filas, on_conflict="cliente_id,clave").execute()
+    invalidar_alias(cliente_id)
+    return len(claves)
+
+
+def aprender_de_fusion(
+    supabase,
+    cliente_id: str,
+    agrupacion_destino: dict,
+    agrupacion_origen: dict
+) -> int:
+    """Guarda como alias del destino todas las variantes de ambas agrupaciones."""
+    razon_canonica = agrupacion_destino.get('razonSocial') or ''
+    variantes = [
+        agrupacion_origen.get('razonSocial') or '',
+        *(agrupacion_origen.get('variantes') or []),
+        *(agrupacion_destino.get('variantes') or []),
+    ]
+    return guardar_alias(supabase, cliente_id, razon_canonica, variantes)
+
+
+def eliminar_alias(supabase, cliente_id: str, claves: list[str]) -> int:
+    """Elimina alias de un cliente. Retorna la cantidad de claves eliminadas."""
+    if not claves:
+        return 0
+    supabase.table(TABLA_ALIAS).delete().eq(
+        "cliente_id", cliente_id
+    ).in_("clave", claves).execute()
+    invalidar_alias(cliente_id)
+    return len(claves)
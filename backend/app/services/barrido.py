@@ -0,0 +1,211 @@
+"""
+Barrido de umbrales de similitud.
+
+Para elegir umbral_similitud sin reagrupar en cada intento: los pares
+candidatos se puntúan una sola vez y se recorren de mayor a menor similitud
+con union-find (enlace simple, como el motor union_find de /agrupar). Cada
+umbral es un corte de ese recorrido, así que una sola pasada da los grupos de
+todos los umbrales y, opcionalmente, el historial de uniones (dendrograma).
+
+Los puntajes de los pares se guardan en cache por conjunto de claves: volver
+a barrer los mismos registros con otros umbrales no recalcula similitudes.
+"""
+import hashlib
+from typing import Any, Sequence
+
+import numpy as np
+import pandas as pd
+
+from app.services.cache import CacheLRU
+from app.services.modelo import a_importe, centavos
+from app.services.procesamiento import asignar_claves, claves_representativas
+from app.services.union_find import UnionFind, pares_candidatos, puntuar_pares
+
+
+UMBRALES_POR_DEFECTO = (0.5, 0.55, 0.6, 0.65, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95)
+MAX_UMBRALES = 50
+
+# digest de las claves -> (i, j, puntajes) de los pares candidatos
+_CACHE_PUNTAJES = CacheLRU(max_entradas=8)
+
+
+def _digest_claves(claves: list[str]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for clave in claves:
+        h.update(clave.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+def puntajes_candidatos(claves: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pares candidatos (i, j) de las claves y su similitud, desde la cache del
+    worker si ya se puntuaron las mismas claves.
+    """
+    digest = _digest_claves(claves)
+    en_cache = _CACHE_PUNTAJES.obtener(digest)
+    if en_cache is not None:
+        return en_cache
+
+    i, j = pares_candidatos(claves)
+    puntajes = puntuar_pares(claves, i, j)
+    resultado = (i, j, puntajes)
+    _CACHE_PUNTAJES.guardar(digest, resultado)
+    return resultado
+
+
+def _validar_umbrales(umbrales: Sequence[float] | None) -> list[float]:
+    """Umbrales distintos, de mayor a menor."""
+    if not umbrales:
+        umbrales = UMBRALES_POR_DEFECTO
+    if len(umbrales) > MAX_UMBRALES:
+        raise ValueError(f"Demasiados umbrales: {len(umbrales)}. Máximo: {MAX_UMBRALES}")
+    for umbral in umbrales:
+        if not 0 <= umbral <= 1:
+            raise ValueError(f"Umbral inválido: {umbral}. Debe estar entre 0 y 1")
+    return sorted(set(float(u) for u in umbrales), reverse=True)
+
+
+def barrer_umbrales(
+    registros: list[dict] | pd.DataFrame,
+    umbrales: Sequence[float] | None = None,
+    alias: dict[str, str] | None = None,
+    historial: bool = False
+) -> dict[str, Any]:
+    """
+    Resumen de la agrupación de los registros para varios umbrales.
+    Los grupos de cada umbral coinciden con los de agrupar_por_razon_social
+    con motor 'union_find' y enlace 'simple'.
+
+    Args:
+        registros: Lista de registros del mayor, o DataFrame ya tipado
+        umbrales: Umbrales a evaluar (entre 0 y 1)
+        alias: Alias aprendidos del cliente (ver services/alias.py)
+        historial: Incluir las uniones en orden de similitud decreciente,
+            hasta el menor umbral pedido
+
+    Returns:
+        Dict con un resumen por umbral (de mayor a menor) y, si se pidió,
+        el historial de uniones
+    """
+    umbrales = _validar_umbrales(umbrales)
+    alias = alias or {}
+
+    resultado: dict[str, Any] = {
+        'umbrales': [],
+        'total_registros': len(registros),
+        'registros_sin_asignar': len(registros),
+    }
+    if historial:
+        resultado['historial'] = []
+    if len(registros) == 0:
+        resultado['umbrales'] = [
+            {'umbral': u, 'total_agrupaciones': 0, 'agrupaciones_unidas': 0, 'agrupaciones': []}
+            for u in umbrales
+        ]
+        return resultado
+
+    df = asignar_claves(registros)
+    df_asignados = df[(df['razon_social'] != 'Sin Asignar').to_numpy()]
+    resultado['registros_sin_asignar'] = len(df) - len(df_asignados)
+
+    # Claves ordenadas: el resultado no depende del orden de los registros
+    claves, razones, pesos = claves_representativas(df_asignados)
+    cantidad = len(claves)
+
+    # Totales por clave, en centavos
+    posicion_clave = pd.Index(claves).get_indexer(df_asignados['clave_agrupacion'].astype(object))
+    debe_clave = np.zeros(cantidad, dtype=np.int64)
+    haber_clave = np.zeros(cantidad, dtype=np.int64)
+    np.add.at(debe_clave, posicion_clave, centavos(df_asignados, 'debe'))
+    np.add.at(haber_clave, posicion_clave, centavos(df_asignados, 'haber'))
+    pesos_clave = np.array(pesos, dtype=np.int64)
+
+    # Misma prioridad de razón canónica que agrupar_claves_union_find
+    orden_prioridad = sorted(
+        range(cantidad), key=lambda k: (claves[k] not in alias, -pesos[k], razones[k])
+    )
+    rango = np.empty(cantidad, dtype=np.int64)
+    rango[orden_prioridad] = np.arange(cantidad)
+    prioritaria = np.array(orden_prioridad, dtype=np.int64)
+
+    conjuntos = UnionFind(cantidad)
+    por_alias: dict[str, int] = {}
+    for k, clave in enumerate(claves):
+        if clave in alias:
+            conjuntos.unir(por_alias.setdefault(alias[clave], k), k)
+
+    i, j, puntajes = puntajes_candidatos(claves)
+    validos = puntajes >= umbrales[-1]
+    i, j, puntajes = i[validos], j[validos], puntajes[validos]
+    secuencia = np.lexsort((j, i, -puntajes))
+    i, j, puntajes = i[secuencia], j[secuencia], puntajes[secuencia]
+
+    def resumen(umbral: float) -> dict[str, Any]:
+        # Raíces de todas las claves por saltos de punteros sobre una copia
+        raices = np.array(conjuntos.padre, dtype=np.int64)
+        while True:
+            abuelos = raices[raices]
+            if np.array_equal(abuelos, raices):
+                break
+            raices = abuelos
+        _, grupo = np.unique(raices, return_inverse=True)
+        n_grupos = int(grupo.max()) + 1 if cantidad else 0
+
+        claves_grupo = np.bincount(grupo, minlength=n_grupos)
+        mejor = np.full(n_grupos, cantidad, dtype=np.int64)
+        np.minimum.at(mejor, grupo, rango)
+
+        # Miembros de cada grupo contiguos; sumas exactas en centavos por
+        # diferencia de acumulados en los límites de cada grupo
+        orden = np.argsort(grupo, kind='stable')
+        fin = np.cumsum(claves_grupo)
+        inicio = fin - claves_grupo
+
+        def sumas(valores: np.ndarray) -> np.ndarray:
+            acumulado = np.concatenate(([0], np.cumsum(valores[orden])))
+            return acumulado[fin] - acumulado[inicio]
+
+        debe_grupo = sumas(debe_clave)
+        haber_grupo = sumas(haber_clave)
+        cantidad_grupo = sumas(pesos_clave)
+
+        # Solo los grupos de más de una clave cambian con el umbral
+        agrupaciones = []
+        for g in np.flatnonzero(claves_grupo > 1).tolist():
+            miembros = orden[inicio[g]:fin[g]].tolist()
+            representante = int(prioritaria[mejor[g]])
+            agrupaciones.append({
+                'razonSocial': alias.get(claves[representante], razones[representante]),
+                'claves': len(miembros),
+                'cantidad': int(cantidad_grupo[g]),
+                'saldo': a_importe(int(debe_grupo[g] - haber_grupo[g])),
+                'variantes': sorted(razones[k] for k in miembros),
+            })
+        agrupaciones.sort(key=lambda x: (-abs(x['saldo']), x['razonSocial']))
+
+        return {
+            'umbral': umbral,
+            'total_agrupaciones': n_grupos,
+            'agrupaciones_unidas': len(agrupaciones),
+            'agrupaciones': agrupaciones,
+        }
+
+    siguiente = 0
+    for umbral in umbrales:
+        while siguiente < len(puntajes) and puntajes[siguiente] >= umbral:
+            a, b = int(i[siguiente]), int(j[siguiente])
+            ra, rb = conjuntos.raiz(a), conjuntos.raiz(b)
+            if ra != rb:
+                raiz = conjuntos.unir(ra, rb)
+                if historial:
+                    resultado['historial'].append({
+                        'similitud': round(float(puntajes[siguiente]), 4),
+                        'razon_a': razones[a],
+                        'razon_b': razones[b],
+                        'claves': conjuntos.tamano[raiz],
+                    })
+            siguiente += 1
+        resultado['umbrales'].append(resumen(umbral))
+
+    return resultado
@@ -0,0 +1,272 @@
+"""
+Búsqueda y filtrado de los registros de una conciliación en el servidor.
+
+IndiceRegistros se construye una vez por conciliación cargada y se guarda en
+cache por (conciliacion_id, fecha_modificacion):
+- fechas e importes como arrays ordenados (rangos con searchsorted)
+- comprobante y asiento en diccionarios valor normalizado -> posiciones (CSR)
+- índice de palabras por leyenda distinta (descripción + razón social),
+  con búsqueda por prefijo sobre el vocabulario ordenado
+
+Cada filtro da un array ordenado de posiciones; los filtros se intersectan y
+el resultado se ordena con rangos precalculados.
+"""
+import re
+from bisect import bisect_left
+from datetime import date
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from app.services.agrupacion import normalizar_nombre
+from app.services.cache import CacheLRU
+from app.services.modelo import a_centavos, a_importe, centavos, tipar_registros
+from app.services.procesamiento import asignar_claves, columna_descripcion
+
+
+ORDENES = ('posicion', 'fecha', 'importe')
+
+# Índices por (conciliacion_id, fecha_modificacion)
+CACHE_INDICES = CacheLRU(max_entradas=8)
+
+_RE_NO_CODIGO = re.compile(r'[^0-9A-Z]')
+
+
+def _normalizar_codigo(valor: Any) -> str:
+    """Comprobante o asiento comparable: mayúsculas, solo letras y dígitos"""
+    if valor is None or (isinstance(valor, float) and np.isnan(valor)):
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        # Asientos leídos como número (123.0)
+        valor = int(valor)
+    return _RE_NO_CODIGO.sub('', str(valor).upper())
+
+
+class IndiceCodigos:
+    """Comprobante o asiento normalizado -> posiciones (ordenadas) de los registros"""
+
+    def __init__(self, serie: pd.Series | None):
+        self.grupos: dict[str, int] = {}
+        if serie is None:
+            self.inicio = np.zeros(1, dtype=np.int64)
+            self.filas = np.zeros(0, dtype=np.int64)
+            return
+
+        # Una normalización por valor distinto; valores que normalizan igual
+        # comparten grupo
+        codigos, distintos = pd.factorize(serie.astype(object), use_na_sentinel=True)
+        grupo_distinto = np.array(
+            [self.grupos.setdefault(_normalizar_codigo(v), len(self.grupos)) for v in distintos],
+            dtype=np.int64
+        )
+        validas = np.flatnonzero(codigos >= 0)
+        grupo = grupo_distinto[codigos[validas]]
+        self.filas = validas[np.argsort(grupo, kind='stable')]
+        conteo = np.bincount(grupo, minlength=len(self.grupos))
+        self.inicio = np.concatenate([[0], np.cumsum(conteo)]).astype(np.int64)
+        self.grupos.pop('', None)
+
+    def buscar(self, valor: str) -> np.ndarray:
+        g = self.grupos.get(_normalizar_codigo(valor))
+        if g is None:
+            return np.zeros(0, dtype=np.int64)
+        return self.filas[self.inicio[g]:self.inicio[g + 1]]
+
+
+def _rango(orden: np.ndarray) -> np.ndarray:
+    """Posición de cada elemento dentro de `orden` (inversa de la permutación)"""
+    rango = np.empty(len(orden), dtype=np.int64)
+    rango[orden] = np.arange(len(orden))
+    return rango
+
+
+class IndiceRegistros:
+    """Índices de los registros de una conciliación para búsquedas rápidas."""
+
+    def __init__(self, registros: list[dict]):
+        self.registros = registros
+        df = asignar_claves(tipar_registros(pd.DataFrame(registros)))
+        self.cantidad = len(df)
+
+        # Importes del movimiento (debe o haber) en centavos
+        self.debe = centavos(df, 'debe')
+        self.haber = centavos(df, 'haber')
+        self.importe = np.maximum(self.debe, self.haber)
+        self.orden_importe = np.argsort(self.importe, kind='stable')
+        self.importes_ordenados = self.importe[self.orden_importe]
+
+        # Fechas válidas ordenadas; las vacías no entran en los rangos
+        if 'fecha' in df.columns:
+            fechas = df['fecha']
+            if not pd.api.types.is_datetime64_any_dtype(fechas):
+                fechas = pd.to_datetime(fechas, format='ISO8601', errors='coerce')
+            fechas = fechas.to_numpy(dtype='datetime64[ns]')
+        else:
+            fechas = np.full(self.cantidad, np.datetime64('NaT'), dtype='datetime64[ns]')
+        validas = ~np.isnat(fechas)
+        clave_fecha = fechas.view(np.int64).copy()
+        # Sin fecha al final en orden ascendente
+        clave_fecha[~validas] = np.iinfo(np.int64).max
+        orden_fecha = np.argsort(clave_fecha, kind='stable')
+        self.orden_fecha = orden_fecha[:int(validas.sum())]
+        self.fechas_ordenadas = clave_fecha[self.orden_fecha]
+
+        self.ordenes = {
+            'posicion': np.arange(self.cantidad, dtype=np.int64),
+            'fecha': orden_fecha,
+            'importe': self.orden_importe,
+        }
+        self.rangos = {nombre: _rango(o) for nombre, o in self.ordenes.items()}
+
+        self.comprobantes = IndiceCodigos(df['comprobante'] if 'comprobante' in df.columns else None)
+        self.asientos = IndiceCodigos(df['asiento'] if 'asiento' in df.columns else None)
+
+        self._indexar_textos(df)
+
+    def _indexar_textos(self, df: pd.DataFrame):
+        """
+        Palabras de cada leyenda distinta (la razón social sale de la leyenda,
+        así que sus palabras se indexan junto con ella) y registros de cada una.
+        """
+        col = columna_descripcion(df)
+        if col is None:
+            self.vocabulario: list[str] = []
+            self.leyendas_por_palabra: list[np.ndarray] = []
+            self.filas_por_leyenda = np.zeros(0, dtype=np.int64)
+            self.inicio_leyenda = np.zeros(1, dtype=np.int64)
+            return
+
+        serie = df[col]
+        if not isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype('category')
+        leyendas = serie.cat
+        primeras = pd.DataFrame({
+            'c': leyendas.codes.to_numpy(),
+            'r': df['razon_social'].astype(object).to_numpy()
+        }).drop_duplicates('c')
+        razon_por_leyenda = dict(zip(primeras['c'].tolist(), primeras['r'].tolist()))
+
+        por_palabra: dict[str, list[int]] = {}
+        for codigo, texto in enumerate(leyendas.categories):
+            palabras = set(normalizar_nombre(str(texto)).split())
+            palabras.update(normalizar_nombre(str(razon_por_leyenda.get(codigo, ''))).split())
+            for palabra in palabras:
+                por_palabra.setdefault(palabra, []).append(codigo)
+
+        self.vocabulario = sorted(por_palabra)
+        self.leyendas_por_palabra = [np.array(por_palabra[p], dtype=np.int64) for p in self.vocabulario]
+
+        # Registros agrupados por leyenda (CSR); los vacíos (código -1) no se indexan
+        codigos = leyendas.codes.to_numpy().astype(np.int64)
+        con_leyenda = np.flatnonzero(codigos >= 0)
+        self.filas_por_leyenda = con_leyenda[np.argsort(codigos[con_leyenda], kind='stable')]
+        conteo = np.bincount(codigos[con_leyenda], minlength=len(leyendas.categories))
+        self.inicio_leyenda = np.concatenate([[0], np.cumsum(conteo)]).astype(np.int64)
+
+    def _buscar_texto(self, texto: str) -> np.ndarray:
+        """Registros cuya leyenda contiene todas las palabras (o prefijos) del texto"""
+        leyendas: np.ndarray | None = None
+        for palabra in normalizar_nombre(texto).split():
+            desde = bisect_left(self.vocabulario, palabra)
+            hasta = bisect_left(self.vocabulario, palabra + '\uffff')
+            if desde == hasta:
+                return np.zeros(0, dtype=np.int64)
+            coinciden = np.unique(np.concatenate(self.leyendas_por_palabra[desde:hasta]))
+            leyendas = coinciden if leyendas is None else np.intersect1d(leyendas, coinciden, assume_unique=True)
+
+        if leyendas is None:
+            return np.arange(self.cantidad, dtype=np.int64)
+        filas = [
+            self.filas_por_leyenda[self.inicio_leyenda[c]:self.inicio_leyenda[c + 1]]
+            for c in leyendas.tolist()
+        ]
+        return np.sort(np.concatenate(filas)) if filas else np.zeros(0, dtype=np.int64)
+
+    def buscar(
+        self,
+        texto: str | None = None,
+        fecha_desde: date | None = None,
+        fecha_hasta: date | None = None,
+        importe_min: float | None = None,
+        importe_max: float | None = None,
+        comprobante: str | None = None,
+        asiento: str | None = None,
+        orden: str = 'posicion',
+        descendente: bool = False,
+        limit: int = 100,
+        offset: int = 0
+    ) -> dict[str, Any]:
+        """
+        Filtra, ordena y pagina los registros.
+
+        Args:
+            texto: Palabras (o comienzos de palabra) de la descripción o razón social
+            fecha_desde, fecha_hasta: Rango de fechas, inclusive
+            importe_min, importe_max: Rango del importe del movimiento (debe o haber)
+            comprobante, asiento: Valor exacto (sin distinguir puntuación ni mayúsculas)
+            orden: 'posicion' (orden original), 'fecha' o 'importe'
+            descendente: Orden descendente
+            limit, offset: Paginación
+
+        Returns:
+            Dict con los registros de la página, el total de coincidencias y
+            los totales de debe y haber de todas ellas
+        """
+        if orden not in ORDENES:
+            raise ValueError(f"Orden inválido: {orden}. Opciones: {', '.join(ORDENES)}")
+
+        filtros: list[np.ndarray] = []
+        if texto and texto.strip():
+            filtros.append(self._buscar_texto(texto))
+        if comprobante:
+            filtros.append(self.comprobantes.buscar(comprobante))
+        if asiento:
+            filtros.append(self.asientos.buscar(asiento))
+
+        if fecha_desde is not None or fecha_hasta is not None:
+            desde = 0 if fecha_desde is None else np.searchsorted(
+                self.fechas_ordenadas, np.datetime64(fecha_desde, 'ns').view(np.int64), 'left'
+            )
+            hasta = len(self.fechas_ordenadas) if fecha_hasta is None else np.searchsorted(
+                self.fechas_ordenadas,
+                (np.datetime64(fecha_hasta, 'ns') + np.timedelta64(1, 'D')).view(np.int64), 'left'
+            )
+            filtros.append(np.sort(self.orden_fecha[desde:hasta]))
+
+        if importe_min is not None or importe_max is not None:
+            desde = 0 if importe_min is None else np.searchsorted(
+                self.importes_ordenados, a_centavos(pd.Series([importe_min]))[0], 'left'
+            )
+            hasta = len(self.importes_ordenados) if importe_max is None else np.searchsorted(
+                self.importes_ordenados, a_centavos(pd.Series([importe_max]))[0], 'right'
+            )
+            filtros.append(np.sort(self.orden_importe[desde:hasta]))
+
+        if filtros:
+            # Intersectar empezando por el filtro más selectivo
+            filtros.sort(key=len)
+            posiciones = filtros[0]
+            for otro in filtros[1:]:
+                posiciones = np.intersect1d(posiciones, otro, assume_unique=True)
+            rango = self.rangos[orden][posiciones]
+            posiciones = posiciones[np.argsort(-rango if descendente else rango, kind='stable')]
+        else:
+            # Sin filtros el orden ya está precalculado
+            posiciones = self.ordenes[orden]
+            if descendente:
+                posiciones = posiciones[::-1]
+
+        pagina = posiciones[offset:offset + limit]
+        total_debe = int(self.debe[posiciones].sum())
+        total_haber = int(self.haber[posiciones].sum())
+
+        return {
+            'registros': [self.registros[i] for i in pagina.tolist()],
+            'total': len(posiciones),
+            'totales': {
+                'debe': a_importe(total_debe),
+                'haber': a_importe(total_haber),
+                'saldo': a_importe(total_debe - total_haber),
+            },
+        }
@@ -0,0 +1,48 @@
+"""
+Cache LRU en memoria, por worker.
+Se usa para resultados derivados de una conciliación (cuadro, índices, etc.),
+guardados bajo una clave que incluye su versión.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+
+class CacheLRU:
+    """Cache LRU acotada por cantidad de entradas, segura entre hilos."""
+
+    def __init__(self, max_entradas: int = 32):
+        self.max_entradas = max_entradas
+        self._datos: OrderedDict[Hashable, Any] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, clave: Hashable) -> Any | None:
+        with self._lock:
+            if clave not in self._datos:
+                return None
+            self._datos.move_to_end(clave)
+            return self._datos[clave]
+
+    def guardar(self, clave: Hashable, valor: Any):
+        with self._lock:
+            self._datos[clave] = valor
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, clave: Hashable):
+        with self._lock:
+            self._datos.pop(clave, None)
+
+    def invalidar_si(self, predicado: Callable[[Hashable], bool]):
+        """Elimina todas las entradas cuya clave cumple el predicado"""
+        with self._lock:
+            for clave in [c for c in self._datos if predicado(c)]:
+                del self._datos[clave]
+
+    def limpiar(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self) -> int:
+        return len(self._datos)
@@ -0,0 +1,140 @@
+"""
+Generación aproximada de candidatos para la agrupación por similitud.
+
+Con muchas claves distintas (más de 100k razones sociales en un mayor anual
+consolidado) comparar cada clave contra todas las anteriores es cuadrático.
+IndiceNgramas indexa los n-gramas de caracteres de cada clave y devuelve solo
+las k claves que comparten más n-gramas; esas son las únicas que se comparan
+con calcular_similitud. k y n regulan el compromiso entre recall y velocidad
+(ver medir_recall y benchmarks/candidatos_ngramas.py).
+"""
+import heapq
+import time
+from collections import Counter
+from typing import Any, Sequence
+
+
+TAMANO_NGRAMA = 3
+CANDIDATOS_POR_DEFECTO = 50
+
+# Los n-gramas presentes en más de esta fracción de claves no suman votos
+# (terminaciones comunes como "EZ " generarían listas enormes)
+MAX_FRECUENCIA_NGRAMA = 0.02
+MIN_POSTINGS_NGRAMA = 200
+
+
+def ngramas(clave: str, n: int = TAMANO_NGRAMA) -> set[str]:
+    """N-gramas de caracteres de la clave, con un espacio de relleno en cada borde."""
+    texto = f' {clave} '
+    if len(texto) <= n:
+        return {texto}
+    return {texto[i:i + n] for i in range(len(texto) - n + 1)}
+
+
+class IndiceNgramas:
+    """
+    Índice invertido incremental n-grama -> posiciones de claves.
+    Las claves se agregan en orden y se identifican por su posición.
+    """
+
+    def __init__(
+        self,
+        n: int = TAMANO_NGRAMA,
+        max_frecuencia: float = MAX_FRECUENCIA_NGRAMA,
+        min_postings: int = MIN_POSTINGS_NGRAMA
+    ):
+        self.n = n
+        self.max_frecuencia = max_frecuencia
+        self.min_postings = min_postings
+        self.claves: list[str] = []
+        self.postings: dict[str, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self.claves)
+
+    def agregar(self, clave: str) -> int:
+        posicion = len(self.claves)
+        self.claves.append(clave)
+        for ngrama in ngramas(clave, self.n):
+            self.postings.setdefault(ngrama, []).append(posicion)
+        return posicion
+
+    def candidatos(self, clave: str, k: int = CANDIDATOS_POR_DEFECTO) -> list[int]:
+        """
+        Posiciones de las k claves que comparten más n-gramas con `clave`,
+        ordenadas por posición (orden de inserción).
+        """
+        listas = [self.postings[g] for g in ngramas(clave, self.n) if g in self.postings]
+        if not listas:
+            return []
+
+        max_postings = max(self.min_postings, int(len(self.claves) * self.max_frecuencia))
+        selectivas = [l for l in listas if len(l) <= max_postings]
+        if not selectivas:
+            # Todos los n-gramas son comunes: usar solo el menos frecuente
+            selectivas = [min(listas, key=len)]
+
+        votos: Counter[int] = Counter()
+        for lista in selectivas:
+            votos.update(lista)
+
+        if len(votos) <= k:
+            return sorted(votos)
+        # Desempate por posición: el resultado no depende del orden de iteración
+        mejores = heapq.nlargest(k, votos.items(), key=lambda x: (x[1], -x[0]))
+        return sorted(p for p, _ in mejores)
+
+
+def medir_recall(
+    claves: list[str],
+    umbral_similitud: float = 0.75,
+    valores_k: Sequence[int] = (CANDIDATOS_POR_DEFECTO,),
+    valores_n: Sequence[int] = (TAMANO_NGRAMA,)
+) -> list[dict[str, Any]]:
+    """
+    Compara la agrupación aproximada con la exhaustiva sobre las mismas claves.
+    La búsqueda exhaustiva se ejecuta una vez; la aproximada una vez por
+    cada combinación de k y n.
+
+    Args:
+        claves: Claves distintas, en orden de aparición
+        umbral_similitud: Umbral de agrupación
+        valores_k: Candidatos por clave a probar
+        valores_n: Tamaños de n-grama a probar
+
+    Returns:
+        Lista con un resultado por combinación: recall (fracción de claves
+        asignadas igual que la búsqueda exhaustiva), recall sobre las claves
+        que la exhaustiva une a otra, tiempos y aceleración
+    """
+    # Import diferido: procesamiento importa este módulo
+    from app.services.procesamiento import agrupar_claves
+
+    inicio = time.perf_counter()
+    exhaustiva = agrupar_claves(claves, claves, umbral_similitud)
+    tiempo_exhaustivo = time.perf_counter() - inicio
+    unidas = [c for c in claves if exhaustiva[c] != c]
+
+    resultados = []
+    for n in valores_n:
+        for k in valores_k:
+            inicio = time.perf_counter()
+            aproximada = agrupar_claves(
+                claves, claves, umbral_similitud, candidatos_max=k, tamano_ngrama=n
+            )
+            tiempo_aproximado = time.perf_counter() - inicio
+
+            iguales = sum(1 for c in claves if aproximada[c] == exhaustiva[c])
+            unidas_iguales = sum(1 for c in unidas if aproximada[c] == exhaustiva[c])
+            resultados.append({
+                'claves': len(claves),
+                'k': k,
+                'n': n,
+                'recall': round(iguales / len(claves), 4) if claves else 1.0,
+                'recall_unidas': round(unidas_iguales / len(unidas), 4) if unidas else 1.0,
+                'tiempo_exhaustivo': round(tiempo_exhaustivo, 3),
+                'tiempo_aproximado': round(tiempo_aproximado, 3),
+                'aceleracion': round(tiempo_exhaustivo / max(tiempo_aproximado, 1e-9), 1),
+            })
+
+    return resultados
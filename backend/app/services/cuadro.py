@@ -0,0 +1,162 @@
+"""
+Servicio del cuadro comparativo de saldos por razón social.
+Cruza las agrupaciones con los saldos de inicio y cierre usando Pandas,
+con la misma lógica que el cuadro calculado en el frontend.
+"""
+import pandas as pd
+from typing import Any
+
+from app.services.cache import CacheLRU
+
+
+COLUMNAS_CUADRO = [
+    'razonSocial', 'saldoInicio', 'debe', 'haber', 'saldoCalculado',
+    'ajusteAuditoria', 'saldoReportado', 'diferencia', 'estado', 'notaAjuste'
+]
+
+COLUMNAS_TOTALES = [
+    'saldoInicio', 'debe', 'haber', 'saldoCalculado',
+    'ajusteAuditoria', 'saldoReportado', 'diferencia'
+]
+
+ESTADOS = ('ok', 'diferencia', 'sin_cierre')
+
+TOLERANCIA_DIFERENCIA = 0.01
+
+# Cuadros calculados por (conciliacion_id, fecha_modificacion)
+CACHE_CUADROS = CacheLRU(max_entradas=32)
+
+
+def normalizar_razones(serie: pd.Series) -> pd.Series:
+    """
+    Normaliza razones sociales para cruzarlas (mayúsculas, sin acentos,
+    espacios colapsados). Equivale a normalizarRazonSocial del frontend.
+    """
+    return (
+        serie.fillna('').astype(str)
+        .str.upper()
+        .str.normalize('NFD')
+        .str.replace('[\u0300-\u036f]', '', regex=True)
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.strip()
+    )
+
+
+def mapa_saldos(saldos: list[dict]) -> pd.Series:
+    """Serie razón social normalizada -> saldo (si se repite gana la última)."""
+    if not saldos:
+        return pd.Series(dtype=float)
+    df = pd.DataFrame(saldos)
+    if 'razonSocial' not in df.columns or 'saldo' not in df.columns:
+        return pd.Series(dtype=float)
+    claves = normalizar_razones(df['razonSocial'])
+    valores = pd.to_numeric(df['saldo'], errors='coerce').fillna(0).astype(float)
+    mapa = pd.Series(valores.values, index=claves.values)
+    return mapa[~mapa.index.duplicated(keep='last')]
+
+
+def calcular_cuadro_comparativo(
+    agrupaciones: list[dict],
+    saldos_inicio: list[dict] | None = None,
+    saldos_cierre: list[dict] | None = None
+) -> pd.DataFrame:
+    """
+    Calcula las filas del cuadro comparativo.
+
+    Args:
+        agrupaciones: Agrupaciones con totalDebe/totalHaber y campos opcionales
+            saldoInicio, saldoCierre, ajusteAuditoria y notaAjuste
+        saldos_inicio: Lista de {razonSocial, saldo} de inicio
+        saldos_cierre: Lista de {razonSocial, saldo} de cierre
+
+    Returns:
+        DataFrame con las columnas de COLUMNAS_CUADRO, en el orden de las agrupaciones
+    """
+    if not agrupaciones:
+        return pd.DataFrame(columns=COLUMNAS_CUADRO)
+
+    campos = ['razonSocial', 'totalDebe', 'totalHaber', 'saldoInicio',
+              'saldoCierre', 'ajusteAuditoria', 'notaAjuste']
+    df = pd.DataFrame([{c: a.get(c) for c in campos} for a in agrupaciones])
+
+    razon = df['razonSocial'].fillna('').astype(str)
+    claves = normalizar_razones(razon)
+
+    mapa_inicio = mapa_saldos(saldos_inicio or [])
+    mapa_cierre = mapa_saldos(saldos_cierre or [])
+
+    # El saldo propio de la agrupación tiene prioridad sobre el archivo de saldos
+    saldo_inicio_propio = pd.to_numeric(df['saldoInicio'], errors='coerce')
+    saldo_cierre_propio = pd.to_numeric(df['saldoCierre'], errors='coerce')
+
+    saldo_inicio = saldo_inicio_propio.fillna(claves.map(mapa_inicio)).fillna(0).astype(float)
+    saldo_reportado = saldo_cierre_propio.fillna(claves.map(mapa_cierre)).fillna(0).astype(float)
+
+    debe = pd.to_numeric(df['totalDebe'], errors='coerce').fillna(0).astype(float)
+    haber = pd.to_numeric(df['totalHaber'], errors='coerce').fillna(0).astype(float)
+    ajuste = pd.to_numeric(df['ajusteAuditoria'], errors='coerce').fillna(0).astype(float)
+
+    saldo_calculado = saldo_inicio + debe - haber
+    diferencia = saldo_calculado + ajuste - saldo_reportado
+
+    tiene_cierre = claves.isin(mapa_cierre.index) | saldo_cierre_propio.notna()
+    estado = pd.Series('ok', index=df.index, dtype=object)
+    estado[diferencia.abs() > TOLERANCIA_DIFERENCIA] = 'diferencia'
+    estado[~tiene_cierre] = 'sin_cierre'
+
+    nota = df['notaAjuste'].astype(object)
+
+    return pd.DataFrame({
+        'razonSocial': razon,
+        'saldoInicio': saldo_inicio,
+        'debe': debe,
+        'haber': haber,
+        'saldoCalculado': saldo_calculado,
+        'ajusteAuditoria': ajuste,
+        'saldoReportado': saldo_reportado,
+        'diferencia': diferencia,
+        'estado': estado,
+        'notaAjuste': nota.where(nota.notna(), None),
+    })
+
+
+def consultar_cuadro(
+    cuadro: pd.DataFrame,
+    orden: str | None = None,
+    descendente: bool = False,
+    estados: list[str] | None = None,
+    limit: int | None = None,
+    offset: int = 0
+) -> dict[str, Any]:
+    """
+    Ordena, filtra por estado y pagina un cuadro ya calculado.
+    Los totales se calculan sobre todas las filas, igual que en el frontend.
+    """
+    totales = {c: round(float(cuadro[c].sum()), 2) for c in COLUMNAS_TOTALES}
+    conteo_estados = {e: int((cuadro['estado'] == e).sum()) for e in ESTADOS}
+
+    filas = cuadro
+    if estados:
+        filas = filas[filas['estado'].isin(estados)]
+
+    if orden:
+        if orden not in COLUMNAS_CUADRO:
+            raise ValueError(f"Columna de orden inválida: {orden}")
+        if orden == 'razonSocial':
+            filas = filas.sort_values(
+                orden, ascending=not descendente, kind='stable',
+                key=lambda s: s.str.upper()
+            )
+        else:
+            filas = filas.sort_values(orden, ascending=not descendente, kind='stable')
+
+    total_filas = len(filas)
+    fin = offset + limit if limit is not None else None
+    pagina = filas.iloc[offset:fin]
+
+    return {
+        'filas': pagina.to_dict('records'),
+        'total_filas': total_filas,
+        'totales': totales,
+        'conteo_estados': conteo_estados,
+    }
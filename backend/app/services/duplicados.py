@@ -0,0 +1,217 @@
+"""
+Detección de movimientos duplicados en un mayor.
+
+Dos criterios, ambos vectorizados (O(n log n)):
+- exacto: mismo comprobante (normalizado), mismo importe y misma razón
+  social. Agrupación por hash de las claves normalizadas.
+- cercano: mismo importe y misma razón social con fechas a no más de
+  `ventana_dias` días. Se ordena por (razón social, importe, fecha) y cada
+  registro se encadena con el anterior si la distancia entra en la ventana.
+
+El importe es con signo (debe - haber): un cobro y un pago del mismo monto no
+son duplicados entre sí.
+"""
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from app.services.modelo import a_importe, a_registros, centavos
+from app.services.procesamiento import asignar_claves
+from app.services.union_find import UnionFind
+
+
+TIPO_EXACTO = 'exacto'
+TIPO_CERCANO = 'cercano'
+
+VENTANA_DIAS_POR_DEFECTO = 3
+
+
+def _comprobantes_normalizados(df: pd.DataFrame) -> np.ndarray:
+    """Comprobante comparable (mayúsculas, solo letras y dígitos); '' si no hay"""
+    if 'comprobante' not in df.columns:
+        return np.full(len(df), '', dtype=object)
+    textos = df['comprobante'].astype(object).where(df['comprobante'].notna(), '').astype(str)
+    textos = textos.str.replace(r'\.0$', '', regex=True).str.upper()
+    return textos.str.replace(r'[^0-9A-Z]', '', regex=True).to_numpy()
+
+
+def _fechas(df: pd.DataFrame) -> np.ndarray:
+    if 'fecha' not in df.columns:
+        return np.full(len(df), np.datetime64('NaT'), dtype='datetime64[ns]')
+    fechas = df['fecha']
+    if not pd.api.types.is_datetime64_any_dtype(fechas):
+        fechas = pd.to_datetime(fechas, format='ISO8601', errors='coerce')
+    return fechas.to_numpy(dtype='datetime64[ns]')
+
+
+def _grupos_exactos(claves: np.ndarray, importes: np.ndarray, comprobantes: np.ndarray) -> np.ndarray:
+    """Id de grupo exacto de cada registro (-1 si no tiene duplicado exacto)"""
+    grupo = np.full(len(claves), -1, dtype=np.int64)
+    candidatos = np.flatnonzero((comprobantes != '') & (importes != 0))
+    if len(candidatos) == 0:
+        return grupo
+
+    ids = pd.DataFrame({
+        'c': claves[candidatos], 'i': importes[candidatos], 'n': comprobantes[candidatos]
+    }).groupby(['c', 'i', 'n'], sort=False).ngroup().to_numpy()
+    repetidos = np.bincount(ids)[ids] > 1
+    grupo[candidatos[repetidos]] = ids[repetidos]
+    return grupo
+
+
+def _grupos_cercanos(
+    claves: np.ndarray,
+    importes: np.ndarray,
+    fechas: np.ndarray,
+    ventana_dias: int
+) -> np.ndarray:
+    """Id de grupo cercano de cada registro (-1 si no tiene duplicado cercano)"""
+    grupo = np.full(len(claves), -1, dtype=np.int64)
+    candidatos = np.flatnonzero(~np.isnat(fechas) & (importes != 0))
+    if len(candidatos) < 2:
+        return grupo
+
+    dias = fechas[candidatos].astype('datetime64[D]').astype(np.int64)
+    orden = np.lexsort((dias, importes[candidatos], claves[candidatos]))
+    posiciones = candidatos[orden]
+    c, i, d = claves[posiciones], importes[posiciones], dias[orden]
+
+    # Nuevo grupo si cambia la clave o el importe, o si el salto de fecha
+    # supera la ventana
+    nuevo = np.ones(len(posiciones), dtype=bool)
+    nuevo[1:] = (c[1:] != c[:-1]) | (i[1:] != i[:-1]) | (d[1:] - d[:-1] > ventana_dias)
+    ids = np.cumsum(nuevo) - 1
+    repetidos = np.bincount(ids)[ids] > 1
+    grupo[posiciones[repetidos]] = ids[repetidos]
+    return grupo
+
+
+def _excedente_total(exactos: np.ndarray, cercanos: np.ndarray, importes: np.ndarray) -> int:
+    """
+    Excedente en centavos contando cada registro una sola vez: los grupos
+    exactos y cercanos que comparten registros forman un solo conjunto, cuyo
+    excedente es el importe por la cantidad de registros distintos menos uno.
+    """
+    posiciones = np.flatnonzero((exactos >= 0) | (cercanos >= 0))
+    if len(posiciones) == 0:
+        return 0
+
+    n_exactos = int(exactos.max()) + 1
+    conjuntos = UnionFind(n_exactos + int(cercanos.max()) + 1)
+    for p in np.flatnonzero((exactos >= 0) & (cercanos >= 0)).tolist():
+        conjuntos.unir(int(exactos[p]), n_exactos + int(cercanos[p]))
+
+    nodos = np.where(exactos[posiciones] >= 0, exactos[posiciones], n_exactos + cercanos[posiciones])
+    raices = np.array([conjuntos.raiz(n) for n in nodos.tolist()], dtype=np.int64)
+    _, conjunto = np.unique(raices, return_inverse=True)
+    # Todos los registros de un conjunto tienen el mismo importe
+    importe_conjunto = np.zeros(int(conjunto.max()) + 1, dtype=np.int64)
+    importe_conjunto[conjunto] = np.abs(importes[posiciones])
+    return int((importe_conjunto * (np.bincount(conjunto) - 1)).sum())
+
+
+def detectar_duplicados(
+    registros: list[dict] | pd.DataFrame,
+    ventana_dias: int = VENTANA_DIAS_POR_DEFECTO,
+    incluir_cercanos: bool = True
+) -> dict[str, Any]:
+    """
+    Detecta registros duplicados y los devuelve agrupados.
+
+    Args:
+        registros: Lista de registros del mayor, o DataFrame ya tipado
+        ventana_dias: Distancia máxima en días entre registros consecutivos
+            de un grupo cercano
+        incluir_cercanos: Buscar también duplicados por importe y fecha
+
+    Returns:
+        Dict con los grupos (de mayor a menor importe excedente) y estadísticas.
+        El excedente de un grupo es lo que suman los registros además del primero;
+        el de las estadísticas cuenta una sola vez los registros que están en un
+        grupo exacto y en uno cercano.
+    """
+    if ventana_dias < 0:
+        raise ValueError("ventana_dias no puede ser negativa")
+
+    vacio = {
+        'grupos': [],
+        'estadisticas': {'grupos_exactos': 0, 'grupos_cercanos': 0, 'registros_duplicados': 0, 'excedente': 0.0}
+    }
+    if len(registros) == 0:
+        return vacio
+
+    df = asignar_claves(registros)
+    importes = centavos(df, 'debe') - centavos(df, 'haber')
+    claves = df['clave_agrupacion'].cat.codes.to_numpy().astype(np.int64)
+    fechas = _fechas(df)
+
+    exactos = _grupos_exactos(claves, importes, _comprobantes_normalizados(df))
+    if incluir_cercanos:
+        # Los registros sin razón social solo se comparan por comprobante
+        sin_asignar = (df['razon_social'] == 'Sin Asignar').to_numpy()
+        cercanos = _grupos_cercanos(
+            np.where(sin_asignar, -1, claves), np.where(sin_asignar, 0, importes),
+            fechas, ventana_dias
+        )
+    else:
+        cercanos = np.full(len(df), -1, dtype=np.int64)
+
+    grupos: list[dict[str, Any]] = []
+    en_grupo = np.zeros(len(df), dtype=bool)
+
+    def agregar(tipo: str, ids: np.ndarray):
+        validos = np.flatnonzero(ids >= 0)
+        indices = pd.Series(validos).groupby(ids[validos], sort=False).indices
+        for posiciones in indices.values():
+            miembros = validos[posiciones]
+            if tipo == TIPO_CERCANO:
+                # Ya reportado como exacto completo
+                exacto = exactos[miembros]
+                if exacto[0] >= 0 and (exacto == exacto[0]).all():
+                    continue
+            miembros = miembros[np.argsort(fechas[miembros], kind='stable')]
+            en_grupo[miembros] = True
+            importe = int(importes[miembros[0]])
+            fechas_validas = fechas[miembros][~np.isnat(fechas[miembros])]
+            grupos.append({
+                'tipo': tipo,
+                'razonSocial': str(df['razon_social'].iat[miembros[0]]),
+                'comprobante': (
+                    str(df['comprobante'].iat[miembros[0]])
+                    if tipo == TIPO_EXACTO and 'comprobante' in df.columns else None
+                ),
+                'importe': a_importe(importe),
+                'cantidad': len(miembros),
+                'total': a_importe(importe * len(miembros)),
+                'excedente': a_importe(importe * (len(miembros) - 1)),
+                'fecha_desde': str(fechas_validas.min())[:10] if len(fechas_validas) else None,
+                'fecha_hasta': str(fechas_validas.max())[:10] if len(fechas_validas) else None,
+                'posiciones': miembros,
+            })
+
+    agregar(TIPO_EXACTO, exactos)
+    agregar(TIPO_CERCANO, cercanos)
+    if not grupos:
+        return vacio
+
+    grupos.sort(key=lambda g: (-abs(g['excedente']), g['razonSocial'], g['tipo']))
+
+    # Dicts solo para los registros involucrados
+    involucrados = np.flatnonzero(en_grupo)
+    registros_dict = dict(zip(
+        involucrados.tolist(),
+        a_registros(df.iloc[involucrados].drop(columns='clave_agrupacion'))
+    ))
+    for g in grupos:
+        g['registros'] = [registros_dict[p] for p in g.pop('posiciones').tolist()]
+
+    return {
+        'grupos': grupos,
+        'estadisticas': {
+            'grupos_exactos': sum(1 for g in grupos if g['tipo'] == TIPO_EXACTO),
+            'grupos_cercanos': sum(1 for g in grupos if g['tipo'] == TIPO_CERCANO),
+            'registros_duplicados': int(en_grupo.sum()),
+            'excedente': a_importe(_excedente_total(exactos, cercanos, importes)),
+        }
+    }
@@ -0,0 +1,158 @@
+"""
+Emparejamiento de saldos (inicio / cierre) con agrupaciones del mayor.
+Usa un índice invertido por palabra de la clave de agrupación para comparar
+cada saldo solo contra las agrupaciones que comparten alguna palabra.
+"""
+from typing import Any
+
+from app.services.agrupacion import (
+    generar_clave_agrupacion,
+    calcular_similitud
+)
+
+
+# Palabras presentes en más de esta fracción de claves no se usan para bloquear
+# (apellidos muy comunes generarían demasiados candidatos)
+MAX_FRECUENCIA_TOKEN = 0.05
+MIN_POSTINGS_BLOQUEO = 50
+
+
+class IndiceTokens:
+    """Índice invertido palabra -> posiciones de claves."""
+
+    def __init__(self, claves: list[str]):
+        self.claves = claves
+        self.posicion_exacta: dict[str, int] = {}
+        self.postings: dict[str, list[int]] = {}
+
+        for i, clave in enumerate(claves):
+            self.posicion_exacta.setdefault(clave, i)
+            for token in set(clave.split()):
+                self.postings.setdefault(token, []).append(i)
+
+        self.max_postings = max(
+            MIN_POSTINGS_BLOQUEO,
+            int(len(claves) * MAX_FRECUENCIA_TOKEN)
+        )
+
+    def candidatos(self, clave: str) -> set[int]:
+        """Posiciones de claves que comparten al menos una palabra con `clave`."""
+        listas = [self.postings[t] for t in set(clave.split()) if t in self.postings]
+        if not listas:
+            return set()
+
+        selectivas = [l for l in listas if len(l) <= self.max_postings]
+        if not selectivas:
+            # Todas las palabras son comunes: usar solo la menos frecuente
+            selectivas = [min(listas, key=len)]
+
+        resultado: set[int] = set()
+        for lista in selectivas:
+            resultado.update(lista)
+        return resultado
+
+
+def emparejar_saldos(
+    saldos: list[dict],
+    agrupaciones: list[dict],
+    umbral_similitud: float = 0.75,
+    max_alternativas: int = 3
+) -> dict[str, Any]:
+    """
+    Busca la agrupación más parecida para cada saldo.
+
+    Args:
+        saldos: Lista de {razonSocial, saldo}
+        agrupaciones: Agrupaciones con id, razonSocial y variantes
+        umbral_similitud: Similitud mínima para proponer un emparejamiento
+        max_alternativas: Cantidad de candidatos adicionales a devolver
+
+    Returns:
+        Dict con un resultado por saldo (mejor candidato, similitud y alternativas)
+    """
+    # Claves de cada agrupación (razón social + variantes) -> agrupaciones
+    claves: list[str] = []
+    grupos_por_clave: list[set[int]] = []
+    posicion: dict[str, int] = {}
+
+    for g, agrupacion in enumerate(agrupaciones):
+        nombres = [agrupacion.get('razonSocial') or ''] + list(agrupacion.get('variantes') or [])
+        for nombre in nombres:
+            clave = generar_clave_agrupacion(nombre)
+            if not clave or clave == 'Sin Asignar':
+                continue
+            if clave not in posicion:
+                posicion[clave] = len(claves)
+                claves.append(clave)
+                grupos_por_clave.append(set())
+            grupos_por_clave[posicion[clave]].add(g)
+
+    indice = IndiceTokens(claves)
+
+    # Puntajes por clave de saldo (varios saldos pueden compartir clave)
+    cache_puntajes: dict[str, list[tuple[float, int]]] = {}
+
+    def puntuar(clave_saldo: str) -> list[tuple[float, int]]:
+        if clave_saldo in cache_puntajes:
+            return cache_puntajes[clave_saldo]
+
+        mejor_por_grupo: dict[int, float] = {}
+        exacta = indice.posicion_exacta.get(clave_saldo)
+        if exacta is not None:
+            for g in grupos_por_clave[exacta]:
+                mejor_por_grupo[g] = 1.0
+
+        for i in indice.candidatos(clave_saldo):
+            if i == exacta:
+                continue
+            similitud = calcular_similitud(clave_saldo, claves[i])
+            if similitud <= 0:
+                continue
+            for g in grupos_por_clave[i]:
+                if similitud > mejor_por_grupo.get(g, 0.0):
+                    mejor_por_grupo[g] = similitud
+
+        ordenados = sorted(
+            ((s, g) for g, s in mejor_por_grupo.items()),
+            key=lambda x: (-x[0], x[1])
+        )[:max_alternativas + 1]
+        cache_puntajes[clave_saldo] = ordenados
+        return ordenados
+
+    def candidato(similitud: float, g: int) -> dict[str, Any]:
+        return {
+            'agrupacionId': agrupaciones[g].get('id'),
+            'razonSocial': agrupaciones[g].get('razonSocial'),
+            'similitud': round(similitud, 4),
+        }
+
+    resultados = []
+    emparejados = 0
+    for saldo in saldos:
+        razon = str(saldo.get('razonSocial') or '')
+        clave_saldo = generar_clave_agrupacion(razon)
+        puntajes = puntuar(clave_saldo) if clave_saldo else []
+
+        mejor = None
+        alternativas = puntajes
+        if puntajes and puntajes[0][0] >= umbral_similitud:
+            mejor = candidato(*puntajes[0])
+            alternativas = puntajes[1:]
+            emparejados += 1
+
+        resultados.append({
+            'razonSocial': razon,
+            'saldo': saldo.get('saldo'),
+            'mejor': mejor,
+            'alternativas': [candidato(s, g) for s, g in alternativas[:max_alternativas]],
+        })
+
+    return {
+        'resultados': resultados,
+        'estadisticas': {
+            'total_saldos': len(saldos),
+            'emparejados': emparejados,
+            'sin_emparejar': len(saldos) - emparejados,
+            'claves_indexadas': len(claves),
+        }
+    }
@@ -0,0 +1,133 @@
+"""
+Comparación diferencial de implementaciones de la agrupación.
+
+Lo usan el arnés de equivalencia (benchmarks/equivalencia.py, contra el
+corpus dorado o contra otra versión del código) y el modo sombra de /agrupar.
+Los resultados se reducen a una firma canónica que no depende del orden:
+qué registros quedaron juntos, con qué razón social, y cuáles sin asignar.
+"""
+from typing import Any, Callable, Iterable
+
+from app.services.procesamiento import MOTOR_UNION_FIND, MOTOR_VORAZ
+
+
+# Configuraciones candidatas por nombre (parámetros de agrupar_por_razon_social)
+MOTORES_CANDIDATOS: dict[str, dict[str, Any]] = {
+    'voraz': {'motor': MOTOR_VORAZ, 'candidatos_max': None},
+    'union_find': {'motor': MOTOR_UNION_FIND, 'enlace': 'simple', 'candidatos_max': None},
+    'union_find_completo': {'motor': MOTOR_UNION_FIND, 'enlace': 'completo', 'candidatos_max': None},
+    'aproximado': {'motor': MOTOR_VORAZ, 'candidatos_max': 50},
+}
+
+# Divergencias detalladas por comparación (el conteo es siempre completo)
+MAX_DIVERGENCIAS = 50
+
+TOLERANCIA_SIMILITUD = 1e-9
+
+
+def firma_agrupacion(resultado: dict[str, Any]) -> dict[str, Any]:
+    """
+    Firma canónica de un resultado de agrupar_por_razon_social.
+
+    Returns:
+        Dict con grupos (lista ordenada de [razonSocial, ids ordenados]),
+        ids sin asignar (ordenados) y totales
+    """
+    grupos = sorted(
+        [a['razonSocial'], sorted(str(r.get('id')) for r in a.get('registros') or [])]
+        for a in resultado.get('agrupaciones') or []
+    )
+    return {
+        'grupos': grupos,
+        'sin_asignar': sorted(str(r.get('id')) for r in resultado.get('sin_asignar') or []),
+        'totales': resultado.get('totales'),
+    }
+
+
+def comparar_firmas(referencia: dict[str, Any], candidata: dict[str, Any]) -> dict[str, Any]:
+    """
+    Diferencias entre dos firmas de agrupación.
+
+    Returns:
+        Dict con iguales, conteos y hasta MAX_DIVERGENCIAS divergencias de cada
+        tipo: grupos con otros miembros, grupos iguales con otra razón social,
+        registros que cambiaron de asignado a sin asignar (o al revés) y totales
+    """
+    por_miembros_ref = {tuple(ids): razon for razon, ids in referencia['grupos']}
+    por_miembros_cand = {tuple(ids): razon for razon, ids in candidata['grupos']}
+
+    solo_referencia = [
+        {'razonSocial': razon, 'ids': list(ids)}
+        for ids, razon in por_miembros_ref.items() if ids not in por_miembros_cand
+    ]
+    solo_candidata = [
+        {'razonSocial': razon, 'ids': list(ids)}
+        for ids, razon in por_miembros_cand.items() if ids not in por_miembros_ref
+    ]
+    otra_razon = [
+        {'ids': list(ids), 'referencia': razon, 'candidata': por_miembros_cand[ids]}
+        for ids, razon in por_miembros_ref.items()
+        if ids in por_miembros_cand and por_miembros_cand[ids] != razon
+    ]
+    sin_asignar_ref = set(referencia['sin_asignar'])
+    sin_asignar_cand = set(candidata['sin_asignar'])
+    cambio_asignacion = sorted(sin_asignar_ref ^ sin_asignar_cand)
+
+    iguales = not (
+        solo_referencia or solo_candidata or otra_razon or cambio_asignacion
+        or referencia['totales'] != candidata['totales']
+    )
+    return {
+        'iguales': iguales,
+        'grupos_referencia': len(referencia['grupos']),
+        'grupos_candidata': len(candidata['grupos']),
+        'conteo': {
+            'solo_referencia': len(solo_referencia),
+            'solo_candidata': len(solo_candidata),
+            'otra_razon': len(otra_razon),
+            'cambio_asignacion': len(cambio_asignacion),
+        },
+        'solo_referencia': solo_referencia[:MAX_DIVERGENCIAS],
+        'solo_candidata': solo_candidata[:MAX_DIVERGENCIAS],
+        'otra_razon': otra_razon[:MAX_DIVERGENCIAS],
+        'cambio_asignacion': cambio_asignacion[:MAX_DIVERGENCIAS],
+        'totales': None if referencia['totales'] == candidata['totales'] else {
+            'referencia': referencia['totales'], 'candidata': candidata['totales']
+        },
+    }
+
+
+def comparar_funcion(
+    entradas: Iterable[Any],
+    referencia: Callable[..., Any],
+    candidata: Callable[..., Any],
+    tolerancia: float | None = None
+) -> dict[str, Any]:
+    """
+    Ejecuta dos implementaciones de una función sobre las mismas entradas
+    (una tupla de argumentos o un solo argumento por entrada) y lista las
+    salidas distintas. Con tolerancia, las salidas numéricas se comparan con
+    esa diferencia máxima.
+    """
+    total = 0
+    divergencias = []
+    cantidad_divergencias = 0
+    for entrada in entradas:
+        argumentos = entrada if isinstance(entrada, tuple) else (entrada,)
+        esperado = referencia(*argumentos)
+        obtenido = candidata(*argumentos)
+        total += 1
+        if tolerancia is not None:
+            igual = abs(float(esperado) - float(obtenido)) <= tolerancia
+        else:
+            igual = esperado == obtenido
+        if not igual:
+            cantidad_divergencias += 1
+            if len(divergencias) < MAX_DIVERGENCIAS:
+                divergencias.append({'entrada': entrada, 'referencia': esperado, 'candidata': obtenido})
+    return {
+        'iguales': cantidad_divergencias == 0,
+        'entradas': total,
+        'cantidad_divergencias': cantidad_divergencias,
+        'divergencias': divergencias,
+    }
@@ -0,0 +1,199 @@
+"""
+Exportación de una conciliación a Excel (papeles de trabajo).
+
+El libro se escribe con openpyxl en modo write-only: cada fila se genera
+directamente desde los registros guardados y se vuelca al archivo, sin armar
+el libro completo en memoria. Agrupaciones y registros se reciben como
+iterables que se pueden recorrer más de una vez (el endpoint pasa los arreglos
+guardados como ArregloJSON, que los parsea elemento por elemento), así que
+tampoco hace falta tenerlos cargados como listas. El endpoint devuelve el
+archivo temporal en streaming. (openpyxl usa lxml si está instalado, bastante
+más rápido para exportaciones grandes.)
+
+Hojas:
+- Resumen: una fila por agrupación con sus totales
+- Detalle: los registros de cada agrupación
+- Sin asignar: registros que no pertenecen a ninguna agrupación
+- Cuadro comparativo: si hay saldos cargados
+
+Detalle y Sin asignar continúan en "Detalle (2)", "Detalle (3)", ... al llegar
+al límite de filas de una hoja de Excel.
+"""
+from datetime import datetime
+from typing import Any, Iterable, Iterator
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+
+# (campo del registro, encabezado, ancho)
+COLUMNAS_REGISTRO = [
+    ('fecha', 'Fecha', 12),
+    ('asiento', 'Asiento', 10),
+    ('comprobante', 'Comprobante', 18),
+    ('descripcion', 'Descripción', 50),
+    ('cuenta', 'Cuenta', 12),
+    ('debe', 'Debe', 14),
+    ('haber', 'Haber', 14),
+]
+
+COLUMNAS_RESUMEN = [
+    ('razonSocial', 'Razón Social', 40),
+    ('cantidad', 'Registros', 10),
+    ('totalDebe', 'Debe', 14),
+    ('totalHaber', 'Haber', 14),
+    ('saldo', 'Saldo', 14),
+    ('variantes', 'Variantes', 60),
+]
+
+ENCABEZADOS_CUADRO = {
+    'razonSocial': 'Razón Social',
+    'saldoInicio': 'Saldo Inicio',
+    'debe': 'Debe',
+    'haber': 'Haber',
+    'saldoCalculado': 'Saldo Calculado',
+    'ajusteAuditoria': 'Ajuste Auditoría',
+    'saldoReportado': 'Saldo Reportado',
+    'diferencia': 'Diferencia',
+    'estado': 'Estado',
+    'notaAjuste': 'Nota Ajuste',
+}
+
+# Límite de filas de una hoja de Excel (incluye el encabezado)
+MAX_FILAS_HOJA = 1_048_576
+
+_NEGRITA = Font(bold=True)
+
+
+def _valor_fecha(valor: Any) -> Any:
+    """Fecha ISO del registro como datetime (Excel la muestra como fecha)"""
+    if isinstance(valor, str) and len(valor) >= 10:
+        try:
+            return datetime.fromisoformat(valor)
+        except ValueError:
+            return valor
+    return valor
+
+
+def _crear_hoja(libro: Workbook, titulo: str, columnas: list[tuple[str, int]]):
+    """Hoja write-only con encabezado en negrita, fijo, y anchos de columna"""
+    hoja = libro.create_sheet(titulo)
+    for i, (_, ancho) in enumerate(columnas):
+        hoja.column_dimensions[get_column_letter(i + 1)].width = ancho
+    hoja.freeze_panes = 'A2'
+    encabezado = []
+    for texto, _ in columnas:
+        celda = WriteOnlyCell(hoja, value=texto)
+        celda.font = _NEGRITA
+        encabezado.append(celda)
+    hoja.append(encabezado)
+    return hoja
+
+
+def _escribir_filas(
+    libro: Workbook,
+    titulo: str,
+    columnas: list[tuple[str, int]],
+    filas: Iterable[list],
+    max_filas: int = MAX_FILAS_HOJA
+):
+    """Escribe las filas en la hoja `titulo` y sus continuaciones ("titulo (2)", ...)"""
+    hoja = _crear_hoja(libro, titulo, columnas)
+    filas_hoja = 1
+    numero = 1
+    for fila in filas:
+        if filas_hoja == max_filas:
+            numero += 1
+            hoja = _crear_hoja(libro, f'{titulo} ({numero})', columnas)
+            filas_hoja = 1
+        hoja.append(fila)
+        filas_hoja += 1
+
+
+def _filas_registros(registros: Iterable[dict], prefijo: tuple = ()) -> Iterator[list]:
+    for r in registros:
+        yield [
+            *prefijo,
+            *(
+                _valor_fecha(r.get(campo)) if campo == 'fecha' else r.get(campo)
+                for campo, _, _ in COLUMNAS_REGISTRO
+            )
+        ]
+
+
+def registros_sin_asignar(registros: Iterable[dict], agrupaciones: Iterable[dict]) -> Iterator[dict]:
+    """
+    Registros cuyo id no aparece en ninguna agrupación, a medida que se
+    recorren (solo se guarda el conjunto de ids asignados)
+    """
+    asignados = {
+        r.get('id') for a in agrupaciones for r in (a.get('registros') or [])
+    }
+    for r in registros:
+        if r.get('id') not in asignados:
+            yield r
+
+
+def escribir_xlsx(
+    destino: str,
+    agrupaciones: Iterable[dict],
+    sin_asignar: Iterable[dict],
+    cuadro: pd.DataFrame | None = None
+):
+    """
+    Escribe el libro de la conciliación en `destino`.
+
+    Args:
+        destino: Ruta del archivo .xlsx
+        agrupaciones: Agrupaciones con sus registros (se recorren dos veces)
+        sin_asignar: Registros sin agrupación
+        cuadro: Cuadro comparativo ya calculado (se omite la hoja si es None o vacío)
+    """
+    libro = Workbook(write_only=True)
+
+    hoja = _crear_hoja(libro, 'Resumen', [(t, w) for _, t, w in COLUMNAS_RESUMEN])
+    total_debe = total_haber = 0.0
+    total_cantidad = 0
+    for a in agrupaciones:
+        total_cantidad += a.get('cantidad') or 0
+        total_debe += a.get('totalDebe') or 0
+        total_haber += a.get('totalHaber') or 0
+        hoja.append([
+            a.get('razonSocial'),
+            a.get('cantidad'),
+            a.get('totalDebe'),
+            a.get('totalHaber'),
+            a.get('saldo'),
+            ', '.join(a.get('variantes') or []),
+        ])
+    hoja.append([])
+    hoja.append([
+        'TOTAL', total_cantidad,
+        round(total_debe, 2), round(total_haber, 2), round(total_debe - total_haber, 2)
+    ])
+
+    columnas_detalle = [('Razón Social', 40)] + [(t, w) for _, t, w in COLUMNAS_REGISTRO]
+    _escribir_filas(libro, 'Detalle', columnas_detalle, (
+        fila
+        for a in agrupaciones
+        for fila in _filas_registros(a.get('registros') or [], (a.get('razonSocial'),))
+    ))
+
+    _escribir_filas(
+        libro, 'Sin asignar', [(t, w) for _, t, w in COLUMNAS_REGISTRO],
+        _filas_registros(sin_asignar)
+    )
+
+    if cuadro is not None and len(cuadro):
+        columnas = list(cuadro.columns)
+        hoja = _crear_hoja(
+            libro, 'Cuadro comparativo',
+            [(ENCABEZADOS_CUADRO.get(c, c), 40 if c == 'razonSocial' else 15) for c in columnas]
+        )
+        for fila in cuadro.itertuples(index=False, name=None):
+            hoja.append([None if pd.isna(v) else v for v in fila])
+
+    libro.save(destino)
@@ -0,0 +1,126 @@
+"""
+Modelo columnar interno de los registros del mayor.
+
+Todo el pipeline (lectura del Excel, agrupación, totales) trabaja sobre un
+DataFrame tipado:
+- importes (debe, haber, saldo) en centavos int64, columnas debe_cent, haber_cent, saldo_cent
+- textos repetidos (descripcion, cuenta, razon_social, ...) como categóricos
+- fecha como datetime64
+
+Los dicts para la API se generan solo al final, con a_registros().
+"""
+import numpy as np
+import pandas as pd
+
+
+COLUMNAS_IMPORTE = ('debe', 'haber', 'saldo')
+
+COLUMNAS_CATEGORICAS = (
+    'descripcion', 'cuenta', 'razon_social', 'clave_agrupacion', 'archivo', 'hoja'
+)
+
+SUFIJO_CENTAVOS = '_cent'
+
+
+def columna_centavos(columna: str) -> str:
+    """Nombre interno de la columna de un importe en centavos."""
+    return f'{columna}{SUFIJO_CENTAVOS}'
+
+
+def a_centavos(serie: pd.Series) -> pd.Series:
+    """Convierte importes a centavos int64 (vacíos e inválidos quedan en 0)."""
+    valores = pd.to_numeric(serie, errors='coerce').astype(float)
+    valores = valores.replace([np.inf, -np.inf], np.nan).fillna(0.0)
+    return np.round(valores * 100).astype('int64')
+
+
+def tipar_registros(df: pd.DataFrame, parsear_fechas: bool = True) -> pd.DataFrame:
+    """
+    Convierte un DataFrame de registros al modelo tipado.
+    Las columnas conservan su posición; los importes se renombran a *_cent.
+
+    Args:
+        df: Registros con columnas en formato estándar
+        parsear_fechas: Convertir la columna fecha a datetime64. Si algún valor
+            no se puede interpretar, la columna se deja como está para no perderlo.
+    """
+    renombrar = {}
+    for col in COLUMNAS_IMPORTE:
+        if col in df.columns:
+            df[col] = a_centavos(df[col])
+            renombrar[col] = columna_centavos(col)
+    if renombrar:
+        df = df.rename(columns=renombrar)
+
+    for col in COLUMNAS_CATEGORICAS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype('category')
+
+    if parsear_fechas and 'fecha' in df.columns and not pd.api.types.is_datetime64_any_dtype(df['fecha']):
+        fechas = pd.to_datetime(df['fecha'], format='ISO8601', errors='coerce')
+        if not (fechas.isna() & df['fecha'].notna()).any():
+            df['fecha'] = fechas
+
+    return df
+
+
+def centavos(df: pd.DataFrame, columna: str) -> np.ndarray:
+    """Importe en centavos de una columna (ceros si el registro no la tiene)."""
+    interna = columna_centavos(columna)
+    if interna in df.columns:
+        return df[interna].to_numpy()
+    return np.zeros(len(df), dtype='int64')
+
+
+def columnas_publicas(df: pd.DataFrame) -> list[str]:
+    """Nombres de columnas tal como se exponen en la API (sin sufijo _cent)."""
+    return [
+        c[:-len(SUFIJO_CENTAVOS)]
+        if c.endswith(SUFIJO_CENTAVOS) and c[:-len(SUFIJO_CENTAVOS)] in COLUMNAS_IMPORTE
+        else c
+        for c in df.columns
+    ]
+
+
+def a_importe(total_centavos) -> float:
+    """Centavos a importe con dos decimales."""
+    return round(int(total_centavos) / 100, 2)
+
+
+def fechas_iso(fechas: pd.Series) -> pd.Series:
+    """Formatea una columna datetime64 como strings ISO (None para vacías)."""
+    iso = fechas.dt.strftime('%Y-%m-%dT%H:%M:%S')
+    con_fraccion = fechas.notna() & ((fechas.dt.microsecond != 0) | (fechas.dt.nanosecond != 0))
+    if con_fraccion.any():
+        iso[con_fraccion] = fechas[con_fraccion].map(lambda x: x.isoformat())
+    return iso.astype(object).where(fechas.notna(), None)
+
+
+def a_registros(df: pd.DataFrame) -> list[dict]:
+    """
+    Convierte el modelo tipado a lista de dicts serializables a JSON.
+    Es el único punto donde se materializan dicts por registro.
+    """
+    columnas = {}
+    for col in df.columns:
+        serie = df[col]
+        if col.endswith(SUFIJO_CENTAVOS) and col[:-len(SUFIJO_CENTAVOS)] in COLUMNAS_IMPORTE:
+            columnas[col[:-len(SUFIJO_CENTAVOS)]] = serie / 100
+            continue
+
+        if pd.api.types.is_datetime64_any_dtype(serie) and col == 'fecha':
+            columnas[col] = fechas_iso(serie)
+            continue
+
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            serie = serie.astype(object)
+        if pd.api.types.is_float_dtype(serie) or serie.dtype == object:
+            # Infinity no es JSON válido
+            serie = serie.mask(serie.isin([np.inf, -np.inf]))
+
+        # Convertir NaN a None para JSON
+        if serie.isna().any():
+            serie = serie.astype(object).where(serie.notna(), None)
+        columnas[col] = serie
+
+    return pd.DataFrame(columnas, index=df.index).to_dict('records')
@@ -0,0 +1,234 @@
+"""
+Normalización de columnas tipadas al importar mayores y saldos.
+
+Cada columna se analiza con una muestra para inferir su formato (separadores
+de miles/decimales, formato de fecha, seriales de Excel) y después se
+convierte completa de forma vectorizada con ese formato. Se informa cuántos
+valores no se pudieron interpretar en lugar de convertirlos en 0 sin aviso.
+"""
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+
+TAMANO_MUESTRA = 1000
+
+# Formatos de número
+FORMATO_AR = 'ar'            # 1.234,56
+FORMATO_EN = 'en'            # 1,234.56
+FORMATO_NUMERICO = 'numerico'  # la columna ya es numérica
+
+# Candidatos de formato de fecha, en orden de preferencia ante empates
+# (día/mes antes que mes/día)
+FORMATOS_FECHA = [
+    '%d/%m/%Y',
+    '%d/%m/%y',
+    '%d-%m-%Y',
+    '%d.%m.%Y',
+    '%Y-%m-%d',
+    '%Y/%m/%d',
+    '%d/%m/%Y %H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y%m%d',
+    '%m/%d/%Y',
+]
+FORMATO_FECHA_NATIVA = 'fecha'
+
+# Rango de seriales de Excel aceptados como fecha (1900-01-01 a 9999-12-31)
+SERIAL_EXCEL_MIN = 1
+SERIAL_EXCEL_MAX = 2958465
+ORIGEN_EXCEL = '1899-12-30'
+
+# Símbolos que se descartan antes de convertir un importe
+_SIMBOLOS_IMPORTE = r'[\s$€]|ARS|USD|U\$S'
+
+
+def _textos(serie: pd.Series) -> pd.Series:
+    """Valores de texto de la serie (NaN para los que no son texto)."""
+    if serie.dtype != object and not pd.api.types.is_string_dtype(serie):
+        return pd.Series(np.nan, index=serie.index, dtype=object)
+    try:
+        return serie.str.strip()
+    except AttributeError:
+        return pd.Series(np.nan, index=serie.index, dtype=object)
+
+
+def _muestra(textos: pd.Series) -> pd.Series:
+    """Hasta TAMANO_MUESTRA textos no vacíos repartidos en toda la columna."""
+    no_vacios = textos[textos.notna() & (textos != '')]
+    if len(no_vacios) > TAMANO_MUESTRA:
+        no_vacios = no_vacios.sample(TAMANO_MUESTRA, random_state=0)
+    return no_vacios
+
+
+def inferir_formato_numero(serie: pd.Series) -> str:
+    """
+    Infiere el formato de los importes en texto de una columna.
+    Decide por votos sobre una muestra: el separador que aparece último es
+    el decimal. Los casos ambiguos ("1.234", "1,234") no votan y, si no hay
+    otra evidencia, se asume formato argentino.
+
+    Returns:
+        FORMATO_NUMERICO, FORMATO_AR o FORMATO_EN
+    """
+    if pd.api.types.is_numeric_dtype(serie):
+        return FORMATO_NUMERICO
+
+    muestra = _muestra(_textos(serie)).str.replace(_SIMBOLOS_IMPORTE, '', regex=True)
+    if muestra.empty:
+        return FORMATO_NUMERICO
+
+    coma = muestra.str.rfind(',')
+    punto = muestra.str.rfind('.')
+    ambos = (coma >= 0) & (punto >= 0)
+    solo_coma = (coma >= 0) & (punto < 0)
+    solo_punto = (punto >= 0) & (coma < 0)
+
+    miles_coma = muestra.str.fullmatch(r'[-(]?\d{1,3}(,\d{3})+[)-]?')
+    miles_punto = muestra.str.fullmatch(r'[-(]?\d{1,3}(\.\d{3})+[)-]?')
+
+    votos_ar = int((ambos & (coma > punto)).sum() + (solo_coma & ~miles_coma).sum())
+    votos_en = int((ambos & (punto > coma)).sum() + (solo_punto & ~miles_punto).sum())
+
+    return FORMATO_EN if votos_en > votos_ar else FORMATO_AR
+
+
+def parsear_numeros(serie: pd.Series, formato: str) -> tuple[pd.Series, int]:
+    """
+    Convierte una columna de importes a float con el formato indicado.
+    Acepta símbolos de moneda y negativos como "-1.234,56", "(1.234,56)"
+    o "1.234,56-".
+
+    Returns:
+        Tupla (serie float con NaN en vacíos e inválidos, cantidad de valores
+        no vacíos que no se pudieron interpretar)
+    """
+    textos = _textos(serie)
+    es_texto = textos.notna()
+    desde_numero = pd.to_numeric(serie.mask(es_texto), errors='coerce').astype(float)
+
+    if not es_texto.any():
+        no_parseados = int((serie.notna() & desde_numero.isna()).sum())
+        return desde_numero, no_parseados
+
+    limpio = textos[es_texto].str.replace(_SIMBOLOS_IMPORTE, '', regex=True)
+    negativo = (
+        (limpio.str.startswith('(') & limpio.str.endswith(')'))
+        | limpio.str.endswith('-')
+    )
+    limpio = limpio.str.strip('()').str.rstrip('-')
+
+    if formato == FORMATO_EN:
+        limpio = limpio.str.replace(',', '', regex=False)
+    else:
+        limpio = limpio.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+
+    desde_texto = pd.to_numeric(limpio, errors='coerce').astype(float)
+    desde_texto[negativo] = -desde_texto[negativo]
+
+    valores = desde_numero.copy()
+    valores[es_texto] = desde_texto
+
+    no_parseados = int(
+        (desde_texto.isna() & (limpio != '')).sum()
+        + (serie.notna() & ~es_texto & desde_numero.isna()).sum()
+    )
+    return valores, no_parseados
+
+
+def inferir_formato_fecha(textos: pd.Series) -> str | None:
+    """
+    Elige el formato de FORMATOS_FECHA que interpreta más valores de la
+    muestra. Ante empate gana el primero (día/mes antes que mes/día).
+    """
+    muestra = _muestra(textos)
+    if muestra.empty:
+        return None
+
+    mejor, mejor_validos = None, 0
+    for formato in FORMATOS_FECHA:
+        validos = int(pd.to_datetime(muestra, format=formato, errors='coerce').notna().sum())
+        if validos > mejor_validos:
+            mejor, mejor_validos = formato, validos
+            if validos == len(muestra):
+                break
+    return mejor
+
+
+def parsear_fechas(serie: pd.Series) -> tuple[pd.Series, str | None, int]:
+    """
+    Convierte una columna de fechas a datetime64. Soporta celdas de fecha
+    nativas, seriales de Excel y textos en el formato inferido.
+
+    Returns:
+        Tupla (serie datetime64 con NaT en vacíos e inválidos, formato usado
+        para los textos, cantidad de valores no vacíos no interpretados)
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie, FORMATO_FECHA_NATIVA, 0
+
+    textos = _textos(serie)
+    es_texto = textos.notna() & (textos != '')
+    numeros = pd.to_numeric(serie.mask(textos.notna()), errors='coerce')
+    es_serial = numeros.between(SERIAL_EXCEL_MIN, SERIAL_EXCEL_MAX)
+
+    # Fechas nativas (datetime de openpyxl, Timestamp)
+    otros = serie.mask(textos.notna() | numeros.notna())
+    fechas = pd.to_datetime(otros, errors='coerce')
+    if fechas.dt.tz is not None:
+        fechas = fechas.dt.tz_localize(None)
+
+    if es_serial.any():
+        fechas[es_serial] = pd.to_datetime(
+            numeros[es_serial], unit='D', origin=ORIGEN_EXCEL
+        ).dt.round('s')
+
+    formato = None
+    if es_texto.any():
+        formato = inferir_formato_fecha(textos[es_texto])
+        if formato is not None:
+            fechas[es_texto] = pd.to_datetime(
+                textos[es_texto], format=formato, errors='coerce'
+            )
+    elif es_serial.any():
+        formato = 'serial_excel'
+    elif fechas.notna().any():
+        formato = FORMATO_FECHA_NATIVA
+
+    vacios = serie.isna() | (textos.notna() & ~es_texto)
+    no_parseados = int((fechas.isna() & ~vacios).sum())
+    return fechas, formato, no_parseados
+
+
+def normalizar_columnas(
+    df: pd.DataFrame,
+    columnas_importe: tuple[str, ...] = ('debe', 'haber', 'saldo')
+) -> tuple[pd.DataFrame, dict[str, Any]]:
+    """
+    Normaliza las columnas de importes y la fecha de un mayor.
+
+    Args:
+        df: Registros con columnas en formato estándar
+        columnas_importe: Columnas a convertir como importes
+
+    Returns:
+        Tupla (DataFrame con importes float y fecha datetime64, informe por
+        columna con el formato detectado y los valores no interpretados)
+    """
+    informe: dict[str, Any] = {}
+
+    for col in columnas_importe:
+        if col not in df.columns:
+            continue
+        formato = inferir_formato_numero(df[col])
+        df[col], no_parseados = parsear_numeros(df[col], formato)
+        informe[col] = {'formato': formato, 'no_parseados': no_parseados}
+
+    if 'fecha' in df.columns:
+        df['fecha'], formato, no_parseados = parsear_fechas(df['fecha'])
+        informe['fecha'] = {'formato': formato, 'no_parseados': no_parseados}
+
+    return df, informe
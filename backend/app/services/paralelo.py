@@ -0,0 +1,45 @@
+"""
+Pool de procesos compartido para trabajos CPU-bound (parseo de Excel,
+comparación de nombres). Se crea una sola vez por worker y se reutiliza.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from app.config import get_settings
+
+
+_pool: ProcessPoolExecutor | None = None
+_lock = threading.Lock()
+
+
+def cantidad_procesos() -> int:
+    """Procesos a usar: MAX_PROCESOS si es mayor a 0, si no la cantidad de CPUs."""
+    configurado = get_settings().max_procesos
+    if configurado > 0:
+        return configurado
+    return os.cpu_count() or 1
+
+
+def obtener_pool() -> ProcessPoolExecutor:
+    """
+    Retorna el pool de procesos del worker, creándolo la primera vez.
+    Usa 'spawn' para no heredar hilos ni conexiones abiertas del servidor.
+    """
+    global _pool
+    with _lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=cantidad_procesos(),
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def cerrar_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
@@ -0,0 +1,347 @@
+"""
+Imputación de partidas dentro de cada agrupación (facturas contra pagos).
+
+Cada registro es una partida del debe o del haber (importe debe - haber).
+Las partidas de lados opuestos se cancelan en tres pasadas:
+1. comprobante: las partidas que comparten un número de comprobante (citado
+   en el comprobante o en la leyenda) se unen con un hash join y se cancelan
+   por orden de fecha
+2. importe: las partidas pendientes de igual importe se emparejan recorriendo
+   los dos lados ordenados por (importe, fecha) con dos punteros
+3. combinación: una partida contra la suma exacta de 2..max_combinacion
+   partidas del lado opuesto, entre las max_candidatos más antiguas, con una
+   búsqueda acotada por MAX_EVALUACIONES
+
+Lo que queda sin cancelar son las partidas abiertas de la razón social.
+Las agrupaciones se imputan de forma independiente, en paralelo en el pool
+de procesos si son muchos registros.
+"""
+import re
+from typing import Any
+
+import numpy as np
+import pandas as pd
+
+from app.services.cache import CacheLRU
+from app.services.modelo import a_importe, centavos, tipar_registros
+from app.services.paralelo import cantidad_procesos, obtener_pool
+from app.services.procesamiento import columna_descripcion
+
+
+TIPO_COMPROBANTE = 'comprobante'
+TIPO_IMPORTE = 'importe'
+TIPO_COMBINACION = 'combinacion'
+
+MAX_COMBINACION_POR_DEFECTO = 3
+MAX_CANDIDATOS_POR_DEFECTO = 20
+
+# Combinaciones evaluadas como máximo por partida en la pasada 3
+MAX_EVALUACIONES = 20_000
+
+# Un número citado por más partidas que esto no identifica un comprobante
+MAX_PARTIDAS_POR_REFERENCIA = 20
+
+# Por debajo de esta cantidad de registros no conviene pagar el envío al pool
+MIN_REGISTROS_PARALELO = 50_000
+
+# Resultados por (conciliacion_id, fecha_modificacion, max_combinacion, max_candidatos)
+CACHE_PARTIDAS = CacheLRU(max_entradas=16)
+
+# Fechas y CUITs se quitan antes de buscar números de comprobante
+_RE_FECHA = re.compile(r'\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b')
+_RE_CUIT = re.compile(r'\b\d{2}-\d{8}-\d\b')
+# Punto de venta y número (0001-00001234) o número suelto de 4 o más dígitos
+_RE_COMPROBANTE = re.compile(r'(?<!\d)(\d{1,5})\s*-\s*(\d{4,8})(?!\d)|(?<![\d-])(\d{4,})(?![\d-])')
+
+
+def extraer_referencias(texto: str) -> tuple[str, ...]:
+    """
+    Números de comprobante de un texto, normalizados sin ceros a la izquierda.
+    Un número con punto de venta se indexa también solo, para cruzarlo con
+    leyendas que citan únicamente el número.
+    """
+    if not texto:
+        return ()
+    texto = _RE_CUIT.sub(' ', _RE_FECHA.sub(' ', texto))
+    referencias: list[str] = []
+    for punto_venta, numero, suelto in _RE_COMPROBANTE.findall(texto):
+        if suelto:
+            referencias.append(str(int(suelto)))
+        else:
+            referencias.append(f'{int(punto_venta)}-{int(numero)}')
+            referencias.append(str(int(numero)))
+    return tuple(dict.fromkeys(referencias))
+
+
+def _referencias_columna(df: pd.DataFrame, columna: str | None) -> list[tuple[str, ...]]:
+    """Referencias de cada registro en una columna, extraídas una vez por valor distinto"""
+    if columna is None or columna not in df.columns:
+        return [()] * len(df)
+    serie = df[columna].astype(object)
+    codigos, distintos = pd.factorize(serie, use_na_sentinel=True)
+    por_valor = [
+        extraer_referencias(
+            str(int(v)) if isinstance(v, float) and v.is_integer() else str(v)
+        )
+        for v in distintos
+    ] + [()]
+    return [por_valor[c] for c in codigos.tolist()]
+
+
+def _buscar_combinacion(
+    montos: list[int],
+    objetivo: int,
+    max_tamano: int,
+    max_evaluaciones: int = MAX_EVALUACIONES
+) -> list[int] | None:
+    """
+    Posiciones de 2..max_tamano montos que suman exactamente `objetivo`,
+    prefiriendo la combinación más chica. `montos` ordenados de mayor a menor.
+    """
+    presupuesto = max_evaluaciones
+
+    def buscar(inicio: int, restante: int, faltan: int, elegidos: list[int]) -> bool:
+        nonlocal presupuesto
+        if faltan == 0:
+            return restante == 0
+        for p in range(inicio, len(montos) - faltan + 1):
+            presupuesto -= 1
+            if presupuesto < 0:
+                return False
+            monto = montos[p]
+            if monto > restante:
+                continue
+            # Los siguientes son menores o iguales: ya no alcanzan
+            if monto * faltan < restante:
+                return False
+            elegidos.append(p)
+            if buscar(p + 1, restante - monto, faltan - 1, elegidos):
+                return True
+            elegidos.pop()
+        return False
+
+    for tamano in range(2, max_tamano + 1):
+        elegidos: list[int] = []
+        if buscar(0, objetivo, tamano, elegidos):
+            return elegidos
+        if presupuesto < 0:
+            break
+    return None
+
+
+def _imputar_grupo(
+    importes: list[int],
+    fechas: list[int],
+    referencias: list[tuple[str, ...]],
+    max_combinacion: int,
+    max_candidatos: int
+) -> tuple[list[tuple[str, list[int], list[int], int]], list[int]]:
+    """
+    Imputa las partidas de una agrupación.
+
+    Args:
+        importes: Importe con signo de cada partida, en centavos (debe - haber)
+        fechas: Día de cada partida (para el orden; sin fecha va al final)
+        referencias: Números de comprobante de cada partida
+        max_combinacion: Partidas por combinación en la pasada 3 (menor a 2 la omite)
+        max_candidatos: Partidas del lado opuesto consideradas en la pasada 3
+
+    Returns:
+        Tupla (imputaciones, pendientes). Cada imputación es
+        (tipo, posiciones del debe, posiciones del haber, importe); pendientes
+        es el importe sin cancelar de cada partida, en centavos y sin signo.
+    """
+    pendiente = [abs(i) for i in importes]
+    debe = sorted((k for k, i in enumerate(importes) if i > 0), key=lambda k: (fechas[k], k))
+    haber = sorted((k for k, i in enumerate(importes) if i < 0), key=lambda k: (fechas[k], k))
+    imputaciones: list[tuple[str, list[int], list[int], int]] = []
+    if not debe or not haber:
+        return imputaciones, pendiente
+
+    # 1. Comprobantes citados: hash join por referencia entre los dos lados
+    por_referencia: dict[str, tuple[list[int], list[int]]] = {}
+    for lado, partidas in ((0, debe), (1, haber)):
+        for k in partidas:
+            for referencia in referencias[k]:
+                por_referencia.setdefault(referencia, ([], []))[lado].append(k)
+    pares: set[tuple[int, int]] = set()
+    for del_debe, del_haber in por_referencia.values():
+        if (
+            del_debe and del_haber
+            and len(del_debe) + len(del_haber) <= MAX_PARTIDAS_POR_REFERENCIA
+        ):
+            pares.update((d, h) for d in del_debe for h in del_haber)
+    for d, h in sorted(pares, key=lambda p: (fechas[p[1]], p[1], fechas[p[0]], p[0])):
+        monto = min(pendiente[d], pendiente[h])
+        if monto > 0:
+            pendiente[d] -= monto
+            pendiente[h] -= monto
+            imputaciones.append((TIPO_COMPROBANTE, [d], [h], monto))
+
+    # 2. Importes iguales: dos punteros sobre los lados ordenados por (importe, fecha)
+    lado_debe = sorted((k for k in debe if pendiente[k] > 0), key=lambda k: (pendiente[k], fechas[k], k))
+    lado_haber = sorted((k for k in haber if pendiente[k] > 0), key=lambda k: (pendiente[k], fechas[k], k))
+    a = b = 0
+    while a < len(lado_debe) and b < len(lado_haber):
+        d, h = lado_debe[a], lado_haber[b]
+        if pendiente[d] == pendiente[h]:
+            imputaciones.append((TIPO_IMPORTE, [d], [h], pendiente[d]))
+            pendiente[d] = pendiente[h] = 0
+            a += 1
+            b += 1
+        elif pendiente[d] < pendiente[h]:
+            a += 1
+        else:
+            b += 1
+
+    # 3. Una partida contra varias del lado opuesto (pagos de varias facturas
+    # y facturas pagadas en cuotas), siempre entre las más antiguas abiertas
+    if max_combinacion >= 2:
+        for objetivos, candidatas, es_haber in ((haber, debe, True), (debe, haber, False)):
+            abiertas = [k for k in candidatas if pendiente[k] > 0]
+            for k in objetivos:
+                objetivo = pendiente[k]
+                if objetivo == 0:
+                    continue
+                ventana = [c for c in abiertas[:max_candidatos] if pendiente[c] < objetivo]
+                if len(ventana) < 2:
+                    continue
+                ventana.sort(key=lambda c: -pendiente[c])
+                elegidas = _buscar_combinacion([pendiente[c] for c in ventana], objetivo, max_combinacion)
+                if elegidas is None:
+                    continue
+                miembros = sorted((ventana[p] for p in elegidas), key=lambda c: (fechas[c], c))
+                for c in miembros:
+                    pendiente[c] = 0
+                pendiente[k] = 0
+                abiertas = [c for c in abiertas if pendiente[c] > 0]
+                imputaciones.append(
+                    (TIPO_COMBINACION, miembros, [k], objetivo) if es_haber
+                    else (TIPO_COMBINACION, [k], miembros, objetivo)
+                )
+
+    return imputaciones, pendiente
+
+
+def _imputar_lote(tareas: list[tuple]) -> list[tuple]:
+    """Imputa varias agrupaciones. Función de módulo para el pool."""
+    return [_imputar_grupo(*tarea) for tarea in tareas]
+
+
+def _validar_limites(max_combinacion: int, max_candidatos: int):
+    if not 1 <= max_combinacion <= 6:
+        raise ValueError(f"max_combinacion inválido: {max_combinacion}. Debe estar entre 1 y 6")
+    if not 2 <= max_candidatos <= 100:
+        raise ValueError(f"max_candidatos inválido: {max_candidatos}. Debe estar entre 2 y 100")
+
+
+def calcular_partidas_abiertas(
+    agrupaciones: list[dict],
+    max_combinacion: int = MAX_COMBINACION_POR_DEFECTO,
+    max_candidatos: int = MAX_CANDIDATOS_POR_DEFECTO
+) -> dict[str, Any]:
+    """
+    Imputa las partidas de cada agrupación y devuelve las que quedan abiertas.
+
+    Args:
+        agrupaciones: Agrupaciones con razonSocial y sus registros
+        max_combinacion: Máximo de partidas que una sola partida puede cancelar
+            en la pasada por combinación (1 la desactiva)
+        max_candidatos: Partidas abiertas más antiguas consideradas en cada combinación
+
+    Returns:
+        Dict con una entrada por agrupación (imputaciones, partidas abiertas y
+        pendientes del debe y del haber) y estadísticas globales
+    """
+    _validar_limites(max_combinacion, max_candidatos)
+
+    registros = [r for a in agrupaciones for r in (a.get('registros') or [])]
+    limites = np.cumsum([0] + [len(a.get('registros') or []) for a in agrupaciones])
+
+    if registros:
+        df = tipar_registros(pd.DataFrame(registros))
+        importes = (centavos(df, 'debe') - centavos(df, 'haber')).tolist()
+        if 'fecha' in df.columns and pd.api.types.is_datetime64_any_dtype(df['fecha']):
+            dias = df['fecha'].to_numpy(dtype='datetime64[D]')
+        else:
+            dias = pd.to_datetime(
+                df['fecha'] if 'fecha' in df.columns else pd.Series([None] * len(df)),
+                format='ISO8601', errors='coerce'
+            ).to_numpy(dtype='datetime64[D]')
+        fechas = np.where(np.isnat(dias), np.iinfo(np.int64).max, dias.astype(np.int64)).tolist()
+        referencias = [
+            propias + tuple(r for r in citadas if r not in propias)
+            for propias, citadas in zip(
+                _referencias_columna(df, 'comprobante'),
+                _referencias_columna(df, columna_descripcion(df))
+            )
+        ]
+    else:
+        importes, fechas, referencias = [], [], []
+
+    tareas = [
+        (importes[i:j], fechas[i:j], referencias[i:j], max_combinacion, max_candidatos)
+        for i, j in zip(limites[:-1].tolist(), limites[1:].tolist())
+    ]
+
+    if len(registros) >= MIN_REGISTROS_PARALELO and cantidad_procesos() >= 2 and len(tareas) > 1:
+        # Lotes parejos: agrupaciones de mayor a menor repartidas en ronda
+        cantidad_lotes = min(len(tareas), cantidad_procesos() * 4)
+        orden = sorted(range(len(tareas)), key=lambda g: -len(tareas[g][0]))
+        lotes = [orden[l::cantidad_lotes] for l in range(cantidad_lotes)]
+        por_lote = obtener_pool().map(_imputar_lote, [[tareas[g] for g in lote] for lote in lotes])
+        resultados: list[tuple | None] = [None] * len(tareas)
+        for lote, salida_lote in zip(lotes, por_lote):
+            for g, resultado in zip(lote, salida_lote):
+                resultados[g] = resultado
+    else:
+        resultados = _imputar_lote(tareas)
+
+    salida = []
+    conteo = {TIPO_COMPROBANTE: 0, TIPO_IMPORTE: 0, TIPO_COMBINACION: 0}
+    total_abiertas = 0
+    for agrupacion, (imputaciones, pendientes), inicio in zip(agrupaciones, resultados, limites[:-1].tolist()):
+        registros_grupo = agrupacion.get('registros') or []
+        signos = importes[inicio:inicio + len(registros_grupo)]
+        ids = [r.get('id') for r in registros_grupo]
+
+        abiertas = []
+        pendiente_debe = pendiente_haber = 0
+        for k, r in enumerate(registros_grupo):
+            if pendientes[k] == 0:
+                continue
+            if signos[k] > 0:
+                pendiente_debe += pendientes[k]
+            else:
+                pendiente_haber += pendientes[k]
+            abiertas.append({**r, 'pendiente': a_importe(pendientes[k])})
+
+        for tipo, *_ in imputaciones:
+            conteo[tipo] += 1
+        total_abiertas += len(abiertas)
+
+        salida.append({
+            'razonSocial': agrupacion.get('razonSocial'),
+            'saldo': a_importe(pendiente_debe - pendiente_haber),
+            'pendiente_debe': a_importe(pendiente_debe),
+            'pendiente_haber': a_importe(pendiente_haber),
+            'imputaciones': [
+                {
+                    'tipo': tipo,
+                    'debe': [ids[k] for k in del_debe],
+                    'haber': [ids[k] for k in del_haber],
+                    'importe': a_importe(monto),
+                }
+                for tipo, del_debe, del_haber, monto in imputaciones
+            ],
+            'partidas_abiertas': abiertas,
+        })
+
+    return {
+        'agrupaciones': salida,
+        'estadisticas': {
+            'registros': len(registros),
+            'partidas_abiertas': total_abiertas,
+            'imputaciones': conteo,
+        }
+    }
@@ -5,16 +5,34 @@ Optimizado para grandes volúmenes de datos usando Pandas.
 import pandas as pd
 import numpy as np
 import math
+import os
+import tempfile
 from io import BytesIO
 from typing import Any
-from datetime import datetime
 
 from app.services.agrupacion import (
     extraer_razon_social,
     generar_clave_agrupacion,
-    calcular_similitud,
     generar_id_agrupacion
 )
+from app.services.candidatos import IndiceNgramas, TAMANO_NGRAMA
+from app.services.modelo import (
+    COLUMNAS_IMPORTE,
+    a_importe,
+    a_registros,
+    centavos,
+    columnas_publicas,
+    tipar_registros
+)
+from app.services.normalizacion import (
+    TAMANO_MUESTRA,
+    inferir_formato_numero,
+    normalizar_columnas,
+    parsear_numeros
+)
+from app.services.paralelo import obtener_pool
+from app.services.similitud_lote import PerfilesLote
+from app.services.union_find import ENLACE_SIMPLE, agrupar_claves_union_find
 
 
 def limpiar_para_json(obj):
@@ -38,27 +56,44 @@ def limpiar_para_json(obj):
     return obj
 
 
-def procesar_excel(contenido: bytes, nombre_archivo: str) -> dict[str, Any]:
+def _motor_excel(nombre_archivo: str) -> str | None:
+    """Detecta el motor de lectura según la extensión."""
+    if nombre_archivo.endswith('.xlsx'):
+        return 'openpyxl'
+    if nombre_archivo.endswith('.xls'):
+        return 'xlrd'
+    return None
+
+
+def listar_hojas(contenido: bytes, nombre_archivo: str) -> list[str]:
+    """Nombres de las hojas de un libro Excel, en orden."""
+    with pd.ExcelFile(BytesIO(contenido), engine=_motor_excel(nombre_archivo)) as libro:
+        return [str(h) for h in libro.sheet_names]
+
+
+def leer_mayor(
+    contenido: bytes | str,
+    nombre_archivo: str,
+    hoja: str | int = 0
+) -> tuple[pd.DataFrame, list[str], dict[str, Any]]:
     """
-    Procesa un archivo Excel y retorna los registros parseados.
+    Lee una hoja de un mayor y la convierte al modelo tipado (ver modelo.py).
 
     Args:
-        contenido: Bytes del archivo Excel
-        nombre_archivo: Nombre del archivo para detectar formato
+        contenido: Bytes del archivo o ruta a una copia en disco
 
     Returns:
-        Dict con registros y metadata
+        Tupla (DataFrame tipado sin IDs, columnas estándar mapeadas,
+        informe de normalización por columna)
     """
-    # Detectar formato
-    if nombre_archivo.endswith('.xlsx'):
-        df = pd.read_excel(BytesIO(contenido), engine='openpyxl')
-    elif nombre_archivo.endswith('.xls'):
-        df = pd.read_excel(BytesIO(contenido), engine='xlrd')
-    else:
-        df = pd.read_excel(BytesIO(contenido))
+    df = pd.read_excel(
+        BytesIO(contenido) if isinstance(contenido, bytes) else contenido,
+        engine=_motor_excel(nombre_archivo),
+        sheet_name=hoja
+    )
 
     # Normalizar nombres de columnas
-    df.columns = df.columns.str.strip().str.lower()
+    df.columns = df.columns.astype(str).str.strip().str.lower()
 
     # Mapeo de columnas comunes
     mapeo_columnas = {
@@ -81,168 +116,635 @@ def procesar_excel(contenido: bytes, nombre_archivo: str) -> dict[str, Any]:
 
     df = df.rename(columns=columnas_finales)
 
-    # Asegurar columnas numéricas
-    for col in ['debe', 'haber', 'saldo']:
-        if col in df.columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    # Importes y fechas con el formato inferido de cada columna
+    df, informe = normalizar_columnas(df)
 
-    # Generar IDs únicos para cada registro
-    df['id'] = [f"reg_{i}_{int(datetime.now().timestamp() * 1000)}" for i in range(len(df))]
+    # Importes en centavos y textos como categóricos
+    df = tipar_registros(df)
 
-    # Convertir fechas a string ISO
-    if 'fecha' in df.columns:
-        df['fecha'] = pd.to_datetime(df['fecha'], errors='coerce')
-        df['fecha'] = df['fecha'].apply(
-            lambda x: x.isoformat() if pd.notna(x) else None
-        )
+    return df, list(columnas_finales.values()), informe
+
+
+# Columnas que identifican un registro por su contenido. El saldo queda afuera
+# porque es acumulado y cambia según el período exportado.
+COLUMNAS_IDENTIDAD = ('fecha', 'comprobante', 'asiento', 'debe', 'haber', 'descripcion', 'cuenta')
+
+
+def _texto_identidad(serie: pd.Series) -> pd.Series:
+    """Texto comparable de una columna: vacíos como '' y sin '.0' de Excel."""
+    textos = serie.astype(object).where(serie.notna(), '').astype(str).str.strip()
+    return textos.str.replace(r'\.0$', '', regex=True)
+
+
+def hash_registros(df: pd.DataFrame) -> np.ndarray:
+    """
+    Hash de 64 bits del contenido de cada registro (COLUMNAS_IDENTIDAD),
+    calculado de forma vectorizada.
+    """
+    columnas = {}
+    for col in COLUMNAS_IDENTIDAD:
+        if col in COLUMNAS_IMPORTE:
+            columnas[col] = centavos(df, col)
+        elif col not in df.columns:
+            continue
+        elif col == 'fecha' and pd.api.types.is_datetime64_any_dtype(df[col]):
+            columnas[col] = df[col].to_numpy()
+        else:
+            columnas[col] = _texto_identidad(df[col]).to_numpy()
+
+    return pd.util.hash_pandas_object(
+        pd.DataFrame(columnas, index=df.index), index=False
+    ).to_numpy()
+
+
+def _generar_ids(df: pd.DataFrame, por_archivo: bool = False) -> pd.DataFrame:
+    """
+    Agrega a cada registro un ID derivado de su contenido: el mismo archivo
+    genera siempre los mismos IDs. Los registros idénticos se distinguen por
+    su número de aparición ("reg_<hash>", "reg_<hash>_1", ...).
+
+    Args:
+        df: Registros en el modelo tipado
+        por_archivo: Numerar las apariciones dentro de cada archivo, de modo
+            que un mismo registro presente en dos archivos reciba el mismo ID
+            (para deduplicar). Si es False los IDs son únicos en todo el df.
+    """
+    hashes = pd.Series(hash_registros(df), index=df.index)
+    if por_archivo and 'archivo' in df.columns:
+        aparicion = hashes.groupby([df['archivo'].astype(object), hashes], sort=False).cumcount()
+    else:
+        aparicion = hashes.groupby(hashes, sort=False).cumcount()
+
+    ids = 'reg_' + hashes.map('{:016x}'.format)
+    repetidos = aparicion > 0
+    ids[repetidos] = ids[repetidos] + '_' + aparicion[repetidos].astype(str)
+    df['id'] = ids
+    return df
+
+
+def ids_de_registros(registros: list[dict]) -> set[str]:
+    """IDs de contenido de registros ya serializados (p. ej. los de una conciliación guardada)."""
+    if not registros:
+        return set()
+    df = tipar_registros(pd.DataFrame(registros))
+    return set(_generar_ids(df)['id'])
+
+
+def deduplicar_registros(
+    df: pd.DataFrame,
+    ids_existentes: set[str] | None = None
+) -> tuple[pd.DataFrame, int]:
+    """
+    Descarta registros repetidos (mismo ID de contenido) y los que ya existen.
+
+    Returns:
+        Tupla (DataFrame sin duplicados, cantidad de registros descartados)
+    """
+    descartar = df['id'].duplicated()
+    if ids_existentes:
+        descartar |= df['id'].isin(ids_existentes)
+    return df[~descartar.to_numpy()].reset_index(drop=True), int(descartar.sum())
+
+
+def cargar_mayor(
+    contenido: bytes,
+    nombre_archivo: str,
+    hoja: str | int = 0
+) -> tuple[pd.DataFrame, list[str], dict[str, Any]]:
+    """Lee una hoja del mayor en el modelo tipado, con IDs asignados."""
+    df, columnas_mapeadas, informe = leer_mayor(contenido, nombre_archivo, hoja)
+    return _generar_ids(df), columnas_mapeadas, informe
+
+
+def procesar_excel(
+    contenido: bytes,
+    nombre_archivo: str,
+    hoja: str | int = 0
+) -> dict[str, Any]:
+    """
+    Procesa un archivo Excel y retorna los registros parseados.
+
+    Args:
+        contenido: Bytes del archivo Excel
+        nombre_archivo: Nombre del archivo para detectar formato
+        hoja: Nombre o índice de la hoja a leer (por defecto la primera)
 
-    # Convertir NaN a None para JSON
-    df = df.where(pd.notna(df), None)
+    Returns:
+        Dict con registros y metadata
+    """
+    df, columnas_mapeadas, informe = cargar_mayor(contenido, nombre_archivo, hoja)
+    registros = a_registros(df)
 
-    registros = df.to_dict('records')
+    return {
+        'registros': registros,
+        'total': len(registros),
+        'columnas': columnas_publicas(df),
+        'columnas_mapeadas': columnas_mapeadas,
+        'normalizacion': informe
+    }
 
-    # Limpiar valores no serializables
-    registros = limpiar_para_json(registros)
+
+def _leer_hoja_etiquetada(
+    tarea: tuple[bytes | str, str, str, bool]
+) -> tuple[pd.DataFrame, dict[str, Any]]:
+    """
+    Lee una hoja y etiqueta sus filas con archivo, hoja y cuenta.
+    Función de módulo para poder ejecutarse en el pool de procesos;
+    retorna un DataFrame porque se transfiere entre procesos mucho más
+    rápido que una lista de dicts. El contenido puede ser una ruta para no
+    enviar el libro completo a cada proceso.
+    """
+    contenido, nombre_archivo, hoja, cuenta_por_hoja = tarea
+    df, _, informe = leer_mayor(contenido, nombre_archivo, hoja)
+
+    df['archivo'] = nombre_archivo
+    df['hoja'] = hoja
+    # En libros con una hoja por cuenta, la hoja identifica la cuenta
+    if cuenta_por_hoja:
+        if 'cuenta' in df.columns:
+            cuenta = df['cuenta'].astype(object)
+            df['cuenta'] = cuenta.where(cuenta.notna(), hoja)
+        else:
+            df['cuenta'] = hoja
+
+    return df, informe
+
+
+def cargar_mayor_multiple(
+    archivos: list[tuple[bytes, str]],
+    todas_las_hojas: bool = True,
+    deduplicar: bool = False
+) -> tuple[pd.DataFrame, list[dict]]:
+    """
+    Lee varios archivos Excel (y opcionalmente todas sus hojas) en paralelo.
+    Cada hoja se parsea en un proceso del pool y las filas se combinan en un
+    solo DataFrame tipado, etiquetadas con su archivo, hoja y cuenta.
+
+    Para el pool cada archivo se escribe una vez a disco y las tareas llevan
+    la ruta: así un libro de N hojas no se copia N veces a los procesos (fuera
+    de la memoria reservada en la admisión) y cada proceso lee de la copia en
+    disco solo la hoja que le toca.
+
+    Args:
+        archivos: Lista de (contenido, nombre_archivo)
+        todas_las_hojas: Procesar todas las hojas o solo la primera de cada archivo
+        deduplicar: Descartar los registros repetidos entre archivos (por
+            ejemplo, exportaciones de períodos superpuestos)
+
+    Returns:
+        Tupla (DataFrame tipado con IDs, detalle de registros por fuente)
+    """
+    tareas = []
+    for i, (contenido, nombre_archivo) in enumerate(archivos):
+        hojas = listar_hojas(contenido, nombre_archivo)
+        if not todas_las_hojas:
+            hojas = hojas[:1]
+        cuenta_por_hoja = todas_las_hojas and len(hojas) > 1
+        tareas.extend((i, nombre_archivo, hoja, cuenta_por_hoja) for hoja in hojas)
+
+    if len(tareas) > 1:
+        with tempfile.TemporaryDirectory() as directorio:
+            rutas = []
+            for i, (contenido, nombre_archivo) in enumerate(archivos):
+                rutas.append(os.path.join(directorio, f"{i}{os.path.splitext(nombre_archivo)[1]}"))
+                with open(rutas[-1], 'wb') as f:
+                    f.write(contenido)
+            leidas = list(obtener_pool().map(
+                _leer_hoja_etiquetada, [(rutas[t[0]],) + t[1:] for t in tareas]
+            ))
+    else:
+        leidas = [_leer_hoja_etiquetada((archivos[t[0]][0],) + t[1:]) for t in tareas]
+
+    hojas_leidas = [df for df, _ in leidas]
+    fuentes = [
+        {'archivo': t[1], 'hoja': t[2], 'registros': len(df), 'normalizacion': informe}
+        for t, (df, informe) in zip(tareas, leidas)
+    ]
+
+    if not hojas_leidas:
+        return pd.DataFrame(), fuentes
+
+    # Al concatenar, los categóricos con distintas categorías pasan a object
+    df = pd.concat(hojas_leidas, ignore_index=True)
+    df = _generar_ids(tipar_registros(df), por_archivo=deduplicar)
+    if deduplicar:
+        df, _ = deduplicar_registros(df)
+    return df, fuentes
+
+
+def procesar_excel_multiple(
+    archivos: list[tuple[bytes, str]],
+    todas_las_hojas: bool = True,
+    deduplicar: bool = False
+) -> dict[str, Any]:
+    """
+    Procesa varios archivos Excel y/o hojas y retorna los registros combinados.
+
+    Returns:
+        Dict con registros combinados, columnas y detalle por fuente
+    """
+    df, fuentes = cargar_mayor_multiple(archivos, todas_las_hojas, deduplicar)
+    registros = a_registros(df)
 
     return {
         'registros': registros,
         'total': len(registros),
-        'columnas': list(df.columns),
-        'columnas_mapeadas': list(columnas_finales.values())
+        'columnas': columnas_publicas(df),
+        'fuentes': fuentes
     }
 
 
+# Filas por bloque al leer CSV de saldos (mantiene la memoria acotada)
+TAMANO_BLOQUE_CSV = 50_000
+
+PALABRAS_COLUMNA_RAZON = ['razon', 'razón', 'nombre', 'cliente', 'proveedor', 'deudor']
+PALABRAS_COLUMNA_SALDO = ['saldo', 'monto', 'importe', 'total', 'debe', 'haber']
+
+
+def parsear_importes(serie: pd.Series, formato: str | None = None) -> pd.Series:
+    """
+    Convierte una columna de importes a float de forma vectorizada.
+    Los textos se interpretan con el formato indicado o, si no se indica,
+    con el inferido de la columna ("$ 1.234,56" o "1,234.56");
+    lo que no se puede convertir queda en 0.
+    """
+    if formato is None:
+        formato = inferir_formato_numero(serie)
+    valores, _ = parsear_numeros(serie, formato)
+    return valores.fillna(0.0)
+
+
+def _detectar_columnas_saldos(df: pd.DataFrame) -> tuple[str, str]:
+    """Detecta las columnas de razón social y de saldo de un archivo de saldos."""
+    # Buscar columna de razón social
+    col_razon = None
+    for col in df.columns:
+        if any(x in col for x in PALABRAS_COLUMNA_RAZON):
+            col_razon = col
+            break
+
+    if not col_razon:
+        # Usar primera columna de texto
+        for col in df.columns:
+            if df[col].dtype == 'object':
+                col_razon = col
+                break
+
+    if not col_razon:
+        raise ValueError("No se encontró columna de razón social")
+
+    # Buscar columna de saldo
+    col_saldo = None
+    for col in df.columns:
+        if any(x in col for x in PALABRAS_COLUMNA_SALDO):
+            col_saldo = col
+            break
+
+    if not col_saldo:
+        # Buscar primera columna numérica
+        for col in df.columns:
+            if col != col_razon and pd.api.types.is_numeric_dtype(df[col]):
+                col_saldo = col
+                break
+
+    if not col_saldo:
+        raise ValueError("No se encontró columna de saldo")
+
+    return col_razon, col_saldo
+
+
+def _extraer_saldos(
+    df: pd.DataFrame,
+    col_razon: str,
+    col_saldo: str,
+    formato: str | None = None
+) -> pd.DataFrame:
+    """Reduce un bloque a las columnas razonSocial/saldo, descartando razones vacías."""
+    razones = df[col_razon].astype(str).str.strip()
+    validas = df[col_razon].notna() & ~razones.str.lower().isin(['nan', 'none', ''])
+
+    return pd.DataFrame({
+        'razonSocial': razones[validas],
+        'saldo': parsear_importes(df.loc[validas, col_saldo], formato),
+    })
+
+
+def procesar_saldos(contenido: bytes, nombre_archivo: str) -> dict[str, Any]:
+    """
+    Procesa un archivo (Excel o CSV) de saldos por razón social.
+    Los CSV se leen por bloques como texto, reduciendo cada uno a dos
+    columnas; el formato de los importes se infiere una sola vez.
+
+    Returns:
+        Dict con los saldos ({razonSocial, saldo}) y las columnas detectadas
+    """
+    col_razon = col_saldo = formato = None
+    if nombre_archivo.endswith('.csv'):
+        # Columnas detectadas con una muestra (tipos inferidos); los bloques se
+        # leen como texto para que cada importe se interprete igual sin importar
+        # en qué bloque cae
+        muestra = pd.read_csv(BytesIO(contenido), nrows=TAMANO_MUESTRA)
+        muestra.columns = muestra.columns.astype(str).str.strip().str.lower()
+        col_razon, col_saldo = _detectar_columnas_saldos(muestra)
+        bloques = pd.read_csv(BytesIO(contenido), dtype=str, chunksize=TAMANO_BLOQUE_CSV)
+    else:
+        bloques = [pd.read_excel(BytesIO(contenido))]
+
+    partes = []
+    for bloque in bloques:
+        # Normalizar nombres de columnas
+        bloque.columns = bloque.columns.astype(str).str.strip().str.lower()
+        if col_razon is None:
+            col_razon, col_saldo = _detectar_columnas_saldos(bloque)
+        if formato is None:
+            # El formato de los importes se infiere una vez, con el primer bloque
+            formato = inferir_formato_numero(bloque[col_saldo])
+        partes.append(_extraer_saldos(bloque, col_razon, col_saldo, formato))
+
+    saldos_df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(
+        columns=['razonSocial', 'saldo']
+    )
+    saldos = saldos_df.to_dict('records')
+
+    return {
+        'saldos': saldos,
+        'total': len(saldos),
+        'columna_razon': col_razon,
+        'columna_saldo': col_saldo
+    }
+
+
+# Claves existentes comparadas por lote en agrupar_claves
+TAMANO_BLOQUE_CONSULTA = 4096
+
+# Motores de agrupación de claves
+MOTOR_VORAZ = 'voraz'
+MOTOR_UNION_FIND = 'union_find'
+MOTORES = (MOTOR_VORAZ, MOTOR_UNION_FIND)
+
+
+def _mapear_unicos(serie: pd.Series, funcion) -> pd.Series:
+    """
+    Aplica una función de texto una sola vez por valor distinto.
+    Los vacíos se tratan como ''. El resultado es categórico.
+    """
+    if not isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype('category')
+    # El último elemento corresponde al código -1 (vacío)
+    resultados = np.array(
+        [funcion(str(c)) for c in serie.cat.categories] + [funcion('')],
+        dtype=object
+    )
+    return pd.Series(
+        pd.Categorical(resultados[serie.cat.codes.to_numpy()]),
+        index=serie.index
+    )
+
+
+def agrupar_claves(
+    claves: list[str],
+    razones: list[str],
+    umbral_similitud: float = 0.75,
+    alias: dict[str, str] | None = None,
+    candidatos_max: int | None = None,
+    tamano_ngrama: int = TAMANO_NGRAMA
+) -> dict[str, str]:
+    """
+    Asigna una razón social canónica a cada clave distinta.
+    Las claves se recorren en orden de aparición: cada una se une a la primera
+    clave ya vista que supere el umbral, o inicia un grupo nuevo.
+
+    Args:
+        claves: Claves distintas, en orden de primera aparición
+        razones: Razón social del primer registro de cada clave
+        alias: Alias aprendidos del cliente (clave -> razón canónica). Una
+            clave con alias se asigna directamente, sin comparar similitudes.
+        candidatos_max: Si se indica, búsqueda aproximada: cada clave se
+            compara solo con las `candidatos_max` claves que comparten más
+            n-gramas (ver services/candidatos.py)
+        tamano_ngrama: Tamaño de los n-gramas de la búsqueda aproximada
+
+    Returns:
+        Dict clave -> razón social canónica
+    """
+    clave_a_canonica: dict[str, str] = {}
+    alias = alias or {}
+    indice = IndiceNgramas(tamano_ngrama) if candidatos_max else None
+
+    # Similitudes por lotes (mismo resultado que calcular_similitud)
+    perfiles = PerfilesLote(claves)
+    # Posiciones de las claves ya asignadas, en orden de asignación
+    asignadas = np.empty(len(claves), dtype=np.int64)
+    n_asignadas = 0
+
+    for posicion, (clave, razon_social) in enumerate(zip(claves, razones)):
+        if clave in clave_a_canonica:
+            continue
+
+        if clave in alias:
+            canonica = alias[clave]
+        else:
+            if indice is None:
+                existentes = asignadas[:n_asignadas]
+            else:
+                existentes = asignadas[indice.candidatos(clave, candidatos_max)]
+
+            # Primera clave existente que supere el umbral (por bloques, para
+            # cortar apenas aparece)
+            canonica = razon_social
+            for inicio in range(0, len(existentes), TAMANO_BLOQUE_CONSULTA):
+                bloque = existentes[inicio:inicio + TAMANO_BLOQUE_CONSULTA]
+                superan = np.flatnonzero(
+                    perfiles.puntuar_consulta(posicion, bloque) >= umbral_similitud
+                )
+                if len(superan):
+                    canonica = clave_a_canonica[claves[bloque[superan[0]]]]
+                    break
+
+        clave_a_canonica[clave] = canonica
+        asignadas[n_asignadas] = posicion
+        n_asignadas += 1
+        if indice is not None:
+            indice.agregar(clave)
+
+    return clave_a_canonica
+
+
+def columna_descripcion(df: pd.DataFrame) -> str | None:
+    """Columna con la leyenda de los registros (descripcion o una alternativa)"""
+    for col in ['descripcion', 'concepto', 'detalle', 'leyenda']:
+        if col in df.columns:
+            return col
+    return None
+
+
+def asignar_claves(registros: list[dict] | pd.DataFrame) -> pd.DataFrame:
+    """
+    Modelo tipado de los registros con las columnas razon_social y
+    clave_agrupacion, calculadas una vez por valor distinto.
+    """
+    if isinstance(registros, pd.DataFrame):
+        df = registros.copy(deep=False)
+    else:
+        df = tipar_registros(pd.DataFrame(registros))
+
+    # Extraer razón social de cada registro
+    descripcion_col = columna_descripcion(df)
+    if descripcion_col:
+        df['razon_social'] = _mapear_unicos(df[descripcion_col], extraer_razon_social)
+    else:
+        df['razon_social'] = pd.Categorical(['Sin Asignar'] * len(df))
+
+    # Generar claves de agrupación
+    df['clave_agrupacion'] = _mapear_unicos(df['razon_social'], generar_clave_agrupacion)
+    return df
+
+
+def claves_representativas(df_asignados: pd.DataFrame) -> tuple[list[str], list[str], list[int]]:
+    """
+    Claves distintas (ordenadas) con su razón social más frecuente
+    (desempate alfabético) y su cantidad de registros. No depende del orden
+    de los registros.
+
+    Returns:
+        Tupla (claves, razones, pesos)
+    """
+    conteo = (
+        df_asignados.groupby(['clave_agrupacion', 'razon_social'], observed=True)
+        .size().rename('n').reset_index()
+    )
+    conteo['clave_agrupacion'] = conteo['clave_agrupacion'].astype(object)
+    conteo['razon_social'] = conteo['razon_social'].astype(object)
+    representativas = conteo.sort_values(
+        ['clave_agrupacion', 'n', 'razon_social'], ascending=[True, False, True]
+    ).drop_duplicates('clave_agrupacion')
+    pesos = conteo.groupby('clave_agrupacion')['n'].sum()
+
+    claves = representativas['clave_agrupacion'].tolist()
+    return claves, representativas['razon_social'].tolist(), pesos.loc[claves].tolist()
+
+
 def agrupar_por_razon_social(
-    registros: list[dict],
-    umbral_similitud: float = 0.75
+    registros: list[dict] | pd.DataFrame,
+    umbral_similitud: float = 0.75,
+    alias: dict[str, str] | None = None,
+    candidatos_max: int | None = None,
+    motor: str = MOTOR_VORAZ,
+    enlace: str = ENLACE_SIMPLE
 ) -> dict[str, Any]:
     """
     Agrupa registros por razón social extraída de la descripción.
-    Usa procesamiento vectorizado con Pandas para mejor rendimiento.
+    Trabaja sobre el modelo tipado: la extracción y las claves se calculan una
+    vez por valor distinto y la similitud una vez por clave distinta.
 
     Args:
-        registros: Lista de registros del mayor
+        registros: Lista de registros del mayor, o DataFrame ya tipado
         umbral_similitud: Umbral para considerar razones sociales similares (0-1)
+        alias: Alias aprendidos del cliente (ver services/alias.py)
+        candidatos_max: Usar la búsqueda aproximada por n-gramas con este
+            máximo de candidatos por clave (ver agrupar_claves)
+        motor: 'voraz' (recorrido en orden de aparición) o 'union_find'
+            (pares candidatos puntuados en paralelo; el resultado no depende
+            del orden de los registros, ver services/union_find.py)
+        enlace: Enlace del motor union_find ('simple' o 'completo')
 
     Returns:
         Dict con agrupaciones y estadísticas
     """
-    if not registros:
+    if motor not in MOTORES:
+        raise ValueError(f"Motor inválido: {motor}. Opciones: {', '.join(MOTORES)}")
+
+    if len(registros) == 0:
         return {
             'agrupaciones': [],
             'sin_asignar': [],
             'totales': {'debe': 0, 'haber': 0, 'saldo': 0}
         }
 
-    # Convertir a DataFrame para procesamiento eficiente
-    df = pd.DataFrame(registros)
-
-    # Extraer razón social de cada registro
-    descripcion_col = 'descripcion' if 'descripcion' in df.columns else None
-    if not descripcion_col:
-        # Buscar columna alternativa
-        for col in ['concepto', 'detalle', 'leyenda']:
-            if col in df.columns:
-                descripcion_col = col
-                break
-
-    if descripcion_col:
-        df['razon_social'] = df[descripcion_col].apply(
-            lambda x: extraer_razon_social(str(x) if pd.notna(x) else '')
-        )
-    else:
-        df['razon_social'] = 'Sin Asignar'
-
-    # Generar claves de agrupación
-    df['clave_agrupacion'] = df['razon_social'].apply(generar_clave_agrupacion)
+    df = asignar_claves(registros)
 
     # Separar sin asignar
-    sin_asignar_mask = df['razon_social'] == 'Sin Asignar'
+    sin_asignar_mask = (df['razon_social'] == 'Sin Asignar').to_numpy()
     df_sin_asignar = df[sin_asignar_mask]
     df_asignados = df[~sin_asignar_mask]
 
-    # Agrupar por clave, considerando similitud
-    clave_a_canonica: dict[str, str] = {}
-    registros_por_grupo: dict[str, list] = {}
-
-    for _, row in df_asignados.iterrows():
-        clave = row['clave_agrupacion']
-        razon_social = row['razon_social']
-        registro = row.to_dict()
-
-        # Buscar si ya existe una clave similar
-        razon_canonica = razon_social
-        encontrada = False
-
-        if clave in clave_a_canonica:
-            razon_canonica = clave_a_canonica[clave]
-            encontrada = True
-        else:
-            # Buscar similitud con claves existentes
-            for clave_existente, rs_canonica in clave_a_canonica.items():
-                similitud = calcular_similitud(clave, clave_existente)
-                if similitud >= umbral_similitud:
-                    razon_canonica = rs_canonica
-                    clave_a_canonica[clave] = rs_canonica
-                    encontrada = True
-                    break
+    # Agrupar por clave, considerando similitud (una vez por clave distinta)
+    if motor == MOTOR_UNION_FIND:
+        claves_distintas, razones_distintas, pesos = claves_representativas(df_asignados)
+        clave_a_canonica = agrupar_claves_union_find(
+            claves_distintas, razones_distintas, umbral_similitud, alias, pesos, enlace
+        )
+    else:
+        primeras = df_asignados.drop_duplicates('clave_agrupacion')
+        claves_distintas = primeras['clave_agrupacion'].astype(object).tolist()
+        clave_a_canonica = agrupar_claves(
+            claves_distintas,
+            primeras['razon_social'].astype(object).tolist(),
+            umbral_similitud,
+            alias,
+            candidatos_max
+        )
 
-            if not encontrada:
-                clave_a_canonica[clave] = razon_social
+    canonica = df_asignados['clave_agrupacion'].astype(object).map(clave_a_canonica).to_numpy()
+    posiciones = pd.Series(canonica).groupby(canonica, sort=False).indices
+    # Grupos en orden de aparición de su razón social canónica
+    posiciones_por_grupo = {rs: posiciones[rs] for rs in pd.unique(canonica)}
 
-        # Agregar registro al grupo
-        if razon_canonica not in registros_por_grupo:
-            registros_por_grupo[razon_canonica] = []
-        registros_por_grupo[razon_canonica].append(registro)
+    debe = centavos(df_asignados, 'debe')
+    haber = centavos(df_asignados, 'haber')
+    razones = df_asignados['razon_social'].astype(object).to_numpy()
+    registros_asignados = a_registros(df_asignados)
 
     # Construir agrupaciones con totales
     agrupaciones = []
-    for razon_social, regs in registros_por_grupo.items():
-        total_debe = sum(r.get('debe', 0) or 0 for r in regs)
-        total_haber = sum(r.get('haber', 0) or 0 for r in regs)
+    for razon_social, posiciones in posiciones_por_grupo.items():
+        total_debe = int(debe[posiciones].sum())
+        total_haber = int(haber[posiciones].sum())
 
         # Recolectar variantes
-        variantes = list(set(r.get('razon_social', razon_social) for r in regs))
+        variantes = list(dict.fromkeys(razones[posiciones]))
+        if motor == MOTOR_UNION_FIND:
+            variantes.sort()
 
         agrupacion = {
             'id': generar_id_agrupacion(razon_social),
             'razonSocial': razon_social,
-            'registros': regs,
-            'cantidad': len(regs),
-            'totalDebe': round(total_debe, 2),
-            'totalHaber': round(total_haber, 2),
-            'saldo': round(total_debe - total_haber, 2),
+            'registros': [registros_asignados[i] for i in posiciones],
+            'cantidad': len(posiciones),
+            'totalDebe': a_importe(total_debe),
+            'totalHaber': a_importe(total_haber),
+            'saldo': a_importe(total_debe - total_haber),
             'variantes': variantes
         }
         agrupaciones.append(agrupacion)
 
     # Ordenar por saldo absoluto descendente
-    agrupaciones.sort(key=lambda x: abs(x['saldo']), reverse=True)
+    if motor == MOTOR_UNION_FIND:
+        agrupaciones.sort(key=lambda x: (-abs(x['saldo']), x['razonSocial']))
+    else:
+        agrupaciones.sort(key=lambda x: abs(x['saldo']), reverse=True)
 
     # Registros sin asignar
-    sin_asignar = df_sin_asignar.to_dict('records')
+    sin_asignar = a_registros(df_sin_asignar)
 
     # Totales generales
-    total_debe = df['debe'].sum() if 'debe' in df.columns else 0
-    total_haber = df['haber'].sum() if 'haber' in df.columns else 0
-
-    # Limpiar valores no serializables
-    agrupaciones = limpiar_para_json(agrupaciones)
-    sin_asignar = limpiar_para_json(sin_asignar)
+    total_debe = int(centavos(df, 'debe').sum())
+    total_haber = int(centavos(df, 'haber').sum())
 
     return {
         'agrupaciones': agrupaciones,
         'sin_asignar': sin_asignar,
         'totales': {
-            'debe': round(float(total_debe) if not pd.isna(total_debe) else 0, 2),
-            'haber': round(float(total_haber) if not pd.isna(total_haber) else 0, 2),
-            'saldo': round(float(total_debe - total_haber) if not pd.isna(total_debe - total_haber) else 0, 2)
+            'debe': a_importe(total_debe),
+            'haber': a_importe(total_haber),
+            'saldo': a_importe(total_debe - total_haber)
         },
         'estadisticas': {
-            'total_registros': len(registros),
+            'total_registros': len(df),
             'total_agrupaciones': len(agrupaciones),
             'registros_asignados': len(df_asignados),
-            'registros_sin_asignar': len(sin_asignar)
+            'registros_sin_asignar': len(sin_asignar),
+            'claves_por_alias': sum(1 for c in claves_distintas if c in (alias or {}))
         }
     }
 
@@ -0,0 +1,130 @@
+"""
+Respuestas JSON de conciliaciones guardadas sin validar ni re-serializar
+los arreglos grandes.
+
+Los registros y agrupaciones ya se guardaron como JSON válido: en lugar de
+parsearlos a objetos Python, validarlos con el response_model y volver a
+serializarlos, se piden a PostgREST como bytes y se insertan tal cual en la
+respuesta. Solo la cabecera (id, nombre, fechas, contadores, saldos) pasa por
+Pydantic. Cuando hace falta tocar los arreglos (agrupaciones guardadas sin sus
+registros) se serializan con orjson si está instalado.
+
+Para recorrer un arreglo guardado sin armar la lista completa (por ejemplo al
+exportar) ArregloJSON lo parsea elemento por elemento desde los bytes.
+"""
+import json
+import re
+from typing import Any, Iterator
+
+try:
+    import orjson
+except ImportError:  # opcional: más rápido para listas grandes
+    orjson = None
+
+
+# Objeto único en lugar de lista (PostgREST responde 406 si no hay exactamente una fila)
+ACCEPT_OBJETO = "application/vnd.pgrst.object+json"
+
+# Agrupación con la lista de registros vacía o nula: puede haber que
+# reconstruirla (ver _reconstruir_registros_agrupaciones en el router)
+_RE_REGISTROS_VACIOS = re.compile(rb'"registros"\s*:\s*(\[\s*\]|null)')
+
+# Espacios y comas entre los elementos de un arreglo
+_RE_SEPARADORES = re.compile(r'[\s,]*')
+
+
+def a_json(valor: Any) -> bytes:
+    """Serializa a JSON compacto (orjson si está disponible)"""
+    if orjson is not None:
+        return orjson.dumps(valor)
+    return json.dumps(valor, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def arreglo_crudo(supabase, tabla: str, columna: str, filtro: str, valor: int) -> bytes | None:
+    """
+    Bytes del arreglo JSON guardado en `columna` de la única fila de `tabla`
+    con filtro = valor, sin parsearlo.
+
+    Returns:
+        El arreglo (b'[]' si la columna es null) o None si no hay fila o la
+        respuesta no tiene la forma esperada
+    """
+    respuesta = supabase.postgrest.session.get(
+        f"/{tabla}",
+        params={"select": columna, filtro: f"eq.{valor}"},
+        headers={"Accept": ACCEPT_OBJETO},
+    )
+    if respuesta.status_code != 200:
+        return None
+
+    # {"columna": <valor>}: el valor va del primer ':' a la última '}'
+    cuerpo = respuesta.content
+    inicio = cuerpo.find(b':')
+    fin = cuerpo.rfind(b'}')
+    if inicio < 0 or fin < inicio:
+        return None
+    arreglo = cuerpo[inicio + 1:fin].strip()
+    if arreglo == b'null':
+        return b'[]'
+    if not (arreglo.startswith(b'[') and arreglo.endswith(b']')):
+        return None
+    return arreglo
+
+
+def necesita_reconstruir(agrupaciones: bytes, cantidad_agrupaciones: int | None = None) -> bool:
+    """
+    Si alguna agrupación podría estar guardada sin sus registros. Detección
+    conservadora sobre los bytes: ante la duda se usa el camino con parseo.
+
+    Args:
+        agrupaciones: Arreglo JSON de agrupaciones
+        cantidad_agrupaciones: Agrupaciones del arreglo (agrupaciones_count de
+            la cabecera); si se da, menos claves "registros" que agrupaciones
+            indica agrupaciones sin la clave
+    """
+    if _RE_REGISTROS_VACIOS.search(agrupaciones):
+        return True
+    # Los registros no tienen una clave "registros": solo cuentan las agrupaciones
+    return bool(cantidad_agrupaciones) and agrupaciones.count(b'"registros"') < cantidad_agrupaciones
+
+
+def componer_objeto(cabecera: bytes, arreglos: dict[str, bytes]) -> bytes:
+    """
+    Agrega arreglos JSON ya serializados a un objeto JSON serializado.
+
+    Args:
+        cabecera: Objeto JSON (b'{...}')
+        arreglos: Nombre del campo -> arreglo JSON
+    """
+    partes = [cabecera.rstrip()[:-1]]
+    separador = b',' if cabecera.strip() != b'{}' else b''
+    for nombre, arreglo in arreglos.items():
+        partes.append(separador + a_json(nombre) + b':' + arreglo)
+        separador = b','
+    partes.append(b'}')
+    return b''.join(partes)
+
+
+class ArregloJSON:
+    """
+    Arreglo JSON serializado que se recorre elemento por elemento.
+
+    Cada recorrido parsea los bytes de nuevo y entrega un elemento a la vez,
+    por lo que en memoria quedan los bytes (y su texto mientras se recorre)
+    pero nunca la lista completa de objetos Python. Se puede recorrer varias
+    veces.
+    """
+
+    def __init__(self, crudo: bytes):
+        self.crudo = crudo
+
+    def __iter__(self) -> Iterator[Any]:
+        texto = self.crudo.decode('utf-8')
+        decodificador = json.JSONDecoder()
+        posicion = texto.index('[') + 1
+        while True:
+            posicion = _RE_SEPARADORES.match(texto, posicion).end()
+            if posicion >= len(texto) or texto[posicion] == ']':
+                return
+            elemento, posicion = decodificador.raw_decode(texto, posicion)
+            yield elemento
@@ -0,0 +1,199 @@
+"""
+Cálculo de similitud por lotes con NumPy.
+
+Da exactamente el mismo resultado que agrupacion.calcular_similitud, pero
+para muchos pares a la vez:
+- cada nombre se normaliza y se separa en palabras una sola vez (perfil_nombre)
+- las palabras significativas se codifican como matriz dispersa (CSR)
+  nombre -> ids de palabra
+- las coincidencias exactas se cuentan cruzando códigos par*V + palabra
+- las coincidencias parciales (una palabra contiene a otra) usan una tabla
+  precalculada palabra -> palabras que la contienen o que contiene
+"""
+import numpy as np
+
+from app.services.agrupacion import perfil_nombre
+
+
+# Largo mínimo para las reglas de contención de calcular_similitud
+MIN_LARGO_CONTENCION = 6
+MIN_LARGO_PARCIAL = 4
+
+# Pares por bloque (acota la memoria de los arrays intermedios)
+TAMANO_BLOQUE_PARES = 200_000
+
+
+def _expandir(indptr: np.ndarray, indices: np.ndarray, filas: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Expande las filas CSR indicadas.
+
+    Returns:
+        Tupla (posición en `filas` de cada elemento, valor del elemento)
+    """
+    inicios = indptr[filas]
+    largos = indptr[filas + 1] - inicios
+    total = int(largos.sum())
+    if total == 0:
+        vacio = np.zeros(0, dtype=np.int64)
+        return vacio, vacio
+    posicion = np.repeat(np.arange(len(filas), dtype=np.int64), largos)
+    desplazamiento = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(largos) - largos, largos)
+    return posicion, indices[np.repeat(inicios, largos) + desplazamiento]
+
+
+def _pertenece(codigos: np.ndarray, ordenados: np.ndarray) -> np.ndarray:
+    """Máscara de los códigos presentes en `ordenados` (array ordenado)."""
+    if len(ordenados) == 0:
+        return np.zeros(len(codigos), dtype=bool)
+    pos = np.searchsorted(ordenados, codigos)
+    pos[pos == len(ordenados)] = 0
+    return ordenados[pos] == codigos
+
+
+class PerfilesLote:
+    """
+    Perfiles precalculados de una lista de nombres, para puntuar pares
+    (i, j) de posiciones de esa lista.
+    """
+
+    def __init__(self, nombres: list[str]):
+        cantidad = len(nombres)
+        self.vacio = np.array([not n for n in nombres], dtype=bool)
+
+        perfiles = [perfil_nombre(n) if n else None for n in nombres]
+        normalizados = [p.normalizado if p else '' for p in perfiles]
+        codigos_norm: dict[str, int] = {}
+        self.id_normalizado = np.array(
+            [codigos_norm.setdefault(n, len(codigos_norm)) for n in normalizados],
+            dtype=np.int64
+        )
+        self.largo = np.array([len(n) for n in normalizados], dtype=np.int64)
+        self.textos = np.array(normalizados, dtype=str)
+
+        vocabulario: dict[str, int] = {}
+        self.n_significativas = np.zeros(cantidad, dtype=np.int64)
+        self.n_distintas = np.zeros(cantidad, dtype=np.int64)
+        self.tiene_generica = np.zeros(cantidad, dtype=bool)
+        indptr = [0]
+        indices: list[int] = []
+
+        for k, perfil in enumerate(perfiles):
+            if perfil is not None:
+                distintas = sorted(
+                    vocabulario.setdefault(p, len(vocabulario)) for p in perfil.significativas
+                )
+                self.n_significativas[k] = perfil.n_significativas
+                self.n_distintas[k] = len(distintas)
+                self.tiene_generica[k] = perfil.tiene_generica
+                indices.extend(distintas)
+            indptr.append(len(indices))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.tamano_vocabulario = max(len(vocabulario), 1)
+
+        # Relación de contención entre palabras distintas de 4+ letras.
+        # Si dos palabras distintas se contienen, una es subcadena propia de
+        # la otra: alcanza con buscar las subcadenas de cada palabra.
+        relacionadas: list[set[int]] = [set() for _ in range(len(vocabulario))]
+        for palabra, id_palabra in vocabulario.items():
+            largo = len(palabra)
+            for tamano in range(MIN_LARGO_PARCIAL, largo):
+                for inicio in range(largo - tamano + 1):
+                    id_sub = vocabulario.get(palabra[inicio:inicio + tamano])
+                    if id_sub is not None:
+                        relacionadas[id_palabra].add(id_sub)
+                        relacionadas[id_sub].add(id_palabra)
+
+        adj_indptr = [0]
+        adj_indices: list[int] = []
+        for ids in relacionadas:
+            adj_indices.extend(sorted(ids))
+            adj_indptr.append(len(adj_indices))
+        self.adj_indptr = np.array(adj_indptr, dtype=np.int64)
+        self.adj_indices = np.array(adj_indices, dtype=np.int64)
+
+    def puntuar_pares(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        """Similitud de cada par (nombres[i], nombres[j])."""
+        i = np.asarray(i, dtype=np.int64)
+        j = np.asarray(j, dtype=np.int64)
+        resultado = np.zeros(len(i), dtype=np.float64)
+        for inicio in range(0, len(i), TAMANO_BLOQUE_PARES):
+            fin = inicio + TAMANO_BLOQUE_PARES
+            resultado[inicio:fin] = self._puntuar_bloque(i[inicio:fin], j[inicio:fin])
+        return resultado
+
+    def puntuar_consulta(self, k: int, candidatos: np.ndarray) -> np.ndarray:
+        """Similitud del nombre k contra cada uno de los candidatos."""
+        candidatos = np.asarray(candidatos, dtype=np.int64)
+        return self.puntuar_pares(np.full(len(candidatos), k, dtype=np.int64), candidatos)
+
+    def _puntuar_bloque(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        resultado = np.zeros(len(i), dtype=np.float64)
+
+        vacio = self.vacio[i] | self.vacio[j]
+        igual = ~vacio & (self.id_normalizado[i] == self.id_normalizado[j])
+        resultado[igual] = 1.0
+        pendiente = ~vacio & ~igual
+
+        # Uno contiene al otro (y es significativo)
+        largo_i, largo_j = self.largo[i], self.largo[j]
+        revisar = pendiente & (
+            (largo_i >= MIN_LARGO_CONTENCION) | (largo_j >= MIN_LARGO_CONTENCION)
+        )
+        if revisar.any():
+            a = self.textos[i[revisar]]
+            b = self.textos[j[revisar]]
+            contiene = (
+                ((largo_j[revisar] >= MIN_LARGO_CONTENCION) & (np.char.find(a, b) >= 0))
+                | ((largo_i[revisar] >= MIN_LARGO_CONTENCION) & (np.char.find(b, a) >= 0))
+            )
+            con_contencion = np.flatnonzero(revisar)[contiene]
+            resultado[con_contencion] = 0.9
+            pendiente[con_contencion] = False
+
+        pendiente &= (self.n_significativas[i] > 0) & (self.n_significativas[j] > 0)
+        q = np.flatnonzero(pendiente)
+        if len(q) == 0:
+            return resultado
+        qi, qj = i[q], j[q]
+        v = self.tamano_vocabulario
+
+        # Palabras de cada lado, codificadas como par * V + palabra (ordenadas)
+        par_izq, palabra_izq = _expandir(self.indptr, self.indices, qi)
+        par_der, palabra_der = _expandir(self.indptr, self.indices, qj)
+        codigos_der = par_der * v + palabra_der
+
+        # Coincidencias exactas
+        exactas = _pertenece(par_izq * v + palabra_izq, codigos_der)
+        coincidencias = np.bincount(par_izq[exactas], minlength=len(q)).astype(np.float64)
+
+        # Coincidencias parciales: palabras de la izquierda con alguna palabra
+        # relacionada (contiene o está contenida) del otro lado
+        elemento, relacionada = _expandir(self.adj_indptr, self.adj_indices, palabra_izq)
+        if len(elemento):
+            hay = _pertenece(par_izq[elemento] * v + relacionada, codigos_der)
+            con_parcial = np.zeros(len(par_izq), dtype=bool)
+            con_parcial[elemento[hay]] = True
+            coincidencias += 0.5 * np.bincount(par_izq[con_parcial], minlength=len(q))
+
+        # Mínimo requerido
+        sig_i, sig_j = self.n_significativas[qi], self.n_significativas[qj]
+        minimo = np.where(
+            (sig_i == 1) & (sig_j == 1), 1.0,
+            np.where(self.tiene_generica[qi] | self.tiene_generica[qj], 2.0, 1.5)
+        )
+
+        total = np.maximum(self.n_distintas[qi], self.n_distintas[qj])
+        ratio = np.minimum(coincidencias / total, 1.0)
+        resultado[q] = np.where(coincidencias >= minimo, ratio, 0.0)
+        return resultado
+
+
+def similitud_pares(nombres_a: list[str], nombres_b: list[str]) -> np.ndarray:
+    """Similitud de cada par (nombres_a[k], nombres_b[k])."""
+    posiciones: dict[str, int] = {}
+    i = [posiciones.setdefault(n, len(posiciones)) for n in nombres_a]
+    j = [posiciones.setdefault(n, len(posiciones)) for n in nombres_b]
+    perfiles = PerfilesLote(list(posiciones))
+    return perfiles.puntuar_pares(np.array(i, dtype=np.int64), np.array(j, dtype=np.int64))
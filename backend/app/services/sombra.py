@@ -0,0 +1,190 @@
+"""
+Modo sombra de /agrupar (SOMBRA_FRACCION > 0).
+
+Una fracción de los requests a /agrupar se vuelve a agrupar con el motor
+candidato (SOMBRA_MOTOR, ver MOTORES_CANDIDATOS) después de enviar la
+respuesta: el auditor recibe siempre el resultado del motor pedido. Las
+divergencias y la diferencia de tiempos se registran en el log y quedan
+resumidas en memoria del worker (GET /agrupar/sombra).
+
+Los motores eligen la razón social canónica de un grupo de distinta forma,
+así que un grupo con los mismos registros y otro nombre se cuenta aparte
+(diferencias_nombre) y no como divergencia: las divergencias son solo
+diferencias de pertenencia (registros agrupados distinto) o de totales.
+
+Se ejecuta como máximo una sombra a la vez por worker; si hay una en curso,
+el request no se muestrea. La reagrupación reserva memoria en el control de
+admisión sin esperar en cola: si el presupuesto está ocupado se omite.
+Una reserva que nunca llegó a ejecutarse (cliente desconectado antes de la
+tarea de fondo) vence a los RESERVA_MAX_SEGUNDOS.
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from app.services.admision import admitir
+from app.services.equivalencia import MOTORES_CANDIDATOS, comparar_firmas, firma_agrupacion
+from app.services.procesamiento import agrupar_por_razon_social
+
+
+# Últimas divergencias detalladas por worker
+MAX_DIVERGENCIAS_GUARDADAS = 20
+
+RESERVA_MAX_SEGUNDOS = 600
+
+_ETIQUETAS_RESULTADO = {
+    'coincidencias': 'iguales',
+    'diferencias_nombre': 'otro nombre',
+    'divergencias': 'DIVERGENCIA',
+}
+
+_lock_estado = threading.Lock()
+# Momento de la reserva de la sombra en curso
+_reserva: float | None = None
+_estado: dict[str, Any] = {
+    'ejecuciones': 0,
+    'coincidencias': 0,
+    'diferencias_nombre': 0,
+    'divergencias': 0,
+    'omitidas_memoria': 0,
+    'errores': 0,
+    'segundos_referencia': 0.0,
+    'segundos_candidata': 0.0,
+}
+_ultimas_divergencias: deque = deque(maxlen=MAX_DIVERGENCIAS_GUARDADAS)
+
+
+def reservar_sombra(fraccion: float) -> bool:
+    """
+    Decide si el request actual se muestrea. Si devuelve True el llamador
+    debe ejecutar ejecutar_sombra (que libera la reserva).
+    """
+    global _reserva
+    if fraccion <= 0 or random.random() >= fraccion:
+        return False
+    with _lock_estado:
+        ahora = time.monotonic()
+        if _reserva is not None and ahora - _reserva < RESERVA_MAX_SEGUNDOS:
+            return False
+        _reserva = ahora
+        return True
+
+
+def _liberar_reserva():
+    global _reserva
+    with _lock_estado:
+        _reserva = None
+
+
+def _misma_pertenencia(comparacion: dict[str, Any]) -> bool:
+    """Mismos grupos de registros y totales (la razón canónica puede variar)"""
+    conteo = comparacion['conteo']
+    return (
+        conteo['solo_referencia'] == 0 and conteo['solo_candidata'] == 0
+        and conteo['cambio_asignacion'] == 0 and comparacion['totales'] is None
+    )
+
+
+def ejecutar_sombra(
+    registros: list[dict],
+    parametros: dict[str, Any],
+    resultado_referencia: dict[str, Any],
+    segundos_referencia: float,
+    motor_candidato: str
+):
+    """
+    Agrupa con el motor candidato y compara con el resultado ya enviado.
+
+    Args:
+        registros: Registros del request
+        parametros: Parámetros con que se agrupó (umbral_similitud, alias,
+            candidatos_max, motor, enlace)
+        resultado_referencia: Resultado enviado al cliente
+        segundos_referencia: Duración de la agrupación enviada
+        motor_candidato: Nombre en MOTORES_CANDIDATOS
+    """
+    try:
+        if motor_candidato not in MOTORES_CANDIDATOS:
+            raise ValueError(f"motor inválido. Opciones: {', '.join(MOTORES_CANDIDATOS)}")
+        candidatos = {**parametros, **MOTORES_CANDIDATOS[motor_candidato]}
+        inicio = time.perf_counter()
+        resultado = agrupar_por_razon_social(registros, **candidatos)
+        segundos_candidata = time.perf_counter() - inicio
+
+        comparacion = comparar_firmas(
+            firma_agrupacion(resultado_referencia), firma_agrupacion(resultado)
+        )
+        if comparacion['iguales']:
+            resultado_sombra = 'coincidencias'
+        elif _misma_pertenencia(comparacion):
+            resultado_sombra = 'diferencias_nombre'
+        else:
+            resultado_sombra = 'divergencias'
+
+        with _lock_estado:
+            _estado['ejecuciones'] += 1
+            _estado[resultado_sombra] += 1
+            _estado['segundos_referencia'] += segundos_referencia
+            _estado['segundos_candidata'] += segundos_candidata
+            if resultado_sombra == 'divergencias':
+                _ultimas_divergencias.append({
+                    'momento': time.time(),
+                    'registros': len(registros),
+                    'parametros': {k: v for k, v in parametros.items() if k != 'alias'},
+                    'motor_candidato': motor_candidato,
+                    **comparacion,
+                })
+
+        print(
+            f"Sombra {motor_candidato}: {len(registros)} registros, "
+            f"{_ETIQUETAS_RESULTADO[resultado_sombra]} "
+            f"{comparacion['conteo']}, referencia {segundos_referencia:.3f}s, "
+            f"candidata {segundos_candidata:.3f}s"
+        )
+    except Exception as e:
+        with _lock_estado:
+            _estado['errores'] += 1
+        print(f"Sombra {motor_candidato}: falló la agrupación candidata: {e}")
+    finally:
+        _liberar_reserva()
+
+
+async def ejecutar_sombra_admitida(
+    registros: list[dict],
+    parametros: dict[str, Any],
+    resultado_referencia: dict[str, Any],
+    segundos_referencia: float,
+    motor_candidato: str
+):
+    """
+    ejecutar_sombra dentro del presupuesto de memoria de admisión. Sin lugar
+    inmediato la sombra se omite: no compite en la cola con los requests.
+    """
+    try:
+        async with admitir("agrupar_sombra", 0, len(registros), espera=0):
+            await run_in_threadpool(
+                ejecutar_sombra, registros, parametros,
+                resultado_referencia, segundos_referencia, motor_candidato
+            )
+    except HTTPException:
+        with _lock_estado:
+            _estado['omitidas_memoria'] += 1
+        _liberar_reserva()
+        print(f"Sombra {motor_candidato}: omitida, presupuesto de memoria ocupado")
+
+
+def estado_sombra() -> dict[str, Any]:
+    """Resumen de las ejecuciones en sombra de este worker"""
+    with _lock_estado:
+        estado = dict(_estado)
+        ejecuciones = estado['ejecuciones']
+        estado['delta_segundos_promedio'] = round(
+            (estado['segundos_candidata'] - estado['segundos_referencia']) / ejecuciones, 4
+        ) if ejecuciones else None
+        estado['ultimas_divergencias'] = list(_ultimas_divergencias)
+    return estado
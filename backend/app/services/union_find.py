@@ -0,0 +1,200 @@
+"""
+Motor de agrupación por union-find sobre pares candidatos.
+
+A diferencia del recorrido voraz de agrupar_claves (cada clave se une a la
+primera clave anterior que supere el umbral), este motor:
+1. genera pares candidatos entre claves distintas que comparten alguna palabra
+2. puntúa los pares por lotes (similitud_lote), en paralelo si son muchos
+3. une los pares que superan el umbral con union-find, opcionalmente con
+   enlace completo (dos grupos se unen solo si todos sus pares superan el
+   umbral), lo que evita cadenas A~B~C con A y C distintos
+
+El resultado no depende del orden de los registros.
+"""
+import math
+
+import numpy as np
+
+from app.services.agrupacion import calcular_similitud
+from app.services.emparejamiento import IndiceTokens
+from app.services.paralelo import cantidad_procesos, obtener_pool
+from app.services.similitud_lote import PerfilesLote, similitud_pares
+
+
+ENLACE_SIMPLE = 'simple'
+ENLACE_COMPLETO = 'completo'
+ENLACES = (ENLACE_SIMPLE, ENLACE_COMPLETO)
+
+# Por debajo de esta cantidad de pares no conviene pagar el envío al pool
+MIN_PARES_PARALELO = 500_000
+
+
+class UnionFind:
+    """Conjuntos disjuntos con compresión de caminos y unión por tamaño."""
+
+    def __init__(self, n: int):
+        self.padre = list(range(n))
+        self.tamano = [1] * n
+
+    def raiz(self, x: int) -> int:
+        padre = self.padre
+        while padre[x] != x:
+            padre[x] = padre[padre[x]]
+            x = padre[x]
+        return x
+
+    def unir(self, a: int, b: int) -> int:
+        ra, rb = self.raiz(a), self.raiz(b)
+        if ra == rb:
+            return ra
+        if self.tamano[ra] < self.tamano[rb]:
+            ra, rb = rb, ra
+        self.padre[rb] = ra
+        self.tamano[ra] += self.tamano[rb]
+        return ra
+
+
+def pares_candidatos(claves: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Pares (i, j), i < j, de claves que comparten al menos una palabra
+    selectiva (mismo bloqueo que el emparejamiento de saldos).
+
+    Returns:
+        Tupla de arrays (i, j) ordenados
+    """
+    indice = IndiceTokens(claves)
+    pares_i: list[int] = []
+    pares_j: list[int] = []
+    for i, clave in enumerate(claves):
+        vecinos = sorted(j for j in indice.candidatos(clave) if j > i)
+        pares_i.extend([i] * len(vecinos))
+        pares_j.extend(vecinos)
+    return np.array(pares_i, dtype=np.int64), np.array(pares_j, dtype=np.int64)
+
+
+def _puntuar_bloque(pares: tuple[list[str], list[str]]) -> np.ndarray:
+    """Similitud de un bloque de pares. Función de módulo para el pool."""
+    return similitud_pares(*pares)
+
+
+def puntuar_pares(claves: list[str], i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """
+    Similitud de cada par (claves[i], claves[j]).
+    Con muchos pares se reparten en bloques entre los procesos del pool.
+    """
+    if len(i) < MIN_PARES_PARALELO or cantidad_procesos() < 2:
+        return PerfilesLote(claves).puntuar_pares(i, j)
+
+    tamano = math.ceil(len(i) / (cantidad_procesos() * 4))
+    bloques = [
+        ([claves[a] for a in i[k:k + tamano].tolist()],
+         [claves[b] for b in j[k:k + tamano].tolist()])
+        for k in range(0, len(i), tamano)
+    ]
+    return np.concatenate(list(obtener_pool().map(_puntuar_bloque, bloques)))
+
+
+def agrupar_claves_union_find(
+    claves: list[str],
+    razones: list[str],
+    umbral_similitud: float = 0.75,
+    alias: dict[str, str] | None = None,
+    pesos: list[int] | None = None,
+    enlace: str = ENLACE_SIMPLE
+) -> dict[str, str]:
+    """
+    Asigna una razón social canónica a cada clave distinta con union-find.
+
+    Args:
+        claves: Claves distintas (el orden no influye en el resultado)
+        razones: Razón social representativa de cada clave
+        umbral_similitud: Similitud mínima para unir dos claves
+        alias: Alias aprendidos del cliente (clave -> razón canónica); las
+            claves con el mismo alias quedan en el mismo grupo
+        pesos: Cantidad de registros de cada clave, para elegir la razón
+            canónica de cada grupo
+        enlace: 'simple' o 'completo'
+
+    Returns:
+        Dict clave -> razón social canónica
+    """
+    if enlace not in ENLACES:
+        raise ValueError(f"Enlace inválido: {enlace}. Opciones: {', '.join(ENLACES)}")
+
+    alias = alias or {}
+    # Orden canónico: el resultado no depende del orden de entrada
+    orden = sorted(range(len(claves)), key=lambda k: claves[k])
+    claves_ord = [claves[k] for k in orden]
+    razones_ord = [razones[k] for k in orden]
+    pesos_ord = [pesos[k] for k in orden] if pesos is not None else [1] * len(orden)
+
+    conjuntos = UnionFind(len(claves_ord))
+
+    # Claves con el mismo alias van juntas sin comparar
+    por_alias: dict[str, int] = {}
+    for k, clave in enumerate(claves_ord):
+        if clave in alias:
+            primera = por_alias.setdefault(alias[clave], k)
+            conjuntos.unir(primera, k)
+
+    i, j = pares_candidatos(claves_ord)
+    puntajes = puntuar_pares(claves_ord, i, j)
+
+    validos = puntajes >= umbral_similitud
+    i, j, puntajes = i[validos], j[validos], puntajes[validos]
+    # Pares más parecidos primero; desempate por posición para ser determinista
+    secuencia = np.lexsort((j, i, -puntajes))
+
+    if enlace == ENLACE_SIMPLE:
+        for k in secuencia.tolist():
+            conjuntos.unir(int(i[k]), int(j[k]))
+    else:
+        conocidos = {
+            (int(a), int(b)): float(p) for a, b, p in zip(i, j, puntajes)
+        }
+        miembros: dict[int, list[int]] = {k: [k] for k in range(len(claves_ord))}
+        for k in range(len(claves_ord)):
+            raiz = conjuntos.raiz(k)
+            if raiz != k:
+                miembros[raiz].append(k)
+                del miembros[k]
+
+        def similitud(a: int, b: int) -> float:
+            par = (a, b) if a < b else (b, a)
+            if par not in conocidos:
+                conocidos[par] = calcular_similitud(claves_ord[par[0]], claves_ord[par[1]])
+            return conocidos[par]
+
+        for k in secuencia.tolist():
+            ra, rb = conjuntos.raiz(int(i[k])), conjuntos.raiz(int(j[k]))
+            if ra == rb:
+                continue
+            if all(
+                similitud(a, b) >= umbral_similitud
+                for a in miembros[ra] for b in miembros[rb]
+            ):
+                raiz = conjuntos.unir(ra, rb)
+                otra = rb if raiz == ra else ra
+                miembros[raiz].extend(miembros.pop(otra))
+
+    # Razón canónica de cada grupo: la de un miembro con alias si lo hay,
+    # si no la de la clave con más registros (desempate alfabético)
+    def prioridad(k: int) -> tuple:
+        return (claves_ord[k] not in alias, -pesos_ord[k], razones_ord[k])
+
+    representante: dict[int, int] = {}
+    for k in range(len(claves_ord)):
+        raiz = conjuntos.raiz(k)
+        actual = representante.get(raiz)
+        if actual is None or prioridad(k) < prioridad(actual):
+            representante[raiz] = k
+
+    canonica_por_raiz = {
+        raiz: alias.get(claves_ord[k], razones_ord[k])
+        for raiz, k in representante.items()
+    }
+
+    return {
+        clave: canonica_por_raiz[conjuntos.raiz(k)]
+        for k, clave in enumerate(claves_ord)
+    }
@@ -0,0 +1,87 @@
+"""
+Benchmark del arranque en frío: tiempo de importación de la app y latencia
+del primer request, cada medición en un proceso nuevo (como un worker recién
+levantado por el escalado a cero).
+
+Mide /health, el listado de conciliaciones y un primer /agrupar, sin y con
+precarga (PRECARGA=true, esperando a que termine antes del request).
+
+Uso (desde backend/):
+    python -m benchmarks.arranque --repeticiones 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+# Se ejecuta en un proceso nuevo por medición
+_MEDICION = r'''
+import json, sys, time
+inicio = time.perf_counter()
+import app.main
+importacion = time.perf_counter() - inicio
+cargados = [m for m in ("pandas", "numpy", "openpyxl", "supabase") if m in sys.modules]
+
+from fastapi.testclient import TestClient
+
+ruta, metodo, cuerpo = sys.argv[1], sys.argv[2], json.loads(sys.argv[3])
+with TestClient(app.main.app) as cliente:
+    precarga = app.main.app.state.precarga
+    while precarga is not None and not precarga.done():
+        time.sleep(0.01)
+    inicio = time.perf_counter()
+    respuesta = cliente.request(metodo, ruta, json=cuerpo)
+    primer_request = time.perf_counter() - inicio
+
+print(json.dumps({
+    "importacion": importacion,
+    "primer_request": primer_request,
+    "estado": respuesta.status_code,
+    "modulos_al_importar": cargados,
+}))
+'''
+
+REGISTROS = [
+    {"id": f"r{k}", "fecha": "2024-01-01", "descripcion": f"Cobro - {nombre}",
+     "debe": 100.0, "haber": 0.0}
+    for k, nombre in enumerate(["Juan Pérez S.R.L.", "PEREZ JUAN", "ACME S.A.", "SQUILLACE, ROQUE"] * 25)
+]
+
+CASOS = [
+    ("health", "/health", "GET", None),
+    ("listado", "/api/auditoria/conciliaciones", "GET", None),
+    ("agrupar", "/api/auditoria/agrupar", "POST", REGISTROS),
+]
+
+
+def medir(ruta: str, metodo: str, cuerpo, precarga: bool) -> dict:
+    entorno = {**os.environ, "PRECARGA": "true" if precarga else "false"}
+    salida = subprocess.run(
+        [sys.executable, "-c", _MEDICION, ruta, metodo, json.dumps(cuerpo)],
+        capture_output=True, text=True, env=entorno, check=True
+    ).stdout
+    return json.loads(salida.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'caso':<10} {'precarga':>8} {'import':>8} {'1er req':>8} {'estado':>6}  módulos al importar")
+    for nombre, ruta, metodo, cuerpo in CASOS:
+        for precarga in (False, True):
+            mediciones = [medir(ruta, metodo, cuerpo, precarga) for _ in range(args.repeticiones)]
+            importacion = statistics.median(m['importacion'] for m in mediciones)
+            primer = statistics.median(m['primer_request'] for m in mediciones)
+            print(
+                f"{nombre:<10} {'sí' if precarga else 'no':>8} {importacion:>7.3f}s {primer:>7.3f}s "
+                f"{mediciones[-1]['estado']:>6}  {', '.join(mediciones[-1]['modulos_al_importar']) or '-'}"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Benchmark de la búsqueda aproximada de candidatos (n-gramas + top-k) contra
+la búsqueda exhaustiva de agrupar_claves.
+
+Genera un corpus sintético de razones sociales con variantes típicas de un
+mayor (sufijos societarios, orden de palabras, errores de tipeo, nombres
+abreviados) y mide recall y tiempos para distintos valores de k y n.
+
+Uso (desde backend/):
+    python -m benchmarks.candidatos_ngramas --claves 5000 --k 10 25 50 100
+"""
+import argparse
+import random
+
+from app.services.agrupacion import generar_clave_agrupacion
+from app.services.candidatos import medir_recall
+
+
+NOMBRES = ['JUAN', 'MARIA', 'JOSE', 'ANA', 'CARLOS', 'LAURA', 'JORGE', 'SILVIA', 'ROQUE', 'MARTA']
+APELLIDOS = ['GONZALEZ', 'RODRIGUEZ', 'GOMEZ', 'FERNANDEZ', 'LOPEZ', 'DIAZ', 'MARTINEZ',
+             'PEREZ', 'GARCIA', 'SANCHEZ', 'ROMERO', 'SOSA', 'ALVAREZ', 'TORRES', 'RUIZ']
+RUBROS = ['DISTRIBUIDORA', 'TRANSPORTES', 'CONSTRUCTORA', 'AGROPECUARIA', 'METALURGICA',
+          'LOGISTICA', 'FARMACIA', 'FERRETERIA', 'ESTUDIO', 'SERVICIOS']
+SUFIJOS = ['SA', 'S.A.', 'SRL', 'S.R.L.', 'SAS', 'Y CIA', '']
+
+
+def _palabra_aleatoria(rng: random.Random) -> str:
+    return ''.join(rng.choice('ABCDEFGILMNOPRSTUVZ') for _ in range(rng.randint(5, 9)))
+
+
+def _con_error(texto: str, rng: random.Random) -> str:
+    """Introduce un error de tipeo (omisión o cambio de una letra)."""
+    if len(texto) < 6:
+        return texto
+    i = rng.randrange(1, len(texto) - 1)
+    if rng.random() < 0.5:
+        return texto[:i] + texto[i + 1:]
+    return texto[:i] + rng.choice('AEIOURS') + texto[i + 1:]
+
+
+def generar_corpus(cantidad: int, semilla: int = 7) -> list[str]:
+    """Hasta `cantidad` claves distintas en orden aleatorio, con ~30% de variantes."""
+    rng = random.Random(semilla)
+    nombres: list[str] = []
+    while len(nombres) < cantidad:
+        if rng.random() < 0.5:
+            base = f'{rng.choice(APELLIDOS)} {_palabra_aleatoria(rng)} {rng.choice(NOMBRES)}'
+        else:
+            base = f'{rng.choice(RUBROS)} {_palabra_aleatoria(rng)} {rng.choice(SUFIJOS)}'
+        nombres.append(base)
+
+        # Variantes del mismo titular
+        for _ in range(rng.choice([0, 0, 1, 2])):
+            variante = base.split()
+            if rng.random() < 0.3:
+                variante.reverse()
+            elif rng.random() < 0.6:
+                variante = _con_error(' '.join(variante), rng).split()
+            else:
+                variante = variante[:2]
+            nombres.append(' '.join(variante) + ' ' + rng.choice(SUFIJOS))
+
+    claves = [generar_clave_agrupacion(n) for n in nombres]
+    claves = [c for c in dict.fromkeys(claves) if c and c != 'Sin Asignar']
+    rng.shuffle(claves)
+    return claves[:cantidad]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--claves', type=int, default=5000)
+    parser.add_argument('--umbral', type=float, default=0.75)
+    parser.add_argument('--k', type=int, nargs='+', default=[10, 25, 50, 100])
+    parser.add_argument('--n', type=int, nargs='+', default=[3])
+    args = parser.parse_args()
+
+    claves = generar_corpus(args.claves)
+    print(f'{len(claves)} claves distintas, umbral {args.umbral}')
+    print(f"{'n':>3} {'k':>5} {'recall':>8} {'unidas':>8} {'exhaust.':>9} {'aprox.':>8} {'x':>6}")
+    for r in medir_recall(claves, args.umbral, args.k, args.n):
+        print(
+            f"{r['n']:>3} {r['k']:>5} {r['recall']:>8.4f} {r['recall_unidas']:>8.4f} "
+            f"{r['tiempo_exhaustivo']:>8.2f}s {r['tiempo_aproximado']:>7.2f}s {r['aceleracion']:>6}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,338 @@
+"""
+Arnés de equivalencia de la agrupación contra el corpus dorado.
+
+El corpus (benchmarks/corpus/) tiene leyendas, pares de nombres y mayores
+sintéticos con las salidas esperadas de extraer_razon_social,
+generar_clave_agrupacion, calcular_similitud y agrupar_por_razon_social.
+Cualquier optimización de esas funciones tiene que pasar sin divergencias:
+
+    python -m benchmarks.equivalencia                      # código actual vs corpus
+    python -m benchmarks.equivalencia --referencia HEAD~3  # código actual vs otra versión
+    python -m benchmarks.equivalencia --motor union_find   # motor voraz vs candidato
+    python -m benchmarks.equivalencia --actualizar         # regrabar salidas esperadas
+
+Las salidas se calculan en un proceso aparte con el `app` de cada versión en
+el path (la referencia se extrae con git archive), así ambas implementaciones
+corren lado a lado sin mezclar módulos. Además se compara la similitud por
+lotes (PerfilesLote) contra calcular_similitud sobre los pares del corpus.
+Termina con código 1 si hay divergencias.
+
+Uso (desde backend/).
+"""
+import argparse
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tarfile
+import tempfile
+from pathlib import Path
+
+from app.services.equivalencia import (
+    MOTORES_CANDIDATOS, TOLERANCIA_SIMILITUD, comparar_firmas, comparar_funcion, firma_agrupacion
+)
+
+
+DIRECTORIO_CORPUS = Path(__file__).parent / 'corpus'
+UMBRALES = ('0.6', '0.75', '0.9')
+
+# Se ejecuta en un proceso aparte con el `app` de la versión a evaluar en el path.
+# Solo usa la interfaz estable de agrupacion y procesamiento.
+_SALIDAS = r'''
+import json, sys
+from app.services.agrupacion import calcular_similitud, extraer_razon_social, generar_clave_agrupacion
+from app.services.procesamiento import agrupar_por_razon_social
+
+entrada = json.load(sys.stdin)
+
+def firma(resultado):
+    grupos = sorted(
+        [a["razonSocial"], sorted(str(r.get("id")) for r in a.get("registros") or [])]
+        for a in resultado.get("agrupaciones") or []
+    )
+    return {
+        "grupos": grupos,
+        "sin_asignar": sorted(str(r.get("id")) for r in resultado.get("sin_asignar") or []),
+        "totales": resultado.get("totales"),
+    }
+
+salida = {
+    "leyendas": [
+        [extraer_razon_social(l), generar_clave_agrupacion(extraer_razon_social(l))]
+        for l in entrada["leyendas"]
+    ],
+    "similitud": [calcular_similitud(a, b) for a, b in entrada["pares"]],
+    "mayores": {
+        nombre: {u: firma(agrupar_por_razon_social(registros, float(u))) for u in entrada["umbrales"]}
+        for nombre, registros in entrada["mayores"].items()
+    },
+}
+print(json.dumps(salida, ensure_ascii=False))
+'''
+
+
+# Generación del corpus (solo con --generar; el corpus versionado es la referencia)
+
+NOMBRES = ['JUAN', 'MARIA', 'JOSE', 'ANA', 'CARLOS', 'LAURA', 'JORGE', 'SILVIA', 'ROQUE', 'MARTA']
+APELLIDOS = ['GONZALEZ', 'RODRIGUEZ', 'GÓMEZ', 'FERNANDEZ', 'LOPEZ', 'DIAZ', 'MARTÍNEZ',
+             'PEREZ', 'GARCIA', 'SANCHEZ', 'ROMERO', 'SOSA', 'SQUILLACE', 'SARRIES', 'RUIZ']
+RUBROS = ['DISTRIBUIDORA', 'TRANSPORTES', 'CONSTRUCTORA', 'AGROPECUARIA', 'METALURGICA',
+          'LOGISTICA', 'FARMACIA', 'FERRETERIA', 'REPUESTOS', 'SERVICIOS']
+SUFIJOS = ['SA', 'S.A.', 'SRL', 'S.R.L.', 'SAS', 'Y CIA', 'HNOS', '']
+PLANTILLAS = [
+    'Venta según comprobante - A-0001-000{n5} - {nombre}',
+    '{nombre} () Recibo Nº0003-0000{n4}',
+    'VENTA CONTADO Factura A0001-000{n5} ({nombre}, )',
+    'Cobro - {nombre}',
+    'Pago - {nombre}',
+    'ORDEN DE PAGO {n4} {nombre}',
+    'Nota de Crédito B 0002-{n5} {nombre}',
+    '{nombre} CUIT 30-{n5}123-9',
+    'TRANSF {nombre}',
+    '{nombre_minusculas}',
+    'Asiento de ajuste',
+    'Diferencia de cambio',
+    '',
+]
+
+
+def _nombre(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        partes = [rng.choice(APELLIDOS), rng.choice(NOMBRES)]
+        if rng.random() < 0.3:
+            partes.reverse()
+        separador = ', ' if rng.random() < 0.2 else ' '
+        return separador.join(partes) + (' ' + rng.choice(SUFIJOS) if rng.random() < 0.3 else '')
+    return f'{rng.choice(RUBROS)} {rng.choice(APELLIDOS)} {rng.choice(SUFIJOS)}'.strip()
+
+
+def _leyenda(rng: random.Random, nombre: str) -> str:
+    return rng.choice(PLANTILLAS).format(
+        nombre=nombre, nombre_minusculas=nombre.lower().title(),
+        n4=rng.randint(1000, 9999), n5=f'{rng.randint(1, 99999):05d}'
+    )
+
+
+def generar_entradas(semilla: int = 7) -> dict:
+    rng = random.Random(semilla)
+    nombres = [_nombre(rng) for _ in range(120)]
+    leyendas = list(dict.fromkeys(_leyenda(rng, rng.choice(nombres)) for _ in range(500)))
+    pares = [[rng.choice(nombres), rng.choice(nombres)] for _ in range(400)]
+
+    mayores = {}
+    for nombre, cantidad, titulares in (('chico', 60, 8), ('mediano', 600, 40), ('grande', 2500, 120)):
+        elegidos = nombres[:titulares]
+        mayores[nombre] = [
+            {
+                'id': f'{nombre[0]}{k}',
+                'fecha': f'2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+                'descripcion': _leyenda(rng, rng.choice(elegidos)),
+                'debe': round(rng.random() * 1000, 2) if rng.random() < 0.5 else 0.0,
+                'haber': round(rng.random() * 1000, 2) if rng.random() < 0.5 else 0.0,
+            }
+            for k in range(cantidad)
+        ]
+    return {'leyendas': leyendas, 'pares': pares, 'mayores': mayores}
+
+
+# Corpus en disco
+
+def leer_corpus() -> tuple[dict, dict]:
+    """Entradas y salidas esperadas del corpus dorado"""
+    entradas = {
+        'leyendas': [c['leyenda'] for c in _leer('leyendas.json')],
+        'pares': [[c['a'], c['b']] for c in _leer('similitud.json')],
+        'mayores': {},
+    }
+    esperadas = {
+        'leyendas': [[c['razon_social'], c['clave']] for c in _leer('leyendas.json')],
+        'similitud': [c['similitud'] for c in _leer('similitud.json')],
+        'mayores': {},
+    }
+    for archivo in sorted((DIRECTORIO_CORPUS / 'mayores').glob('*.json')):
+        mayor = json.loads(archivo.read_text(encoding='utf-8'))
+        entradas['mayores'][archivo.stem] = mayor['registros']
+        esperadas['mayores'][archivo.stem] = mayor['esperado']
+    return entradas, esperadas
+
+
+def escribir_corpus(entradas: dict, salidas: dict):
+    (DIRECTORIO_CORPUS / 'mayores').mkdir(parents=True, exist_ok=True)
+    _escribir('leyendas.json', [
+        {'leyenda': l, 'razon_social': r, 'clave': c}
+        for l, (r, c) in zip(entradas['leyendas'], salidas['leyendas'])
+    ])
+    _escribir('similitud.json', [
+        {'a': a, 'b': b, 'similitud': s}
+        for (a, b), s in zip(entradas['pares'], salidas['similitud'])
+    ])
+    for nombre, registros in entradas['mayores'].items():
+        _escribir(f'mayores/{nombre}.json', {
+            'registros': registros, 'esperado': salidas['mayores'][nombre]
+        })
+
+
+def _leer(nombre: str):
+    return json.loads((DIRECTORIO_CORPUS / nombre).read_text(encoding='utf-8'))
+
+
+def _escribir(nombre: str, datos):
+    texto = json.dumps(datos, ensure_ascii=False, indent=1)
+    (DIRECTORIO_CORPUS / nombre).write_text(texto + '\n', encoding='utf-8')
+
+
+# Ejecución de una versión
+
+def calcular_salidas(entradas: dict, directorio_backend: Path) -> dict:
+    """Salidas del código en `directorio_backend` para las entradas del corpus"""
+    entorno = {**os.environ, 'PYTHONPATH': str(directorio_backend)}
+    proceso = subprocess.run(
+        [sys.executable, '-c', _SALIDAS],
+        input=json.dumps({**entradas, 'umbrales': list(UMBRALES)}),
+        capture_output=True, text=True, env=entorno, cwd=directorio_backend
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(f'Falló la ejecución en {directorio_backend}:\n{proceso.stderr}')
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def extraer_revision(revision: str, destino: Path) -> Path:
+    """Extrae backend/app de una revisión de git y devuelve su directorio backend"""
+    raiz = subprocess.run(
+        ['git', 'rev-parse', '--show-toplevel'], capture_output=True, text=True, check=True
+    ).stdout.strip()
+    archivo = subprocess.run(
+        ['git', 'archive', revision, 'backend/app'], capture_output=True, check=True, cwd=raiz
+    ).stdout
+    with tarfile.open(fileobj=io.BytesIO(archivo)) as tar:
+        tar.extractall(destino)
+    return destino / 'backend'
+
+
+# Comparación
+
+def comparar_salidas(esperadas: dict, obtenidas: dict, entradas: dict) -> list[str]:
+    """Reporte de divergencias entre dos juegos de salidas (vacío si son iguales)"""
+    reporte: list[str] = []
+
+    for k, (esperada, obtenida) in enumerate(zip(esperadas['leyendas'], obtenidas['leyendas'])):
+        if esperada != obtenida:
+            reporte.append(
+                f"leyenda {entradas['leyendas'][k]!r}: esperado {esperada}, obtenido {obtenida}"
+            )
+
+    for k, (esperada, obtenida) in enumerate(zip(esperadas['similitud'], obtenidas['similitud'])):
+        if abs(esperada - obtenida) > TOLERANCIA_SIMILITUD:
+            a, b = entradas['pares'][k]
+            reporte.append(f'similitud {a!r} ~ {b!r}: esperado {esperada}, obtenido {obtenida}')
+
+    for nombre, por_umbral in esperadas['mayores'].items():
+        for umbral, firma in por_umbral.items():
+            comparacion = comparar_firmas(firma, obtenidas['mayores'][nombre][umbral])
+            if not comparacion['iguales']:
+                reporte.append(_resumen_comparacion(f'mayor {nombre} umbral {umbral}', comparacion))
+    return reporte
+
+
+def comparar_lotes(entradas: dict) -> list[str]:
+    """PerfilesLote contra calcular_similitud (dos implementaciones del código actual)"""
+    import numpy as np
+    from app.services.agrupacion import calcular_similitud
+    from app.services.similitud_lote import PerfilesLote
+
+    nombres = list(dict.fromkeys(n for par in entradas['pares'] for n in par))
+    posicion = {n: k for k, n in enumerate(nombres)}
+    i = np.array([posicion[a] for a, _ in entradas['pares']], dtype=np.int64)
+    j = np.array([posicion[b] for _, b in entradas['pares']], dtype=np.int64)
+    lote = PerfilesLote(nombres).puntuar_pares(i, j)
+
+    resultado = comparar_funcion(
+        range(len(entradas['pares'])),
+        lambda k: calcular_similitud(*entradas['pares'][k]),
+        lambda k: float(lote[k]),
+        tolerancia=TOLERANCIA_SIMILITUD
+    )
+    return [
+        f"lote {entradas['pares'][d['entrada']]}: escalar {d['referencia']}, lote {d['candidata']}"
+        for d in resultado['divergencias']
+    ]
+
+
+def comparar_motor(entradas: dict, motor: str) -> list[str]:
+    """Motor voraz (el de producción) contra un motor candidato, en proceso"""
+    from app.services.procesamiento import agrupar_por_razon_social
+
+    reporte = []
+    for nombre, registros in entradas['mayores'].items():
+        for umbral in UMBRALES:
+            referencia = agrupar_por_razon_social(registros, float(umbral), **MOTORES_CANDIDATOS['voraz'])
+            candidata = agrupar_por_razon_social(registros, float(umbral), **MOTORES_CANDIDATOS[motor])
+            comparacion = comparar_firmas(firma_agrupacion(referencia), firma_agrupacion(candidata))
+            if not comparacion['iguales']:
+                reporte.append(_resumen_comparacion(f'mayor {nombre} umbral {umbral}', comparacion))
+    return reporte
+
+
+def _resumen_comparacion(titulo: str, comparacion: dict) -> str:
+    lineas = [f"{titulo}: {comparacion['conteo']}"]
+    for grupo in comparacion['solo_referencia'][:5]:
+        lineas.append(f"  - {grupo['razonSocial']}: {len(grupo['ids'])} registros")
+    for grupo in comparacion['solo_candidata'][:5]:
+        lineas.append(f"  + {grupo['razonSocial']}: {len(grupo['ids'])} registros")
+    for cambio in comparacion['otra_razon'][:5]:
+        lineas.append(f"  ~ {cambio['referencia']} -> {cambio['candidata']}")
+    if comparacion['totales']:
+        lineas.append(f"  totales {comparacion['totales']}")
+    return '\n'.join(lineas)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--referencia', help='Revisión de git a usar como referencia en lugar del corpus')
+    parser.add_argument('--motor', choices=sorted(MOTORES_CANDIDATOS), help='Comparar voraz contra este motor')
+    parser.add_argument('--actualizar', action='store_true', help='Regrabar las salidas esperadas del corpus')
+    parser.add_argument('--generar', action='store_true', help='Generar un corpus nuevo (reemplaza el actual)')
+    parser.add_argument('--semilla', type=int, default=7)
+    args = parser.parse_args()
+
+    backend = Path(__file__).resolve().parent.parent
+
+    if args.generar:
+        entradas = generar_entradas(args.semilla)
+        escribir_corpus(entradas, calcular_salidas(entradas, backend))
+        print(f'Corpus generado en {DIRECTORIO_CORPUS}')
+        return
+
+    entradas, esperadas = leer_corpus()
+    if args.actualizar:
+        escribir_corpus(entradas, calcular_salidas(entradas, backend))
+        print('Salidas esperadas actualizadas')
+        return
+
+    if args.motor:
+        reporte = comparar_motor(entradas, args.motor)
+    else:
+        if args.referencia:
+            with tempfile.TemporaryDirectory() as directorio:
+                esperadas = calcular_salidas(
+                    entradas, extraer_revision(args.referencia, Path(directorio))
+                )
+        reporte = comparar_salidas(esperadas, calcular_salidas(entradas, backend), entradas)
+        reporte += comparar_lotes(entradas)
+
+    total_mayores = sum(len(r) for r in entradas['mayores'].values())
+    print(
+        f"{len(entradas['leyendas'])} leyendas, {len(entradas['pares'])} pares, "
+        f"{len(entradas['mayores'])} mayores ({total_mayores} registros)"
+    )
+    if reporte:
+        print(f'{len(reporte)} divergencias:')
+        print('\n'.join(reporte))
+        sys.exit(1)
+    print('Sin divergencias')
+
+
+if __name__ == '__main__':
+    main()
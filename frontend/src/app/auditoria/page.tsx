@@ -62,6 +62,7 @@ export default function AuditoriaPage() {
     setSaldosInicio,
     setSaldosCierre,
     recalcularTotalesAgrupaciones,
+    setClienteId: setClienteAlias,
   } = useAuditoriaStore()
 
   const tieneData = registros.length > 0 || agrupaciones.length > 0
@@ -124,12 +125,14 @@ export default function AuditoriaPage() {
       setClienteSeleccionado(cliente)
       setModoNuevo(false)
       limpiar()
+      setClienteAlias(id)
     }
   }
 
   const handleCambiarCliente = () => {
     setClienteSeleccionado(null)
     setClienteId(null)
+    setClienteAlias(null)
     setConciliaciones([])
     setModoNuevo(false)
     setConciliacionId(null)
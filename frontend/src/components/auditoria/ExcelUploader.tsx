@@ -27,7 +27,8 @@ export function ExcelUploader() {
     setTotales,
     setEstadisticas,
     setLoading,
-    setError
+    setError,
+    clienteId
   } = useAuditoriaStore()
 
   const onDrop = useCallback(async (acceptedFiles: File[]) => {
@@ -44,7 +45,11 @@ export function ExcelUploader() {
 
       setUploadState({ status: 'processing', progress: 50, message: 'Procesando y agrupando...' })
 
-      const response = await fetch(`${API_URL}/api/auditoria/procesar-excel?agrupar=true`, {
+      // Con cliente, el backend agrupa usando los alias aprendidos de sus fusiones y movimientos
+      const params = new URLSearchParams({ agrupar: 'true' })
+      if (clienteId) params.append('cliente_id', clienteId)
+
+      const response = await fetch(`${API_URL}/api/auditoria/procesar-excel?${params}`, {
         method: 'POST',
         body: formData,
       })
@@ -77,7 +82,7 @@ export function ExcelUploader() {
     } finally {
       setLoading(false)
     }
-  }, [setRegistros, setAgrupaciones, setSinAsignar, setTotales, setEstadisticas, setLoading, setError])
+  }, [setRegistros, setAgrupaciones, setSinAsignar, setTotales, setEstadisticas, setLoading, setError, clienteId])
 
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     onDrop,
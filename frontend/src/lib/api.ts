@@ -11,9 +11,12 @@ export const api = axios.create({
 
 // API de Auditoría
 export const auditoriaApi = {
-  // Listar conciliaciones
-  listarConciliaciones: async (clienteId?: number) => {
-    const params = clienteId ? { cliente_id: clienteId } : {}
+  // Listar conciliaciones (cursor: siguiente_cursor de la página anterior)
+  listarConciliaciones: async (clienteId?: number, cursor?: string) => {
+    const params = {
+      ...(clienteId ? { cliente_id: clienteId } : {}),
+      ...(cursor ? { cursor } : {}),
+    }
     const response = await api.get('/api/auditoria/conciliaciones', { params })
     return response.data
   },
@@ -42,6 +45,124 @@ export const auditoriaApi = {
     return response.data
   },
 
+  // Cuadro comparativo calculado en el backend (cacheado por versión)
+  obtenerCuadroComparativo: async (id: number, params?: {
+    orden?: string
+    desc?: boolean
+    estado?: string[]
+    limit?: number
+    offset?: number
+  }) => {
+    const response = await api.get(`/api/auditoria/conciliaciones/${id}/cuadro-comparativo`, {
+      params,
+      paramsSerializer: { indexes: null },
+    })
+    return response.data
+  },
+
+  // Buscar registros de una conciliación guardada (filtrado en el servidor)
+  buscarRegistros: async (id: number, params?: {
+    q?: string
+    fecha_desde?: string
+    fecha_hasta?: string
+    importe_min?: number
+    importe_max?: number
+    comprobante?: string
+    asiento?: string
+    orden?: 'posicion' | 'fecha' | 'importe'
+    desc?: boolean
+    limit?: number
+    offset?: number
+  }) => {
+    const response = await api.get(`/api/auditoria/conciliaciones/${id}/registros`, { params })
+    return response.data
+  },
+
+  // Exportar una conciliación guardada a Excel (descarga el .xlsx)
+  exportarConciliacion: async (id: number) => {
+    const response = await api.get(`/api/auditoria/conciliaciones/${id}/exportar`, {
+      responseType: 'blob',
+    })
+    return response.data as Blob
+  },
+
+  // Partidas abiertas por razón social (facturas imputadas contra pagos)
+  obtenerPartidasAbiertas: async (id: number, maxCombinacion = 3, maxCandidatos = 20) => {
+    const response = await api.get(`/api/auditoria/conciliaciones/${id}/partidas-abiertas`, {
+      params: { max_combinacion: maxCombinacion, max_candidatos: maxCandidatos },
+    })
+    return response.data
+  },
+
+  // Antigüedad de saldos por razón social a una fecha de corte
+  obtenerAntiguedad: async (id: number, params?: {
+    corte?: string
+    tramos?: number[]
+    fifo?: boolean
+    incluir_saldados?: boolean
+  }) => {
+    const response = await api.get(`/api/auditoria/conciliaciones/${id}/antiguedad`, {
+      params,
+      paramsSerializer: { indexes: null },
+    })
+    return response.data
+  },
+
+  // Cierres de una conciliación como saldos de inicio del período siguiente
+  rollForward: async (id: number, siguienteId?: number, aplicar = false) => {
+    const response = await api.post(`/api/auditoria/conciliaciones/${id}/roll-forward`, null, {
+      params: { siguiente_id: siguienteId, aplicar },
+    })
+    return response.data
+  },
+
+  calcularPartidasAbiertas: async (agrupaciones: any[], maxCombinacion = 3, maxCandidatos = 20) => {
+    const response = await api.post('/api/auditoria/partidas-abiertas', agrupaciones, {
+      params: { max_combinacion: maxCombinacion, max_candidatos: maxCandidatos },
+    })
+    return response.data
+  },
+
+  // Proponer la agrupación de cada saldo cargado
+  emparejarSaldos: async (saldos: any[], agrupaciones: any[], umbralSimilitud = 0.75) => {
+    const response = await api.post('/api/auditoria/emparejar-saldos', { saldos, agrupaciones }, {
+      params: { umbral_similitud: umbralSimilitud },
+    })
+    return response.data
+  },
+
+  // Grupos resultantes para varios umbrales de similitud, con una sola pasada
+  barrerUmbrales: async (registros: any[], umbrales?: number[], historial = false) => {
+    const response = await api.post('/api/auditoria/agrupar/barrido', registros, {
+      params: { umbrales, historial },
+      paramsSerializer: { indexes: null },
+    })
+    return response.data
+  },
+
+  // Movimientos posiblemente duplicados (mismo comprobante, o mismo importe en fechas cercanas)
+  detectarDuplicados: async (registros: any[], ventanaDias = 3, incluirCercanos = true) => {
+    const response = await api.post('/api/auditoria/duplicados', registros, {
+      params: { ventana_dias: ventanaDias, incluir_cercanos: incluirCercanos },
+    })
+    return response.data
+  },
+
+  // Alias aprendidos por cliente (fusiones y movimientos entre agrupaciones)
+  obtenerAlias: async (clienteId: string) => {
+    const response = await api.get('/api/auditoria/alias', { params: { cliente_id: clienteId } })
+    return response.data
+  },
+
+  guardarAlias: async (clienteId: string, razonCanonica: string, variantes: string[]) => {
+    const response = await api.post('/api/auditoria/alias', {
+      cliente_id: clienteId,
+      razon_canonica: razonCanonica,
+      variantes,
+    })
+    return response.data
+  },
+
   // Procesar Excel
   procesarExcel: async (file: File) => {
     const formData = new FormData()
@@ -1,4 +1,5 @@
 import { create } from 'zustand'
+import { auditoriaApi } from '@/lib/api'
 import { RegistroMayor, AgrupacionMayor, Conciliacion, SaldoRazonSocial, FilaCuadroComparativo } from '@/types/auditoria'
 
 interface Totales {
@@ -41,6 +42,8 @@ interface AuditoriaState {
   loading: boolean
   error: string | null
   conciliacionActual: Conciliacion | null
+  // Cliente cuyos alias se aprenden al fusionar y mover registros
+  clienteId: string | null
   agrupacionSeleccionada: string | null
   tabActiva: 'agrupaciones' | 'cuadro'
 
@@ -67,6 +70,7 @@ interface AuditoriaState {
   setLoading: (loading: boolean) => void
   setError: (error: string | null) => void
   setConciliacionActual: (conciliacion: Conciliacion | null) => void
+  setClienteId: (clienteId: string | null) => void
   setAgrupacionSeleccionada: (id: string | null) => void
   setTabActiva: (tab: 'agrupaciones' | 'cuadro') => void
 
@@ -133,6 +137,22 @@ function calcularEstadisticas(
   }
 }
 
+// Razón social de un registro (el backend la devuelve como razon_social)
+function razonSocialRegistro(r: RegistroMayor): string {
+  return r.razonSocial || r.razon_social || ''
+}
+
+// Guardar en el backend que las variantes pertenecen a la agrupación destino,
+// para que la próxima importación del cliente las agrupe igual
+function aprenderAlias(clienteId: string | null, razonCanonica: string | undefined, variantes: string[]) {
+  const nombres = variantes.filter(v => v && v !== razonCanonica)
+  if (!clienteId || !razonCanonica || nombres.length === 0) return
+  auditoriaApi.guardarAlias(clienteId, razonCanonica, Array.from(new Set(nombres))).catch(err => {
+    // La operación local es válida aunque no se pueda guardar el alias
+    console.error('Error guardando alias:', err)
+  })
+}
+
 // Normalizar razón social para comparación
 function normalizarRazonSocial(rs: string): string {
   return rs
@@ -143,6 +163,33 @@ function normalizarRazonSocial(rs: string): string {
     .trim()
 }
 
+// Variantes que un movimiento de registros enseña como alias del destino:
+// solo las que se mueven completas (no queda ningún registro con esa razón
+// social en el origen) y nunca la razón social propia del grupo de origen.
+// Mover algunos registros sueltos corrige esos registros, no la variante.
+function variantesMovidasCompletas(
+  origen: RegistroMayor[],
+  movidos: RegistroMayor[],
+  razonOrigen?: string
+): string[] {
+  const propia = razonOrigen ? normalizarRazonSocial(razonOrigen) : null
+  const totales = new Map<string, number>()
+  for (const r of origen) {
+    const clave = normalizarRazonSocial(razonSocialRegistro(r))
+    totales.set(clave, (totales.get(clave) || 0) + 1)
+  }
+  const movidas = new Map<string, { razon: string; cantidad: number }>()
+  for (const r of movidos) {
+    const razon = razonSocialRegistro(r)
+    const clave = normalizarRazonSocial(razon)
+    const actual = movidas.get(clave)
+    movidas.set(clave, { razon: actual?.razon || razon, cantidad: (actual?.cantidad || 0) + 1 })
+  }
+  return Array.from(movidas.entries())
+    .filter(([clave, { cantidad }]) => clave && clave !== propia && cantidad === totales.get(clave))
+    .map(([, { razon }]) => razon)
+}
+
 export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
   // Estado inicial
   registros: [],
@@ -156,6 +203,7 @@ export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
   loading: false,
   error: null,
   conciliacionActual: null,
+  clienteId: null,
   agrupacionSeleccionada: null,
   tabActiva: 'agrupaciones',
 
@@ -168,6 +216,7 @@ export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
   setLoading: (loading) => set({ loading }),
   setError: (error) => set({ error }),
   setConciliacionActual: (conciliacion) => set({ conciliacionActual: conciliacion }),
+  setClienteId: (clienteId) => set({ clienteId }),
   setAgrupacionSeleccionada: (id) => set({ agrupacionSeleccionada: id }),
   setTabActiva: (tab) => set({ tabActiva: tab }),
 
@@ -251,7 +300,7 @@ export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
 
   // Fusionar dos agrupaciones
   fusionarAgrupaciones: (destinoId, origenId) => {
-    const { agrupaciones, sinAsignar, registros } = get()
+    const { agrupaciones, sinAsignar, registros, clienteId } = get()
 
     const destino = agrupaciones.find(a => a.id === destinoId)
     const origen = agrupaciones.find(a => a.id === origenId)
@@ -298,6 +347,11 @@ export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
       totales: nuevosTotales,
       estadisticas: nuevasEstadisticas
     })
+
+    aprenderAlias(clienteId, destino.razonSocial, [
+      origen.razonSocial || '',
+      ...variantesCombinadas,
+    ])
   },
 
   // Mover registro a sin asignar
@@ -346,7 +400,7 @@ export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
 
   // Mover registro de sin asignar a una agrupacion
   moverAAgrupacion: (registroId, agrupacionId) => {
-    const { agrupaciones, sinAsignar, registros } = get()
+    const { agrupaciones, sinAsignar, registros, clienteId } = get()
 
     const registro = sinAsignar.find(r => r.id === registroId)
     if (!registro) return
@@ -381,6 +435,9 @@ export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
       totales: nuevosTotales,
       estadisticas: nuevasEstadisticas
     })
+
+    const destino = agrupaciones.find(a => a.id === agrupacionId)
+    aprenderAlias(clienteId, destino?.razonSocial, variantesMovidasCompletas(sinAsignar, [registro]))
   },
 
   // Mover múltiples registros a sin asignar
@@ -429,7 +486,7 @@ export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
 
   // Mover múltiples registros de una agrupación a otra
   moverRegistrosAOtraAgrupacion: (origenId, destinoId, registroIds) => {
-    const { agrupaciones, sinAsignar, registros } = get()
+    const { agrupaciones, sinAsignar, registros, clienteId } = get()
 
     if (origenId === destinoId) return
 
@@ -486,6 +543,14 @@ export const useAuditoriaStore = create<AuditoriaState>((set, get) => ({
       totales: nuevosTotales,
       estadisticas: nuevasEstadisticas
     })
+
+    const origen = agrupaciones.find(a => a.id === origenId)
+    const destino = agrupaciones.find(a => a.id === destinoId)
+    aprenderAlias(
+      clienteId,
+      destino?.razonSocial,
+      variantesMovidasCompletas(origen?.registros || [], registrosAMover, origen?.razonSocial)
+    )
   },
 
   // Reasignar saldo de una razón social a otra